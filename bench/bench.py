@@ -0,0 +1,888 @@
+"""Benchmarks for streamdeck.py, each printing its measurements: python bench/bench.py <name>
+
+They run headless against software decks (POSIX ptys) and the recording
+injection backend; the pass/fail checks live in tests/.
+"""
+import argparse
+import json
+import math
+import os
+import queue
+import socket
+import sys
+import tempfile
+import threading
+import time
+from functools import partial
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "tests")]
+
+import streamdeck  # noqa: E402
+from streamdeck import *  # noqa: E402,F403 - the benchmarks drive the module's internals directly
+from simulator import SoftwareDeck, wait_for_status  # noqa: E402
+
+def benchmark_frame_parser(lines=20000):
+    """Compare FrameParser against the old readline/decode/strip loop over a pty (POSIX only)."""
+    stream = b"".join(BUTTONS[i % len(BUTTONS)].encode() + b"\r\n" if i % 10 else b"PONG\r\n"
+                      for i in range(lines))
+
+    count = [0]
+    def on_button(button):
+        count[0] += 1
+
+    def drain(read_once):
+        # Both loops read the same bytes from a pseudo terminal, as the reader thread would
+        master, slave = os.openpty()
+        port = serial.Serial(os.ttyname(slave), timeout=1)
+        writer = threading.Thread(target=lambda: [os.write(master, stream[i:i + 1024])
+                                                  for i in range(0, len(stream), 1024)])
+        count[0] = 0
+        start = time.perf_counter()
+        writer.start()
+        while count[0] < expected:
+            read_once(port)
+        elapsed = time.perf_counter() - start
+        writer.join()
+        port.close()
+        os.close(master)
+        os.close(slave)
+        return elapsed
+
+    expected = sum(1 for i in range(lines) if i % 10)
+    parser = FrameParser(on_button, lambda line: None)
+    parsed = drain(lambda port: parser.feed(port.read(port.in_waiting or 1)))
+
+    # The old check_arduino_data loop: readline() plus decode/strip for every line
+    buttons = set(BUTTONS)
+    def legacy_read(port):
+        data = port.readline().decode().strip()
+        if data in buttons:
+            on_button(data)
+    legacy = drain(legacy_read)
+
+    print(f"FrameParser: {lines / parsed / 1e6:.2f} M lines/s ({parsed * 1e9 / lines:.0f} ns/line)")
+    print(f"readline+decode: {lines / legacy / 1e6:.2f} M lines/s ({legacy * 1e9 / lines:.0f} ns/line)")
+    return parsed, legacy
+
+def benchmark_executor_burst(presses=50, action_seconds=0.005):
+    """Submit a burst of presses whose actions take `action_seconds` each and report the backlog."""
+    order = []
+    executor = ActionExecutor(lambda button, action: (time.sleep(action_seconds), order.append(button)))
+    started = time.perf_counter()
+    for i in range(presses):
+        executor.submit(BUTTONS[i % len(BUTTONS)], None)
+    while executor.executed < presses:
+        time.sleep(0.001)
+    elapsed = time.perf_counter() - started
+    executor.stop()
+
+    stats = executor.stats()
+    in_order = order == [BUTTONS[i % len(BUTTONS)] for i in range(presses)]
+    print(f"Burst of {presses} presses ({action_seconds * 1000:.0f} ms each) drained in {elapsed * 1000:.1f} ms, "
+          f"in order: {in_order}")
+    print(f"  max depth={stats['max_depth']}  wait p50={stats['wait_p50_ms']:.1f} ms  "
+          f"p95={stats['wait_p95_ms']:.1f} ms  max={stats['wait_max_ms']:.1f} ms")
+    return stats
+
+def benchmark_rate_limiter():
+    """Replay a two-hand chord and a bounce storm through the default per-button policy."""
+    now = [0.0]
+    limiter = RateLimiter(clock=lambda: now[0], schedule=lambda delay, func: None)
+    ran = []
+
+    # A and B pressed alternately 5 ms apart: a fast chord, nothing may be lost
+    for i in range(6):
+        now[0] += 0.005
+        limiter.submit("AB"[i % 2], lambda i=i: ran.append(i))
+    chord = len(ran)
+
+    # 200 bounces on C within 100 ms, then one real press 1 s later
+    for i in range(200):
+        now[0] += 0.0005
+        limiter.submit("C", lambda: ran.append("C"))
+    storm = ran.count("C")
+    now[0] += 1.0
+    limiter.submit("C", lambda: ran.append("C"))
+
+    stats = limiter.stats()
+    print(f"Chord: {chord}/6 presses ran")
+    print(f"Bounce storm: {storm} of 200 ran, {stats['dropped'].get('C', 0)} dropped; "
+          f"the real press 1 s later {'ran' if ran.count('C') > storm else 'was dropped'}")
+    return stats
+
+def benchmark_protocol(presses=300):
+    """Handshake, negotiate and press against software decks with new and old firmware."""
+    for binary in (True, False):
+        deck = SoftwareDeck(binary=binary)
+        started = time.perf_counter()
+        ser = probe_port(deck.port_info)
+        protocol = negotiate_protocol(ser)
+        connect_time = time.perf_counter() - started
+
+        dispatched = queue.Queue()
+        connection = DeckConnection(ser, lambda button, received: dispatched.put((button, time.perf_counter())),
+                                    protocol=protocol).start()
+        samples = []
+        for i in range(presses):
+            button = BUTTONS[i % len(BUTTONS)]
+            sent = time.perf_counter()
+            deck.press(button)
+            got, at = dispatched.get(timeout=2)
+            assert got == button, f"expected {button}, got {got}"
+            samples.append((at - sent) * 1000)
+        connection.close()
+        deck.close()
+
+        frame_bytes = FRAME_LENGTH if protocol == "binary" else 3
+        baud = BINARY_BAUD if protocol == "binary" else TEXT_BAUD
+        samples.sort()
+        print(f"{'New' if binary else 'Old'} firmware: {protocol} protocol, connected in {connect_time:.2f}s")
+        print(f"  {frame_bytes} bytes/event = {frame_bytes * 10 / baud * 1000:.2f} ms on the wire at {baud} baud; "
+              f"host p50={percentile(samples, 50):.3f} ms p99={percentile(samples, 99):.3f} ms")
+
+def benchmark_simulator(presses=300, rates=(100, 250, 500, 1000, 2000, 4000, 8000, 16000)):
+    """Headless suite: a SoftwareDeck feeds the real DeckMonitor/executor path into recording injection.
+
+    Reports press-to-dispatch and press-to-injection latency, the highest
+    sustained press rate with no lost presses, and reconnect time after an
+    unplug/replug. Rate limiting is left out so the transport and executor
+    capacity is what gets measured.
+    """
+    events = use_recording_injection()
+    actions = {button: compile_action(f"hotkey:ctrl+{button.lower()}") for button in BUTTONS}
+    executor = ActionExecutor(lambda button, action: action())
+    dispatched = queue.Queue()
+    statuses = queue.Queue()
+
+    def on_button(button, received):
+        dispatched.put(time.perf_counter())
+        executor.submit(button, actions[button], received)
+
+    wait_status = partial(wait_for_status, statuses)
+
+    deck = SoftwareDeck()
+    with tempfile.TemporaryDirectory() as tmp:
+        monitor = DeckMonitor(on_button, statuses.put, cache_file=os.path.join(tmp, "device.json"),
+                              comports=deck.comports).start()
+        try:
+            if not wait_status("connected", 30):
+                print("Simulated deck never connected")
+                return None
+            protocol = monitor.connection.protocol
+            results = {"protocol": protocol, "connect_seconds": monitor.last_connect_time}
+
+            dispatch, inject = [], []
+            for i in range(presses):
+                del events[:]
+                sent = time.perf_counter()
+                deck.press(BUTTONS[i % len(BUTTONS)])
+                dispatch.append((dispatched.get(timeout=2) - sent) * 1000)
+                while not events:
+                    time.sleep(0)
+                inject.append((events[0][0] - sent) * 1000)
+            dispatch.sort()
+            inject.sort()
+            results["dispatch_p50_ms"] = percentile(dispatch, 50)
+            results["dispatch_p99_ms"] = percentile(dispatch, 99)
+            results["inject_p50_ms"] = percentile(inject, 50)
+            results["inject_p99_ms"] = percentile(inject, 99)
+
+            sustained = 0
+            for rate in rates:
+                del events[:]
+                sent = deck.burst(BUTTONS, rate, rate)  # one second at this rate
+                deadline = time.monotonic() + 2
+                while len(events) < sent and time.monotonic() < deadline:
+                    time.sleep(0.01)
+                print(f"  {rate}/s: {len(events)}/{sent} presses injected")
+                if len(events) < sent:
+                    break
+                sustained = rate
+            results["max_sustained_per_second"] = sustained
+
+            deck.unplug()
+            wait_status("disconnected", 10)
+            time.sleep(0.2)
+            replugged = time.perf_counter()
+            deck.replug()
+            results["reconnect_seconds"] = (time.perf_counter() - replugged
+                                            if wait_status("connected", 60) else None)
+        finally:
+            monitor.stop()
+            executor.stop()
+            deck.close()
+
+    print(f"Simulated deck ({results['protocol']} protocol), connected in {results['connect_seconds']:.2f}s")
+    print(f"  press->dispatch p50={results['dispatch_p50_ms']:.3f} ms p99={results['dispatch_p99_ms']:.3f} ms")
+    print(f"  press->inject   p50={results['inject_p50_ms']:.3f} ms p99={results['inject_p99_ms']:.3f} ms")
+    print(f"  max sustained rate without loss: {results['max_sustained_per_second']} presses/s")
+    reconnect = results["reconnect_seconds"]
+    print(f"  reconnect after replug: {f'{reconnect:.2f}s' if reconnect is not None else 'timed out'}")
+    return results
+
+def benchmark_logging(calls=200000):
+    """Cost per call of a disabled debug(), an enabled ring-buffer record and a console print."""
+    ring = RingLog(level=INFO, flush_interval=3600)
+    ring.sinks = []
+    started = time.perf_counter()
+    for i in range(calls):
+        ring.debug("Button press received", button="A")
+    disabled = time.perf_counter() - started
+
+    ring.set_level(DEBUG)
+    started = time.perf_counter()
+    for i in range(calls):
+        ring.debug("Button press received", button="A")
+    enabled = time.perf_counter() - started
+
+    with open(os.devnull, 'w') as devnull:
+        started = time.perf_counter()
+        for i in range(calls):
+            print("Raw data received: 'A'", file=devnull, flush=True)
+        printed = time.perf_counter() - started
+
+    for name, elapsed in (("disabled debug()", disabled), ("ring buffer record", enabled), ("print to devnull", printed)):
+        print(f"  {name:20} {elapsed / calls * 1e9:8.0f} ns/call")
+
+def benchmark_dispatch_latency(url="loop://", presses=500):
+    """Measure press-to-dispatch latency through DeckConnection against a stand-in device.
+
+    `url` is any pyserial URL (loop:// by default) or "pty" to drive a pseudo
+    terminal pair on POSIX systems, which exercises the real tty read path.
+    """
+    if url == "pty":
+        master, slave = os.openpty()
+        ser = serial.Serial(os.ttyname(slave), timeout=1)
+        send = lambda data: os.write(master, data)
+    else:
+        ser = serial.serial_for_url(url, timeout=1)
+        send = ser.write
+
+    dispatched = queue.Queue()
+    connection = DeckConnection(ser, lambda button, received: dispatched.put(time.perf_counter()),
+                                keepalive_interval=None).start()
+    samples = []
+    try:
+        for i in range(presses):
+            sent = time.perf_counter()
+            send(BUTTONS[i % len(BUTTONS)].encode() + b"\n")
+            samples.append((dispatched.get(timeout=2) - sent) * 1000)
+            time.sleep(0.002)
+    finally:
+        connection.close()
+        if url == "pty":
+            os.close(master)
+            os.close(slave)
+
+    samples.sort()
+    print(f"Press-to-dispatch latency over {len(samples)} presses ({url}):")
+    print(f"  p50={percentile(samples, 50):.3f} ms  p95={percentile(samples, 95):.3f} ms  "
+          f"p99={percentile(samples, 99):.3f} ms  max={samples[-1]:.3f} ms")
+    return samples
+
+def benchmark_profiles(profiles=32, presses=200000):
+    """Profile switch and per-press lookup cost."""
+    use_recording_injection()
+    profile_set = ProfileSet()
+    for i in range(profiles):
+        profile_set.add(f"P{i}", {button: new_button_config(f"hotkey:ctrl+{i % 10}") for button in BUTTONS},
+                        apps=[f"app{i}.exe"])
+    profile_set.compile()
+
+    names = list(profile_set.profiles)
+    started = time.perf_counter()
+    for i in range(presses):
+        profile_set.switch(names[i % len(names)])
+    switch = (time.perf_counter() - started) / presses
+
+    started = time.perf_counter()
+    for i in range(presses):
+        profile_set.lookup(BUTTONS[i % len(BUTTONS)])
+    lookup = (time.perf_counter() - started) / presses
+
+    print(f"{profiles + 1} profiles x {len(BUTTONS)} buttons, precompiled:")
+    print(f"  switch {switch * 1e9:6.0f} ns   lookup {lookup * 1e9:6.0f} ns/press")
+
+def benchmark_macros(repeats=100, step_ms=10):
+    """Step timing of the macro scheduler against a naive sleep loop, on the recording backend."""
+    events = use_recording_injection()
+    engine = MacroEngine()
+    engine.define("bench", [f"repeat:{repeats}", "hotkey:ctrl+c", f"wait:{step_ms}", "end"])
+    run = engine.play("bench")
+    run.wait(repeats * step_ms / 1000 + 5)
+    stamps = [stamp for stamp, kind, *rest in events if kind == "chord"]
+    drift = (stamps[-1] - stamps[0]) * 1000 - (repeats - 1) * step_ms
+
+    del events[:]
+    for i in range(repeats):
+        streamdeck.injector.send_chord(("ctrl", "c"))
+        time.sleep(step_ms / 1000)
+    naive = [stamp for stamp, kind, *rest in events]
+    naive_drift = (naive[-1] - naive[0]) * 1000 - (repeats - 1) * step_ms
+
+    summary = engine.jitter.summary()
+    print(f"{repeats} steps every {step_ms} ms:")
+    print(f"  scheduler  late p50={summary['p50_ms']:.3f} ms p99={summary['p99_ms']:.3f} ms "
+          f"max={summary['max_ms']:.3f} ms, drift over the run {drift:+.2f} ms")
+    print(f"  time.sleep loop drift over the run {naive_drift:+.2f} ms")
+
+    # Cancel mid-hold: the key-up still runs, nothing after it does
+    del events[:]
+    engine.define("hold", ["repeat:20", "press:f13", "wait:20", "end"])
+    run = engine.play("hold")
+    time.sleep(KEY_HOLD / 2)
+    run.cancel()
+    run.wait(5)
+    downs = sum(1 for event in events if event[1] == "down")
+    ups = sum(1 for event in events if event[1] == "up")
+    print(f"  cancelled after {downs} press(es): {ups} release(s), {'no' if downs == ups else 'STUCK'} keys held")
+
+def benchmark_text_injection(lengths=(16, 256, 4096), call_cost=0.0001):
+    """Characters per second of each text strategy on the recording backend.
+
+    Every simulated OS call (one synthesized key, one SendInput batch, one
+    clipboard access) costs `call_cost` seconds, so the numbers compare how
+    many calls each strategy makes rather than absolute speed on a machine.
+    """
+    events = use_recording_injection(call_cost)
+    streamdeck.clipboard.text = original = "user's clipboard"
+    paster = streamdeck.paster = ClipboardPaster(restore_delay=0.01)
+    sample = "Merhaba dünya, şöyle böyle! 😀\n"
+    print(f"Text injection, {call_cost * 1e6:.0f} µs per simulated OS call:")
+    print(f"{'chars':>6} " + " ".join(f"{mode:>14}" for mode in TEXT_MODES[1:]) + f"  {'auto picks':>10}")
+    for length in lengths:
+        text = (sample * (length // len(sample) + 1))[:length]
+        rates = []
+        for mode in TEXT_MODES[1:]:
+            del events[:]
+            started = time.perf_counter()
+            inject_text(text, mode)
+            elapsed = time.perf_counter() - started
+            time.sleep(paster.restore_delay * 2)  # Keep the clipboard restore out of the next count
+            rates.append(f"{length / elapsed:>8.0f}/s {len(events):>4}")
+        print(f"{length:>6} " + " ".join(f"{rate:>14}" for rate in rates) + f"  {text_mode_for(text):>10}")
+    print(f"  (chars/s and OS calls per strategy; clipboard restored: {streamdeck.clipboard.text == original})")
+
+def benchmark_injection(rounds=2000):
+    """Host-side cost and OS calls per action for each injection backend.
+
+    The OS entry points are stubbed (SendInput returns at once, xdotool is not
+    spawned), so this measures what each backend adds on top of the OS and how
+    many calls it makes; a real xdotool call adds a process spawn on top. The
+    keyboard package backend is left out since it can only inject for real.
+    """
+    backends = [RecordingBackend(), SendInputBackend(send_input=lambda count, inputs, size: count),
+                XdotoolBackend(run=lambda args, check: None)]
+    text = "Merhaba dünya, şöyle böyle!"  # One Unicode batch
+    def fkey():
+        action = chord_action("fkey", "", "f13", hold=KEY_HOLD)
+        return action._replace(args=(action.args[0], 0, 0))  # Without the hold and gap waits
+    actions = (("hotkey ctrl+shift+s", lambda: chord_action("hotkey", "", "ctrl+shift+s")),
+               ("press f13, no hold", fkey),
+               (f"unicode {len(text)} chars", lambda: CompiledAction("text", "", inject_text, (text, "unicode"))),
+               (f"keys {len(text)} chars", lambda: CompiledAction("text", "", inject_text, (text, "keys"))))
+    saved = streamdeck.injector
+    print(f"{'action':24}" + "".join(f"{backend.name:>18}" for backend in backends))
+    try:
+        for label, make in actions:
+            row = []
+            for backend in backends:
+                streamdeck.injector = backend
+                action = make()
+                backend.calls = 0
+                runs = rounds
+                started = time.perf_counter()
+                for _ in range(runs):
+                    action()
+                cost = (time.perf_counter() - started) / runs
+                if isinstance(backend, RecordingBackend):
+                    del backend.events[:]
+                row.append(f"{cost * 1e6:9.1f} µs {backend.calls / runs:4.0f}c")
+            print(f"{label:24}" + "".join(f"{cell:>18}" for cell in row))
+    finally:
+        streamdeck.injector = saved
+
+def count_widgets(widget):
+    return 1 + sum(count_widgets(child) for child in widget.winfo_children())
+
+def benchmark_card_list(counts=(8, 64, 512, 4096)):
+    """Build time, widget count and scroll cost of the virtualized command list per slot count."""
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        print(f"Needs a display: {e}")
+        return
+    root.geometry("600x800")
+
+    def make_card(parent):
+        frame = ttk.LabelFrame(parent, text="")
+        card = SimpleNamespace(frame=frame, index=None, type=tk.StringVar(), entry=tk.StringVar())
+        ttk.Combobox(frame, textvariable=card.type, values=["yazı", "press"], state="readonly").pack(fill=tk.X)
+        ttk.Combobox(frame, state="readonly").pack(fill=tk.X)
+        ttk.Entry(frame, textvariable=card.entry).pack(fill=tk.X)
+        ttk.Button(frame, text="Kaydet").pack(fill=tk.X)
+        return card
+
+    def bind_card(card, slot):
+        card.frame.configure(text=f"{slot['name']} Butonu")
+        card.type.set(slot['type'])
+        card.entry.set(slot['entry'])
+
+    print(f"{'slots':>6} {'build ms':>9} {'widgets':>8} {'pool':>5} {'scroll ms/row':>14}")
+    try:
+        for count in counts:
+            container = ttk.Frame(root)
+            container.pack(fill=tk.BOTH, expand=True)
+            slots = [{'name': f"S{i}", 'type': "yazı", 'entry': f"S{i} Butonu işlevi"} for i in range(count)]
+            started = time.perf_counter()
+            cards = VirtualCardList(container, make_card, bind_card)
+            root.update()
+            cards.set_slots(slots)
+            root.update()
+            build = (time.perf_counter() - started) * 1000
+
+            steps = min(count, 200)
+            started = time.perf_counter()
+            for i in range(steps):
+                cards.scroll(4)  # One row
+                root.update_idletasks()
+            scroll = (time.perf_counter() - started) * 1000 / steps
+            print(f"{count:>6} {build:>9.1f} {count_widgets(container):>8} {len(cards.pool):>5} {scroll:>14.3f}")
+            container.destroy()
+    finally:
+        root.destroy()
+
+def benchmark_gestures(presses=200000):
+    """The cost of the tap fast path, and the gestures software decks produce end to end."""
+    gestures = {'A': (), 'B': {"long"}, 'C': {"double"}, 'D': {"repeat"}}
+    fast = GestureRecognizer(lambda button, gesture, received: None, gestures.get)
+    started = time.perf_counter()
+    for i in range(presses):
+        fast.press('A', 0.0)
+    routed = (time.perf_counter() - started) / presses
+    print(f"Tap fast path: {routed * 1e9:.0f} ns per press added before the action is dispatched")
+
+    # The same gestures end to end from software decks, on real timers
+    script = [("tap", 'A'), ("hold", 'B', 0.7), ("wait", 0.3), ("double_tap", 'C'), ("hold", 'D', 0.6)]
+    print("Software decks (tap A, hold B, double tap C, hold D):")
+    for binary, deck_releases in ((True, True), (False, True), (True, False)):
+        deck = SoftwareDeck(binary=binary, releases=deck_releases)
+        ser = probe_port(deck.port_info)
+        protocol = negotiate_protocol(ser)
+        seen = []
+        live = GestureRecognizer(lambda button, gesture, received: seen.append(f"{button}:{gesture}"),
+                                 gestures.get, lambda button: connection.releases)
+        connection = DeckConnection(ser, live.press, on_release=live.release, protocol=protocol).start()
+        deadline = time.monotonic() + 2 * KEEPALIVE_INTERVAL
+        while deck_releases and not connection.releases and time.monotonic() < deadline:
+            time.sleep(0.01)
+        deck.play(script)
+        time.sleep(DOUBLE_TAP_WINDOW + 0.1)
+        connection.close()
+        deck.close()
+        firmware = "releases" if deck_releases else "presses only"
+        print(f"  {protocol:<6} deck, {firmware:<12}: {' '.join(seen)}")
+
+def benchmark_hotplug(outages=(0.5, 3.0, 10.0), idle=8.0):
+    """Unplug/replug and dropout recovery times, and heartbeat traffic on an idle binary link."""
+    statuses = queue.Queue()
+    deck = SoftwareDeck()
+    with tempfile.TemporaryDirectory() as tmp:
+        monitor = DeckMonitor(lambda button, received: None, statuses.put,
+                              cache_file=os.path.join(tmp, "device.json"), comports=deck.comports).start()
+        try:
+            if not wait_for_status(statuses, "connected", 30):
+                print("Simulated deck never connected")
+                return None
+            connection = monitor.connection
+            time.sleep(idle)
+            alive = monitor.connection is connection and not connection.closed.is_set()
+            print(f"{idle:.0f} s without presses: {connection.pings} heartbeats sent, deck "
+                  f"{'stayed in binary mode' if deck.fallbacks == 0 else 'fell back to text'}, "
+                  f"link {'up' if alive else 'lost'}")
+
+            print(f"{'outage':>8} {'detected':>9} {'reconnected':>12}")
+            results = []
+            for outage in outages:
+                unplugged = time.perf_counter()
+                deck.unplug()
+                detected = time.perf_counter() - unplugged if wait_for_status(statuses, "disconnected", 10) else None
+                time.sleep(outage)
+                replugged = time.perf_counter()
+                deck.replug()
+                reconnected = time.perf_counter() - replugged if wait_for_status(statuses, "connected", 60) else None
+                results.append((outage, detected, reconnected))
+                print(f"{outage:>7.1f}s {detected if detected is not None else math.nan:>8.2f}s "
+                      f"{reconnected if reconnected is not None else math.nan:>11.2f}s")
+
+            # The board hangs while staying plugged in: only the silence gives it away
+            muted = time.perf_counter()
+            deck.dropout(LIVENESS_TIMEOUT + 1)
+            silent = time.perf_counter() - muted if wait_for_status(statuses, "disconnected", 10) else None
+            recovered = time.perf_counter() - muted if wait_for_status(statuses, "connected", 60) else None
+            print(f"Dropout of {LIVENESS_TIMEOUT + 1:.0f} s: loss noticed after {silent or math.nan:.2f}s, "
+                  f"connected again {recovered or math.nan:.2f}s after it started")
+            return results
+        finally:
+            monitor.stop()
+            deck.close()
+
+def benchmark_multideck(decks=3, presses=300, burst=2000, rate=2000):
+    """Several software decks at once: per-deck latency and throughput, the merged event order, stable names."""
+    sims = [SoftwareDeck(serial_number=f"SIM{i + 1:04d}") for i in range(decks)]
+    statuses = queue.Queue()
+    got = []
+
+    def on_button(button, received):
+        got.append((button, received, time.perf_counter()))
+
+    def wait_for(condition, timeout):
+        deadline = time.monotonic() + timeout
+        while not condition() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return condition()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        monitor = DeckMonitor(on_button, statuses.put, cache_file=os.path.join(tmp, "device.json"),
+                              comports=lambda: [port for deck in sims for port in deck.comports()]).start()
+        try:
+            if not wait_for(lambda: len(monitor.connections) == decks, 30):
+                print(f"Only {len(monitor.connections)} of {decks} simulated decks connected")
+                return None
+            names = {deck.serial_number: monitor.connections[port_identity(deck.port_info)].device for deck in sims}
+
+            latency = {name: [] for name in names.values()}
+            for i in range(presses):
+                deck = sims[i % decks]
+                count = len(got)
+                sent = time.perf_counter()
+                deck.press('A')
+                if not wait_for(lambda: len(got) > count, 2):
+                    break
+                latency[names[deck.serial_number]].append((got[-1][2] - sent) * 1000)
+
+            # Every deck bursting at once into the one dispatch path
+            del got[:]
+            threads = [threading.Thread(target=deck.burst, args=(BUTTONS, burst, rate)) for deck in sims]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            wait_for(lambda: len(got) >= decks * burst, 5)
+            inversions = sum(1 for a, b in zip(got, got[1:]) if b[1] < a[1])
+
+            print(f"{'deck':<7} {'port':<12} {'p50 ms':>7} {'p99 ms':>7} {'burst':>11} {'in order':>9} {'events/s':>9}")
+            for deck in sims:
+                name = names[deck.serial_number]
+                samples = sorted(latency[name])
+                mine = [(button, received) for button, received, _ in got if button_device(button) == name]
+                expected = [device_button(name, BUTTONS[i % len(BUTTONS)]) for i in range(burst)]
+                span = mine[-1][1] - mine[0][1] if len(mine) > 1 else 0
+                print(f"{name:<7} {deck.device:<12} {percentile(samples, 50):>7.3f} {percentile(samples, 99):>7.3f} "
+                      f"{len(mine):>5}/{burst:<5} {str([b for b, _ in mine] == expected):>9} "
+                      f"{(len(mine) - 1) / span if span else 0:>9.0f}")
+            print(f"Merged stream: {len(got)} events, {inversions} dispatched ahead of an earlier read")
+
+            # Plug the decks back in the other way round: names follow the USB serial numbers
+            for deck in sims:
+                deck.unplug()
+            wait_for(lambda: not monitor.connections, 10)
+            for deck in reversed(sims):
+                deck.replug()
+                time.sleep(0.3)
+            wait_for(lambda: len(monitor.connections) == decks, 30)
+            stable = all(monitor.connections.get(port_identity(deck.port_info)) is not None and
+                         monitor.connections[port_identity(deck.port_info)].device == names[deck.serial_number]
+                         for deck in sims)
+            print(f"Replugged in reverse order: names {'kept' if stable else 'CHANGED'} "
+                  f"({', '.join(f'{serial}={name}' for serial, name in names.items())})")
+            return monitor.devices()
+        finally:
+            monitor.stop()
+            for deck in sims:
+                deck.close()
+
+def benchmark_daemon(presses=300):
+    """The headless engine end to end: settings file in, software deck presses to recorded keystrokes."""
+    events = use_recording_injection()
+    deck = SoftwareDeck()
+    with tempfile.TemporaryDirectory() as tmp:
+        settings_file = os.path.join(tmp, "settings.json")
+        write_json_atomic(settings_file, {"profiles": {DEFAULT_PROFILE: {"buttons": {
+            button: {"command_type": "hotkey", "command_text": f"ctrl+{button.lower()}",
+                     "message": f"hotkey:ctrl+{button.lower()}"} for button in BUTTONS}}}})
+        statuses = queue.Queue()
+        started = time.perf_counter()
+        engine = DeckEngine(settings_file, os.path.join(tmp, "device.json"), comports=deck.comports)
+        engine.load_settings()
+        engine.on_status = statuses.put
+        engine.start()
+        ready = time.perf_counter() - started
+        try:
+            if not wait_for_status(statuses, "connected", 30):
+                print("Simulated deck never connected")
+                return None
+            connected = time.perf_counter() - started
+            samples = []
+            for i in range(presses):
+                del events[:]
+                sent = time.perf_counter()
+                deck.press(BUTTONS[i % len(BUTTONS)])
+                deadline = sent + 2
+                while not events and time.perf_counter() < deadline:
+                    time.sleep(0)
+                if events:
+                    samples.append((events[0][0] - sent) * 1000)
+                time.sleep(DEFAULT_RATE_INTERVAL / len(BUTTONS) * 2)  # Stay inside each button's rate limit
+            samples.sort()
+        finally:
+            engine.stop()
+            deck.close()
+    print(f"Engine ready in {ready * 1000:.1f} ms, deck connected after {connected:.2f}s, "
+          f"Tk loaded: {'tkinter' in sys.modules}")
+    print(f"  press->inject over {len(samples)}/{presses} presses: p50={percentile(samples, 50):.3f} ms "
+          f"p99={percentile(samples, 99):.3f} ms")
+    return samples
+
+def benchmark_control(requests=500, triggers=200):
+    """Round trips over the control socket: ping, trigger->inject, batches and the event stream."""
+    events = use_recording_injection()
+    with tempfile.TemporaryDirectory() as tmp:
+        settings_file = os.path.join(tmp, "settings.json")
+        write_json_atomic(settings_file, {"profiles": {DEFAULT_PROFILE: {"buttons": {
+            button: {"command_type": "hotkey", "command_text": f"ctrl+{button.lower()}",
+                     "message": f"hotkey:ctrl+{button.lower()}"} for button in BUTTONS}}}})
+        engine = DeckEngine(settings_file, os.path.join(tmp, "device.json"), comports=lambda: [])
+        engine.load_settings()
+        engine.start()
+        addresses = ["127.0.0.1:0"] + ([f"unix:{os.path.join(tmp, 'control.sock')}"] if hasattr(socket, "AF_UNIX") else [])
+        try:
+            for address in addresses:
+                server = ControlServer(engine, address).start()
+                client = ControlClient(server.local_address(), server.token_file)
+                subscriber = ControlClient(server.local_address(), server.token_file)
+                subscribed = subscriber.request("subscribe")["ok"]
+                try:
+                    pings = []
+                    for _ in range(requests):
+                        sent = time.perf_counter()
+                        client.request("ping")
+                        pings.append((time.perf_counter() - sent) * 1000)
+                    replies, injected, streamed = [], [], []
+                    for i in range(triggers):
+                        del events[:]
+                        sent = time.perf_counter()
+                        client.request("trigger", button=BUTTONS[i % len(BUTTONS)])
+                        replies.append((time.perf_counter() - sent) * 1000)
+                        if subscriber.read()["event"] == "press":
+                            streamed.append((time.perf_counter() - sent) * 1000)
+                        deadline = sent + 2
+                        while not events and time.perf_counter() < deadline:
+                            time.sleep(0)
+                        if events:
+                            injected.append((events[0][0] - sent) * 1000)
+                        time.sleep(DEFAULT_RATE_INTERVAL / len(BUTTONS) * 2)  # Stay inside each button's rate limit
+                    time.sleep(DEFAULT_RATE_INTERVAL)
+                    del events[:]
+                    sent = time.perf_counter()
+                    batch = client.request("batch", triggers=[{"button": button} for button in BUTTONS])
+                    batched = (time.perf_counter() - sent) * 1000
+                    for _ in BUTTONS:
+                        subscriber.read()
+                    status = client.request("status")
+                    stats = client.request("stats")["stats"]["control"]
+                    reloaded = client.request("reload")["ok"]
+                    bad = client.request("trigger", button="nope")
+                finally:
+                    client.close()
+                    subscriber.close()
+                    server.stop()
+                for samples in (pings, replies, streamed, injected):
+                    samples.sort()
+                print(f"{address.split(':')[0] if address.startswith('unix') else 'tcp'}: subscribed={subscribed} "
+                      f"status={status['status']} profile={status['profile']} requests={stats['requests']} "
+                      f"reload={reloaded} bad trigger -> {bad.get('error')!r}")
+                print(f"  ping round trip:      p50={percentile(pings, 50):.3f} ms p99={percentile(pings, 99):.3f} ms")
+                print(f"  trigger reply:        p50={percentile(replies, 50):.3f} ms p99={percentile(replies, 99):.3f} ms")
+                print(f"  trigger->inject:      p50={percentile(injected, 50):.3f} ms p99={percentile(injected, 99):.3f} ms "
+                      f"({len(injected)}/{triggers})")
+                print(f"  trigger->event:       p50={percentile(streamed, 50):.3f} ms p99={percentile(streamed, 99):.3f} ms")
+                print(f"  batch of {batch['count']}:          {batched:.3f} ms")
+        finally:
+            engine.stop()
+    return pings
+
+def benchmark_reload(buttons=200, rounds=20):
+    """Hot reload: outside edits to the settings file applied slot by slot while a deck stays connected."""
+    events = use_recording_injection()
+    deck = SoftwareDeck()
+
+    def write(settings):
+        write_json_atomic(settings_file, json.dumps(settings, ensure_ascii=False, indent=4))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        settings_file = os.path.join(tmp, "settings.json")
+        slots = list(BUTTONS) + [f"deck2:{i}" for i in range(buttons - len(BUTTONS))]
+        settings = {"active_profile": DEFAULT_PROFILE, "profiles": {DEFAULT_PROFILE: {"buttons": {
+            button: {"command_type": "hotkey", "command_text": f"ctrl+{i}", "message": f"hotkey:ctrl+{i}"}
+            for i, button in enumerate(slots)}}}}
+        write(settings)
+        reloads = queue.Queue()
+        statuses = queue.Queue()
+        engine = DeckEngine(settings_file, os.path.join(tmp, "device.json"), comports=deck.comports,
+                            watch_interval=0.02)
+        engine.load_settings()
+        engine.on_status = statuses.put
+        engine.on_reload = reloads.put
+        engine.start()
+        try:
+            if not wait_for_status(statuses, "connected", 30):
+                print("Simulated deck never connected")
+                return None
+            connection = engine.monitor.connection
+            table = engine.profiles.tables[DEFAULT_PROFILE]
+            before = dict(table)
+
+            polls = 2000
+            started = time.perf_counter()
+            for _ in range(polls):
+                engine.settings_store.changes()
+            poll_cost = (time.perf_counter() - started) / polls * 1e6
+
+            started = time.perf_counter()
+            unchanged = engine.apply_settings(settings, reload=True)
+            unchanged_ms = (time.perf_counter() - started) * 1000
+
+            samples = []
+            for i in range(rounds):
+                settings["profiles"][DEFAULT_PROFILE]["buttons"]["A"]["message"] = f"hotkey:alt+{i % 10}"
+                written = time.perf_counter()
+                write(settings)
+                changed = reloads.get(timeout=5)
+                samples.append((time.perf_counter() - written) * 1000)
+            kept = sum(table[button] is before[button] for button in slots if button != "A")
+
+            del events[:]
+            deck.press("A")
+            deadline = time.perf_counter() + 2
+            while not events and time.perf_counter() < deadline:
+                time.sleep(0.001)
+
+            settings["profiles"]["Oyun"] = {"apps": ["game.exe"], "buttons": {}}
+            write(settings)
+            added = reloads.get(timeout=5)
+            del settings["profiles"]["Oyun"]
+            write(settings)
+            removed = reloads.get(timeout=5)
+            same = engine.monitor.connection is connection
+        finally:
+            engine.stop()
+            deck.close()
+    samples.sort()
+    print(f"{len(slots)} slots: unchanged file applied in {unchanged_ms:.3f} ms ({len(unchanged)} changes), "
+          f"idle poll {poll_cost:.1f} us")
+    print(f"  one-button edit -> applied: p50={percentile(samples, 50):.1f} ms max={samples[-1]:.1f} ms "
+          f"(poll every 20 ms), last change {changed}")
+    print(f"  compiled actions kept for {kept}/{len(slots) - 1} untouched slots, "
+          f"same connection: {same}, "
+          f"press after reload -> {events[0][1:] if events else None}")
+    print(f"  profile added -> {added}, removed -> {removed}")
+    return samples
+
+def benchmark_journal(presses=120):
+    """Record a software deck session into a journal, then replay it at several speeds and compare the keystrokes."""
+    events = use_recording_injection()
+    deck = SoftwareDeck()
+    with tempfile.TemporaryDirectory() as tmp:
+        settings_file = os.path.join(tmp, "settings.json")
+        journal_file = os.path.join(tmp, "deck.journal")
+        write_json_atomic(settings_file, {"profiles": {DEFAULT_PROFILE: {"buttons": {
+            button: {"command_type": "hotkey", "command_text": f"ctrl+{button.lower()}",
+                     "message": f"hotkey:ctrl+{button.lower()}"} for button in BUTTONS}}}})
+        statuses = queue.Queue()
+        engine = DeckEngine(settings_file, os.path.join(tmp, "device.json"), comports=deck.comports,
+                            watch_interval=None, journal_file=journal_file)
+        engine.load_settings()
+        engine.on_status = statuses.put
+        engine.start()
+        try:
+            if not wait_for_status(statuses, "connected", 30):
+                print("Simulated deck never connected")
+                return None
+            for i in range(presses):
+                deck.tap(BUTTONS[i % len(BUTTONS)])
+                time.sleep(DEFAULT_RATE_INTERVAL / len(BUTTONS) * 2)  # Stay inside each button's rate limit
+            time.sleep(0.2)
+            live = [event[1:] for event in events]
+        finally:
+            engine.stop()
+            deck.close()
+        recorded = engine.journal.stats()
+        kinds = {}
+        for stamp, kind, channel, data in read_journal(journal_file):
+            kinds[kind] = kinds.get(kind, 0) + 1
+        print(f"Live: {len(live)} keystroke events from {presses} taps; journal {recorded['records']} records, "
+              f"{recorded['bytes']} bytes (RX {kinds.get(JOURNAL_RX, 0)}, TX {kinds.get(JOURNAL_TX, 0)}, "
+              f"OPEN {kinds.get(JOURNAL_OPEN, 0)}, CLOSE {kinds.get(JOURNAL_CLOSE, 0)})")
+
+        for speed in (1.0, 10.0, 0):
+            summary, replayed = replay_journal([journal_file], settings_file, speed)
+            same = [event[1:] for event in replayed] == live
+            print(f"  replay x{speed or 'max'}: {summary['recorded_seconds']:.2f}s recorded in "
+                  f"{summary['replay_seconds']:.2f}s, {summary['events']} deck events, {summary['injected']} "
+                  f"keystroke events ({summary['drops']} presses rate limited), identical to live: {same}")
+
+        journal = DeckJournal(os.path.join(tmp, "rotate.journal"), max_bytes=4096, backups=2).start()
+        journal.open_channel(1, {"device": "deck1", "port": "SIM", "identity": "SIM", "protocol": "binary"})
+        chunk = encode_frame(FRAME_PRESS, 0)
+        calls, elapsed = 20000, 0.0
+        for _ in range(calls // 100):
+            started = time.perf_counter()
+            for _ in range(100):
+                journal.record(JOURNAL_RX, 1, chunk)
+            elapsed += time.perf_counter() - started
+            journal.flush()
+        cost = elapsed / calls * 1e9
+        journal.close()
+        files = journal_files(journal.path, backups=2)
+        heads = [next(read_journal(path))[1] == JOURNAL_OPEN for path in files]
+        sizes = [os.path.getsize(path) for path in files]
+    print(f"  record(): {cost:.0f} ns/call; rotated {journal.rotations}x into "
+          f"{len(files)} files of {max(sizes)} bytes max, each opening with OPEN: {all(heads)}")
+    return cost
+
+BENCHMARKS = {
+    "latency": lambda args: benchmark_dispatch_latency(args.url),
+    "parser": lambda args: benchmark_frame_parser(),
+    "executor": lambda args: benchmark_executor_burst(),
+    "rate": lambda args: benchmark_rate_limiter(),
+    "protocol": lambda args: benchmark_protocol(),
+    "simulator": lambda args: benchmark_simulator(),
+    "logging": lambda args: benchmark_logging(),
+    "cards": lambda args: benchmark_card_list(),
+    "profiles": lambda args: benchmark_profiles(),
+    "macros": lambda args: benchmark_macros(),
+    "text": lambda args: benchmark_text_injection(),
+    "injection": lambda args: benchmark_injection(),
+    "gestures": lambda args: benchmark_gestures(),
+    "hotplug": lambda args: benchmark_hotplug(),
+    "multideck": lambda args: benchmark_multideck(),
+    "daemon": lambda args: benchmark_daemon(),
+    "control": lambda args: benchmark_control(),
+    "reload": lambda args: benchmark_reload(),
+    "journal": lambda args: benchmark_journal(),
+}
+
+def main():
+    parser = argparse.ArgumentParser(description="streamdeck.py benchmarks")
+    parser.add_argument("name", choices=sorted(BENCHMARKS))
+    parser.add_argument("--url", default="loop://", help="serial URL for the latency benchmark (or 'pty')")
+    parser.add_argument("--log-level", default="warning", choices=["debug", "info", "warning", "error"])
+    args = parser.parse_args()
+    log.set_level({"debug": DEBUG, "info": INFO, "warning": WARNING, "error": ERROR}[args.log_level])
+    BENCHMARKS[args.name](args)
+
+if __name__ == "__main__":
+    main()
@@ -2,18 +2,133 @@ const unsigned long KEEPALIVE_INTERVAL = 1000; // 1 second
 unsigned long lastKeepAlive = 0;
 const unsigned long DEBOUNCE_DELAY = 50;  // Reduced to 50ms for faster response
 
+// Binary protocol v1, negotiated by the host with "BIN <baud>" after the DECK handshake.
+// Every frame is 6 bytes: start byte, version, sequence, type, argument, CRC-8 of bytes 1-4.
+const byte FRAME_START = 0xA5;
+const byte PROTOCOL_VERSION = 1;
+const byte FRAME_LENGTH = 6;
+const byte FRAME_PRESS = 0x01;
+const byte FRAME_RELEASE = 0x02;
+const byte FRAME_PING = 0x10;
+const byte FRAME_PONG = 0x11;
+const byte FRAME_DECK = 0x12;
+const byte FRAME_TEST = 0x13;
+const byte CAP_RELEASE = 0x01;  // DECK frame argument bit: releases are reported
+const unsigned long TEXT_BAUD = 9600;
+const unsigned long CONFIRM_TIMEOUT = 1000;  // Back to text if the host never speaks binary...
+const unsigned long HOST_TIMEOUT = 5000;     // ...or goes quiet once it has
+
+bool binaryMode = false;
+bool confirmed = false;
+bool textReleases = false;  // Lowercase release letters only once the host asked with REL
+unsigned long lastHostFrame = 0;
+byte txSequence = 0;
+byte rxFrame[FRAME_LENGTH];
+byte rxLength = 0;
+
 // Button state tracking
 struct ButtonState {
   bool lastState;
   bool currentState;
   unsigned long lastDebounceTime;
-  bool canSend;
+  bool canSend;  // False while a reported press is still held
 };
 
 ButtonState buttons[8];
 
+byte crc8(const byte *data, byte length) {
+  byte crc = 0;
+  for (byte i = 0; i < length; i++) {
+    crc ^= data[i];
+    for (byte bit = 0; bit < 8; bit++) {
+      crc = (crc & 0x80) ? (crc << 1) ^ 0x07 : crc << 1;
+    }
+  }
+  return crc;
+}
+
+void sendFrame(byte type, byte argument) {
+  byte frame[FRAME_LENGTH] = {FRAME_START, PROTOCOL_VERSION, txSequence++, type, argument, 0};
+  frame[5] = crc8(frame + 1, 4);
+  Serial.write(frame, FRAME_LENGTH);
+}
+
+void switchBaud(unsigned long baud, bool binary) {
+  Serial.flush();  // Let the last reply leave at the old rate
+  Serial.end();
+  Serial.begin(baud);
+  binaryMode = binary;
+  confirmed = false;
+  rxLength = 0;
+  lastHostFrame = millis();
+}
+
+bool supportedBaud(unsigned long baud) {
+  return baud == 115200 || baud == 230400 || baud == 250000 || baud == 500000 || baud == 1000000;
+}
+
+void handleLine(String input) {
+  if (input == "TEST") {
+    textReleases = false;  // A new host; it asks again if it wants releases
+    Serial.println("DECK");
+  }
+  else if (input == "REL") {
+    textReleases = true;
+    Serial.println("OK REL");
+  }
+  else if (input == "PING") {
+    Serial.println("PONG");
+  }
+  else if (input.startsWith("BIN ")) {
+    unsigned long baud = input.substring(4).toInt();
+    if (supportedBaud(baud)) {
+      Serial.print("OK ");
+      Serial.println(baud);
+      switchBaud(baud, true);
+    } else {
+      Serial.println("NO");
+    }
+  }
+}
+
+void handleFrame() {
+  confirmed = true;
+  lastHostFrame = millis();
+  if (rxFrame[3] == FRAME_TEST) {
+    sendFrame(FRAME_DECK, CAP_RELEASE);
+  }
+  else if (rxFrame[3] == FRAME_PING) {
+    sendFrame(FRAME_PONG, 0);
+  }
+}
+
+void readFrames() {
+  while (Serial.available() > 0) {
+    byte b = Serial.read();
+    if (rxLength == 0 && b != FRAME_START) {
+      continue;
+    }
+    rxFrame[rxLength++] = b;
+    if (rxLength < FRAME_LENGTH) {
+      continue;
+    }
+    if (rxFrame[1] == PROTOCOL_VERSION && crc8(rxFrame + 1, 4) == rxFrame[5]) {
+      handleFrame();
+      rxLength = 0;
+    } else {
+      // Bad frame: resync on the next start byte inside it
+      byte shift = 1;
+      while (shift < FRAME_LENGTH && rxFrame[shift] != FRAME_START) {
+        shift++;
+      }
+      memmove(rxFrame, rxFrame + shift, FRAME_LENGTH - shift);
+      rxLength = FRAME_LENGTH - shift;
+    }
+  }
+}
+
 void setup() {
-  Serial.begin(9600);
+  Serial.begin(TEXT_BAUD);
   
   // Configure input pins with internal pull-up resistors
   for (int pin = 2; pin <= 9; pin++) {
@@ -36,20 +151,23 @@ void loop() {
   unsigned long currentMillis = millis();
 
   // Check for incoming messages without blocking
-  while (Serial.available() > 0) {
-    String input = Serial.readStringUntil('\n');
-    input.trim();
-    
-    if (input == "TEST") {
-      Serial.println("DECK");
+  if (binaryMode) {
+    readFrames();
+    // Drop back to the text protocol if the host went away or never followed us
+    if (millis() - lastHostFrame > (confirmed ? HOST_TIMEOUT : CONFIRM_TIMEOUT)) {
+      switchBaud(TEXT_BAUD, false);
     }
-    else if (input == "PING") {
-      Serial.println("PONG");
+  } else {
+    while (Serial.available() > 0) {
+      String input = Serial.readStringUntil('\n');
+      input.trim();
+      handleLine(input);
     }
   }
 
   // Check button states - non-blocking
   char buttonChars[] = {'A', 'B', 'C', 'D', 'E', 'F', 'G', 'H'};
+  char releaseChars[] = {'a', 'b', 'c', 'd', 'e', 'f', 'g', 'h'};
   for (int i = 0; i < 8; i++) {
     // Read current button state
     bool reading = digitalRead(i + 2);
@@ -67,11 +185,22 @@ void loop() {
 
         // Only send on button press (LOW) and if we haven't sent recently
         if (buttons[i].currentState == LOW && buttons[i].canSend) {
-          Serial.println(buttonChars[i]);
+          if (binaryMode) {
+            sendFrame(FRAME_PRESS, i);
+          } else {
+            Serial.println(buttonChars[i]);
+          }
           buttons[i].canSend = false;  // Prevent multiple sends
         }
-        // Reset send flag when button is released
+        // Report the release of a reported press and re-arm the button
         else if (buttons[i].currentState == HIGH) {
+          if (!buttons[i].canSend) {
+            if (binaryMode) {
+              sendFrame(FRAME_RELEASE, i);
+            } else if (textReleases) {
+              Serial.println(releaseChars[i]);
+            }
+          }
           buttons[i].canSend = true;
         }
       }
@@ -82,7 +211,11 @@ void loop() {
 
   // Send periodic keepalive - non-blocking
   if (currentMillis - lastKeepAlive >= KEEPALIVE_INTERVAL) {
-    Serial.println("DECK");
+    if (binaryMode) {
+      sendFrame(FRAME_DECK, CAP_RELEASE);
+    } else {
+      Serial.println("DECK");
+    }
     lastKeepAlive = currentMillis;
   }
 }
\ No newline at end of file
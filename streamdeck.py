@@ -1,64 +1,3427 @@
-import serial
 import time
-from serial.tools import list_ports
-import pyautogui
-import keyboard
-import tkinter as tk
-from tkinter import ttk, messagebox
+STARTUP_STARTED = time.perf_counter()
+
+import importlib
 import threading
-from PIL import Image, ImageTk
 import os
 import sys
 import json
+import math
+import queue
+import heapq
+import argparse
+import atexit
+import shutil
+import subprocess
+import signal
+import socket
+import secrets
+import hmac
+import struct
 import ctypes
+from collections import namedtuple, deque
+from functools import partial
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
 from ctypes import wintypes
 
-# Add Windows API constants and functions
-KEYEVENTF_EXTENDEDKEY = 0x0001
-KEYEVENTF_KEYUP = 0x0002
+class StartupProfile:
+    """Named startup milestones as offsets from module import, plus lazy import costs."""
+
+    def __init__(self, started=STARTUP_STARTED):
+        self.started = started
+        self.marks = []
+        self.imports = {}
+
+    def mark(self, name):
+        if any(mark == name for mark, _ in self.marks):
+            return
+        self.marks.append((name, time.perf_counter() - self.started))
+
+    def report(self):
+        """Milestones with the time each phase took since the previous one, in ms"""
+        phases = []
+        previous = 0.0
+        for name, offset in sorted(self.marks, key=lambda mark: mark[1]):
+            phases.append({"phase": name, "ms": round((offset - previous) * 1000, 1),
+                           "at_ms": round(offset * 1000, 1)})
+            previous = offset
+        return {"phases": phases,
+                "lazy_imports_ms": {name: round(seconds * 1000, 1) for name, seconds in self.imports.items()}}
+
+    def summary(self):
+        return ", ".join(f"{phase['phase']}={phase['ms']:.0f}ms" for phase in self.report()["phases"])
+
+startup = StartupProfile()
+
+class LazyModule:
+    """Imports a module on first attribute access, so startup only pays for what it uses."""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attribute):
+        if self._module is None:
+            started = time.perf_counter()
+            self._module = importlib.import_module(self._name)
+            startup.imports[self._name] = time.perf_counter() - started
+        return getattr(self._module, attribute)
+
+serial = LazyModule("serial")
+list_ports = LazyModule("serial.tools.list_ports")
+keyboard = LazyModule("keyboard")  # Hotkey recording, and injection where no native backend exists
+tk = LazyModule("tkinter")  # Only the GUI front-end needs Tk; the daemon never loads it
+ttk = LazyModule("tkinter.ttk")
+messagebox = LazyModule("tkinter.messagebox")
+filedialog = LazyModule("tkinter.filedialog")
+simpledialog = LazyModule("tkinter.simpledialog")
+
+DEBUG, INFO, WARNING, ERROR = 10, 20, 30, 40
+LEVEL_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR"}
+
+def _ignore(*args, **fields):
+    pass
+
+class RingLog:
+    """Leveled, structured logger backed by a bounded in-memory ring buffer.
+
+    A record is a (time, level, message, fields) tuple appended to deques,
+    which is atomic, so logging from the reader thread never blocks on a lock
+    or the console. A background thread formats new records and writes them
+    to the sinks every `flush_interval`. Methods for disabled levels are bound
+    to a no-op, so a disabled debug() costs a single call.
+    """
+
+    def __init__(self, level=INFO, capacity=2000, flush_interval=0.5):
+        self.records = deque(maxlen=capacity)  # What the UI shows
+        self.pending = deque(maxlen=capacity)  # Not yet written to the sinks
+        self.sinks = [sys.stdout] if sys.stdout is not None else []
+        self.flush_interval = flush_interval
+        self.set_level(level)
+        threading.Thread(target=self.flush_loop, daemon=True).start()
+
+    def set_level(self, level):
+        self.level = level
+        for value, name in ((DEBUG, "debug"), (INFO, "info"), (WARNING, "warning"), (ERROR, "error")):
+            setattr(self, name, partial(self.log, value) if value >= level else _ignore)
+
+    def log(self, level, message, **fields):
+        record = (time.time(), level, message, fields)
+        self.records.append(record)
+        self.pending.append(record)
+
+    def add_file(self, path):
+        self.sinks.append(open(path, 'a', encoding='utf-8'))
+
+    @staticmethod
+    def format(record):
+        created, level, message, fields = record
+        stamp = time.strftime("%H:%M:%S", time.localtime(created)) + f".{int(created % 1 * 1000):03d}"
+        extra = " ".join(f"{key}={value}" for key, value in fields.items())
+        return f"{stamp} {LEVEL_NAMES.get(level, level):7} {message}{' ' + extra if extra else ''}"
+
+    def flush(self):
+        lines = []
+        while True:
+            try:
+                lines.append(self.format(self.pending.popleft()))
+            except IndexError:
+                break
+        if not lines:
+            return
+        text = "\n".join(lines) + "\n"
+        for sink in self.sinks:
+            try:
+                sink.write(text)
+                sink.flush()
+            except Exception:
+                pass
+
+    def flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def tail(self, min_level=DEBUG):
+        """Formatted records still in the ring buffer, oldest first"""
+        return [self.format(record) for record in list(self.records) if record[1] >= min_level]
+
+log = RingLog()
+atexit.register(log.flush)
+
+# Add Windows API constants and functions
+KEYEVENTF_EXTENDEDKEY = 0x0001
+KEYEVENTF_KEYUP = 0x0002
+KEYEVENTF_UNICODE = 0x0004
+INPUT_KEYBOARD = 1
+VK_TAB = 0x09
+VK_RETURN = 0x0D
+VK_SHIFT = 0x10
+VK_CONTROL = 0x11
+VK_MENU = 0x12
+MAPVK_VSC_TO_VK_EX = 3
+CF_UNICODETEXT = 13
+GMEM_MOVEABLE = 0x0002
+
+# Virtual key codes for F1-F24
+VK_F1 = 0x70
+VK_F13 = 0x7C
+
+# Define ULONG_PTR based on system architecture
+ULONG_PTR = ctypes.c_ulong if ctypes.sizeof(ctypes.c_void_p) == 4 else ctypes.c_ulonglong
+
+class KEYBDINPUT(ctypes.Structure):
+    _fields_ = [("wVk", wintypes.WORD), ("wScan", wintypes.WORD), ("dwFlags", wintypes.DWORD),
+                ("time", wintypes.DWORD), ("dwExtraInfo", ULONG_PTR)]
+
+class MOUSEINPUT(ctypes.Structure):
+    _fields_ = [("dx", wintypes.LONG), ("dy", wintypes.LONG), ("mouseData", wintypes.DWORD),
+                ("dwFlags", wintypes.DWORD), ("time", wintypes.DWORD), ("dwExtraInfo", ULONG_PTR)]
+
+class _INPUTUNION(ctypes.Union):
+    _fields_ = [("ki", KEYBDINPUT), ("mi", MOUSEINPUT)]  # MOUSEINPUT only to give the union its real size
+
+class INPUT(ctypes.Structure):
+    _fields_ = [("type", wintypes.DWORD), ("union", _INPUTUNION)]
+
+user32 = None  # Loaded on first use
+
+def get_user32():
+    """user32.dll, loaded the first time a key needs the Windows API"""
+    global user32
+    if user32 is None:
+        user32 = ctypes.WinDLL('user32', use_last_error=True)
+        user32.SendInput.argtypes = [wintypes.UINT, ctypes.POINTER(INPUT), ctypes.c_int]
+        user32.SendInput.restype = wintypes.UINT
+        user32.VkKeyScanW.argtypes = [wintypes.WCHAR]
+        user32.VkKeyScanW.restype = ctypes.c_short
+    return user32
+
+def function_key_vk(key_number):
+    """Virtual-key code for F1-F24."""
+    return VK_F1 + (key_number - 1) if key_number <= 12 else VK_F13 + (key_number - 13)
+
+KEY_HOLD = 0.05  # Seconds a function key is held down
+KEY_GAP = 0.05  # Seconds after its release before the next key
+SPIN_MARGIN = 0.002  # Last stretch of a timed wait that is spun instead of slept
+
+def sleep_until(deadline, spin=SPIN_MARGIN):
+    """Wait for a perf_counter deadline: sleep most of the way, then spin for ms accuracy."""
+    while True:
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            return
+        time.sleep(remaining - spin if remaining > spin else 0)
+
+TEXT_MODES = ("auto", "keys", "unicode", "paste")
+PASTE_THRESHOLD = 64  # "auto" pastes text at least this long and types anything shorter
+UNICODE_CHUNK = 32  # Characters per batched injection call
+UNICODE_CHUNK_PAUSE = 0.002  # Lets the target drain its input queue between batches
+PASTE_RESTORE_DELAY = 0.5  # Time the target gets to read the clipboard before it is put back
+
+# Key injection backends. Every action reaches the OS through one of these:
+#   parse_chord(keys)        "ctrl+shift+a" -> backend's own chord value, ValueError if unknown
+#   send_chord(chord)        press and release a whole chord in one call
+#   chord_down / chord_up    hold and release, for function keys and macros
+#   press_chord(chord, hold) down, hold, up, then KEY_GAP
+#   type_keys(text)          one synthesized key per character
+#   type_unicode(text)       batched Unicode text, UNICODE_CHUNK characters per call
+# `calls` counts OS-level calls, so per-action cost can be compared across backends.
+
+class InjectionBackend:
+    name = "base"
+
+    def __init__(self):
+        self.calls = 0
+
+    def send_chord(self, chord):
+        self.chord_down(chord)
+        self.chord_up(chord)
+
+    def press_chord(self, chord, hold=KEY_HOLD, gap=KEY_GAP):
+        started = time.perf_counter()
+        self.chord_down(chord)
+        sleep_until(started + hold)
+        self.chord_up(chord)
+        sleep_until(started + hold + gap)
+
+    def type_unicode(self, text):
+        for start in range(0, len(text), UNICODE_CHUNK):
+            if start:
+                time.sleep(UNICODE_CHUNK_PAUSE)
+            self.type_chunk(text[start:start + UNICODE_CHUNK])
+
+    def type_chunk(self, text):
+        self.type_keys(text)
+
+WINDOWS_VK = {
+    "ctrl": 0x11, "control": 0x11, "left ctrl": 0x11, "right ctrl": 0xA3,
+    "shift": 0x10, "left shift": 0x10, "right shift": 0xA1,
+    "alt": 0x12, "left alt": 0x12, "right alt": 0xA5, "alt gr": 0xA5,
+    "windows": 0x5B, "win": 0x5B, "left windows": 0x5B, "right windows": 0x5C,
+    "enter": 0x0D, "return": 0x0D, "esc": 0x1B, "escape": 0x1B, "tab": 0x09, "space": 0x20,
+    "backspace": 0x08, "delete": 0x2E, "insert": 0x2D, "home": 0x24, "end": 0x23,
+    "page up": 0x21, "page down": 0x22, "up": 0x26, "down": 0x28, "left": 0x25, "right": 0x27,
+    "caps lock": 0x14, "print screen": 0x2C, "menu": 0x5D,
+    "volume up": 0xAF, "volume down": 0xAE, "volume mute": 0xAD,
+    "next track": 0xB0, "previous track": 0xB1, "stop media": 0xB2, "play/pause media": 0xB3,
+}
+# The rest of the names the keyboard library reports on Windows, which record_hotkey stores as-is
+WINDOWS_VK.update({
+    "pause": 0x13, "clear": 0x0C, "num lock": 0x90, "scroll lock": 0x91, "applications": 0x5D,
+    "left menu": 0xA4, "right menu": 0xA5, "sleep": 0x5F, "select": 0x29, "print": 0x2A, "execute": 0x2B,
+    "help": 0x2F, "control-break processing": 0x03, "decimal": 0x6E, "separator": 0x6C,
+    "num multiply": 0x6A, "num add": 0x6B, "num minus": 0x6D, "num divide": 0x6F, "num enter": 0x0D,
+    "browser back": 0xA6, "browser forward": 0xA7, "browser refresh": 0xA8, "browser stop": 0xA9,
+    "browser search key": 0xAA, "browser favorites": 0xAB, "browser start and home": 0xAC,
+    "start mail": 0xB4, "select media": 0xB5, "start application 1": 0xB6, "start application 2": 0xB7,
+    "ime kana mode": 0x15, "ime hangul mode": 0x15, "ime hanguel mode": 0x15, "ime junja mode": 0x17,
+    "ime final mode": 0x18, "ime hanja mode": 0x19, "ime kanji mode": 0x19, "ime convert": 0x1C,
+    "ime nonconvert": 0x1D, "ime accept": 0x1E, "ime mode change request": 0x1F, "ime process": 0xE5,
+    "attn": 0xF6, "crsel": 0xF7, "exsel": 0xF8, "erase eof": 0xF9, "play": 0xFA, "zoom": 0xFB, "pa1": 0xFD,
+})
+WINDOWS_VK.update({f"f{n}": function_key_vk(n) for n in range(1, 25)})
+WINDOWS_VK.update({chr(c): ord(chr(c).upper()) for c in range(ord("a"), ord("z") + 1)})
+WINDOWS_VK.update({str(d): ord(str(d)) for d in range(10)})
+WINDOWS_VK.update({f"num {d}": 0x60 + d for d in range(10)})
+# Other spellings the keyboard library accepts, so hotkeys saved for it keep working
+KEY_ALIASES = {
+    "spacebar": "space", "space bar": "space", "del": "delete", "ins": "insert", "plus": "+",
+    "pgup": "page up", "pgdown": "page down", "pageup": "page up", "pagedown": "page down",
+    "left arrow": "left", "right arrow": "right", "up arrow": "up", "down arrow": "down",
+    "prtscn": "print screen", "prnt scrn": "print screen", "snapshot": "print screen",
+    "scrlk": "scroll lock", "numlock": "num lock", "number lock": "num lock", "capslock": "caps lock",
+    "pause break": "pause", "app": "menu", "apps": "menu", "application": "menu",
+    "play/pause": "play/pause media", "num plus": "num add", "num sub": "num minus",
+    "left win": "left windows", "right win": "right windows", "left control": "left ctrl",
+    "right control": "right ctrl", "altgr": "alt gr", "command": "windows", "cmd": "windows", "option": "alt",
+}
+# Keys Windows needs flagged as extended; function keys keep the flag the old keybd_event path used
+WINDOWS_EXTENDED = ({0xA3, 0xA5, 0x5B, 0x5C, 0x2E, 0x2D, 0x24, 0x23, 0x21, 0x22, 0x26, 0x28, 0x25, 0x27, 0x5D,
+                     0xAF, 0xAE, 0xAD, 0xB0, 0xB1, 0xB2, 0xB3, 0x90, 0x6F} | set(range(0xA6, 0xAD))
+                    | set(range(0xB4, 0xB8)) | {function_key_vk(n) for n in range(1, 25)})
+# VkKeyScanW's shift state bits, and the modifier each one needs held
+VK_SCAN_MODIFIERS = ((0x100, VK_SHIFT), (0x200, VK_CONTROL), (0x400, VK_MENU))
+
+def chord_names(keys):
+    """The key names in a "ctrl+shift+a" chord; a "+" key itself is written "++" or "plus" """
+    pieces = [piece.strip() for piece in keys.lower().split("+")]
+    names = []
+    i = 0
+    while i < len(pieces):
+        if not pieces[i] and i + 1 < len(pieces) and not pieces[i + 1]:
+            names.append("+")
+            i += 2
+        else:
+            names.append(KEY_ALIASES.get(pieces[i], pieces[i]))
+            i += 1
+    return names
+
+def unicode_inputs(text):
+    """SendInput events typing `text` as Unicode code units; newlines and tabs become real keys"""
+    inputs = []
+    for character in text.replace("\r\n", "\n"):
+        if character in "\n\t":
+            vk = VK_RETURN if character == "\n" else VK_TAB
+            inputs.append((vk, 0, 0))
+            inputs.append((vk, 0, KEYEVENTF_KEYUP))
+            continue
+        encoded = character.encode("utf-16-le")
+        for i in range(0, len(encoded), 2):  # Two code units for characters outside the BMP
+            unit = int.from_bytes(encoded[i:i + 2], "little")
+            inputs.append((0, unit, KEYEVENTF_UNICODE))
+            inputs.append((0, unit, KEYEVENTF_UNICODE | KEYEVENTF_KEYUP))
+    return inputs
+
+class SendInputBackend(InjectionBackend):
+    """Windows SendInput: a whole chord, or a batch of text, goes in as one atomic call.
+
+    `send_input` defaults to user32.SendInput; benchmarks pass a stub to time
+    the marshalling without typing into the desktop.
+    """
+
+    name = "sendinput"
+
+    def __init__(self, send_input=None):
+        super().__init__()
+        self.send_input = send_input
+
+    def parse_chord(self, keys):
+        vks = []
+        for name in chord_names(keys):
+            vk = WINDOWS_VK.get(name)
+            if vk is None and len(name) == 1:
+                scan = get_user32().VkKeyScanW(name)  # Punctuation on the current layout
+                if scan != -1:
+                    # "?" is shift+/ on a US layout: hold what the layout needs, ahead of the key
+                    for bit, modifier in VK_SCAN_MODIFIERS:
+                        if scan & bit and modifier not in vks:
+                            vks.append(modifier)
+                    vk = scan & 0xFF
+            if vk is None:
+                vk = self.keyboard_lib_vk(name)
+            if vk in vks:
+                continue
+            vks.append(vk)
+        return tuple((vk, KEYEVENTF_EXTENDEDKEY if vk in WINDOWS_EXTENDED else 0) for vk in vks)
+
+    @staticmethod
+    def keyboard_lib_vk(name):
+        """Last resort for names outside WINDOWS_VK, e.g. localized ones: ask the keyboard library"""
+        try:
+            scan_codes = keyboard.key_to_scan_codes(name)
+        except (ImportError, ValueError):
+            scan_codes = ()
+        vk = get_user32().MapVirtualKeyW(scan_codes[0], MAPVK_VSC_TO_VK_EX) if scan_codes else 0
+        if not vk:
+            raise ValueError(f"Unknown key: {name!r}")
+        return vk
+
+    def submit(self, events):
+        """Submit (vk, scan, flags) keyboard events in one SendInput call"""
+        inputs = (INPUT * len(events))()
+        for item, (vk, scan, flags) in zip(inputs, events):
+            item.type = INPUT_KEYBOARD
+            item.union.ki = KEYBDINPUT(vk, scan, flags, 0, 0)
+        send_input = self.send_input or get_user32().SendInput
+        self.calls += 1
+        sent = send_input(len(events), inputs, ctypes.sizeof(INPUT))
+        if sent != len(events):
+            raise OSError(f"SendInput accepted {sent} of {len(events)} events")
+
+    def downs(self, chord):
+        return [(vk, 0, flags) for vk, flags in chord]
+
+    def ups(self, chord):
+        return [(vk, 0, flags | KEYEVENTF_KEYUP) for vk, flags in reversed(chord)]
+
+    def send_chord(self, chord):
+        self.submit(self.downs(chord) + self.ups(chord))
+
+    def chord_down(self, chord):
+        self.submit(self.downs(chord))
+
+    def chord_up(self, chord):
+        self.submit(self.ups(chord))
+
+    def type_keys(self, text):
+        for character in text:
+            self.submit(unicode_inputs(character))
+
+    def type_chunk(self, text):
+        self.submit(unicode_inputs(text))
+
+XDOTOOL_KEYS = {
+    "ctrl": "ctrl", "control": "ctrl", "shift": "shift", "alt": "alt", "alt gr": "ISO_Level3_Shift",
+    "windows": "super", "win": "super", "enter": "Return", "return": "Return", "esc": "Escape",
+    "escape": "Escape", "tab": "Tab", "space": "space", "backspace": "BackSpace", "delete": "Delete",
+    "insert": "Insert", "home": "Home", "end": "End", "page up": "Prior", "page down": "Next",
+    "up": "Up", "down": "Down", "left": "Left", "right": "Right", "menu": "Menu",
+    "print screen": "Print", "caps lock": "Caps_Lock",
+    "volume up": "XF86AudioRaiseVolume", "volume down": "XF86AudioLowerVolume", "volume mute": "XF86AudioMute",
+    "next track": "XF86AudioNext", "previous track": "XF86AudioPrev", "stop media": "XF86AudioStop",
+    "play/pause media": "XF86AudioPlay",
+}
+# X keysyms for the rest of WINDOWS_VK; None where X has no such key
+XDOTOOL_KEYS.update({
+    "left ctrl": "Control_L", "right ctrl": "Control_R", "left shift": "Shift_L", "right shift": "Shift_R",
+    "left alt": "Alt_L", "right alt": "Alt_R", "left windows": "Super_L", "right windows": "Super_R",
+    "left menu": "Alt_L", "right menu": "Alt_R", "applications": "Menu",
+    "pause": "Pause", "control-break processing": "Break", "clear": "Clear", "num lock": "Num_Lock",
+    "scroll lock": "Scroll_Lock", "select": "Select", "print": "Print", "execute": "Execute", "help": "Help",
+    "sleep": "XF86Sleep", "decimal": "KP_Decimal", "separator": "KP_Separator", "num multiply": "KP_Multiply",
+    "num add": "KP_Add", "num minus": "KP_Subtract", "num divide": "KP_Divide", "num enter": "KP_Enter",
+    "+": "plus", "-": "minus", "*": "asterisk", "/": "slash", ",": "comma", ".": "period",
+    "browser back": "XF86Back", "browser forward": "XF86Forward", "browser refresh": "XF86Refresh",
+    "browser stop": "XF86Stop", "browser search key": "XF86Search", "browser favorites": "XF86Favorites",
+    "browser start and home": "XF86HomePage", "start mail": "XF86Mail", "select media": "XF86AudioMedia",
+    "start application 1": "XF86MyComputer", "start application 2": "XF86Calculator",
+    "ime kana mode": "Hiragana_Katakana", "ime hangul mode": "Hangul", "ime hanguel mode": "Hangul",
+    "ime junja mode": "Hangul_Jeonja", "ime final mode": "Hangul_End", "ime hanja mode": "Hangul_Hanja",
+    "ime kanji mode": "Kanji", "ime convert": "Henkan", "ime nonconvert": "Muhenkan",
+    "ime mode change request": "Mode_switch", "ime accept": None, "ime process": None,
+    "attn": "3270_Attn", "crsel": "3270_CursorSelect", "exsel": "3270_ExSelect", "erase eof": "3270_EraseEOF",
+    "play": "3270_Play", "zoom": None, "pa1": "3270_PA1",
+})
+XDOTOOL_KEYS.update({f"f{n}": f"F{n}" for n in range(1, 25)})
+XDOTOOL_KEYS.update({f"num {d}": f"KP_{d}" for d in range(10)})
+
+class XdotoolBackend(InjectionBackend):
+    """Linux/X11 through xdotool: one process per chord or text batch.
+
+    `run` defaults to subprocess.run; benchmarks pass a stub.
+    """
+
+    name = "xdotool"
+
+    def __init__(self, run=None, executable="xdotool"):
+        super().__init__()
+        self.run = run or subprocess.run
+        self.executable = executable
+
+    def parse_chord(self, keys):
+        keysyms = []
+        for name in chord_names(keys):
+            if not name:
+                raise ValueError(f"Empty key in {keys!r}")
+            if name not in XDOTOOL_KEYS and len(name) != 1:
+                raise ValueError(f"Unknown key: {name!r}")
+            keysym = XDOTOOL_KEYS.get(name, name)  # A single character is its own keysym to xdotool
+            if keysym is None:
+                raise ValueError(f"No X11 key for {name!r}")
+            keysyms.append(keysym)
+        return "+".join(keysyms)
+
+    def xdotool(self, *args):
+        self.calls += 1
+        self.run([self.executable, *args], check=True)
+
+    def send_chord(self, chord):
+        self.xdotool("key", "--clearmodifiers", chord)
+
+    def chord_down(self, chord):
+        self.xdotool("keydown", chord)
+
+    def chord_up(self, chord):
+        self.xdotool("keyup", chord)
+
+    def type_keys(self, text):
+        self.xdotool("type", "--delay", "12", "--", text)
+
+    def type_chunk(self, text):
+        self.xdotool("type", "--delay", "0", "--", text)
+
+class KeyboardLibBackend(InjectionBackend):
+    """The `keyboard` package, for platforms without a native backend here."""
+
+    name = "keyboard"
+
+    def parse_chord(self, keys):
+        return keyboard.parse_hotkey(keys)
+
+    def send_chord(self, chord):
+        self.calls += 1
+        keyboard.send(chord)
+
+    def chord_down(self, chord):
+        self.calls += 1
+        keyboard.press(chord)
+
+    def chord_up(self, chord):
+        self.calls += 1
+        keyboard.release(chord)
+
+    def type_keys(self, text):
+        self.calls += len(text)
+        keyboard.write(text)
+
+class RecordingBackend(InjectionBackend):
+    """In-memory backend for tests and benchmarks: records each call instead of injecting.
+
+    `call_cost` simulates the seconds one OS call takes.
+    """
+
+    name = "recording"
+
+    def __init__(self, events=None, call_cost=0.0):
+        super().__init__()
+        self.events = [] if events is None else events
+        self.call_cost = call_cost
+
+    def record(self, *event):
+        self.calls += 1
+        self.events.append((time.perf_counter(),) + event)
+        if self.call_cost:
+            sleep_until(time.perf_counter() + self.call_cost)
+
+    def parse_chord(self, keys):
+        """Canonical key names; rejects what SendInput could not resolve without the keyboard library"""
+        names = tuple(chord_names(keys))
+        for name in names:
+            if not name:
+                raise ValueError(f"Empty key in {keys!r}")
+            if name not in WINDOWS_VK and len(name) != 1:
+                raise ValueError(f"Unknown key: {name!r}")
+        return names
+
+    def send_chord(self, chord):
+        self.record("chord", chord)
+
+    def chord_down(self, chord):
+        self.record("down", chord)
+
+    def chord_up(self, chord):
+        self.record("up", chord)
+
+    def type_keys(self, text):
+        for character in text:
+            self.record("key", character)
+
+    def type_chunk(self, text):
+        self.record("unicode", text)
+
+injector = None  # Chosen on first use; benchmarks swap in RecordingBackend
+# Held by the executor for each action and by the macro thread for each step, so a
+# macro's keystrokes never land in the middle of a button's
+injection_lock = threading.Lock()
+
+def get_injector():
+    """The key injection backend for this platform"""
+    global injector
+    if injector is None:
+        if sys.platform == "win32":
+            injector = SendInputBackend()
+        elif sys.platform.startswith("linux") and shutil.which("xdotool") and os.environ.get("DISPLAY"):
+            injector = XdotoolBackend()
+        else:
+            injector = KeyboardLibBackend()
+        log.info("Key injection backend", backend=injector.name)
+    return injector
+
+class WindowsClipboard:
+    """Unicode text get/set through the Win32 clipboard API."""
+
+    def __init__(self):
+        self.user32 = ctypes.WinDLL('user32', use_last_error=True)
+        self.kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+        self.user32.GetClipboardData.restype = wintypes.HANDLE
+        self.user32.SetClipboardData.argtypes = [wintypes.UINT, wintypes.HANDLE]
+        self.user32.SetClipboardData.restype = wintypes.HANDLE
+        self.kernel32.GlobalAlloc.argtypes = [wintypes.UINT, ctypes.c_size_t]
+        self.kernel32.GlobalAlloc.restype = wintypes.HGLOBAL
+        self.kernel32.GlobalLock.argtypes = [wintypes.HGLOBAL]
+        self.kernel32.GlobalLock.restype = wintypes.LPVOID
+        self.kernel32.GlobalUnlock.argtypes = [wintypes.HGLOBAL]
+
+    def open(self):
+        # Another program may be holding it for a moment
+        for attempt in range(10):
+            if self.user32.OpenClipboard(None):
+                return
+            time.sleep(0.01)
+        raise OSError("Clipboard is busy")
+
+    def get_text(self):
+        self.open()
+        try:
+            handle = self.user32.GetClipboardData(CF_UNICODETEXT)
+            if not handle:
+                return None
+            pointer = self.kernel32.GlobalLock(handle)
+            try:
+                return ctypes.wstring_at(pointer)
+            finally:
+                self.kernel32.GlobalUnlock(handle)
+        finally:
+            self.user32.CloseClipboard()
+
+    def set_text(self, text):
+        self.open()
+        try:
+            self.user32.EmptyClipboard()
+            if text is None:
+                return
+            data = ctypes.create_unicode_buffer(text)
+            handle = self.kernel32.GlobalAlloc(GMEM_MOVEABLE, ctypes.sizeof(data))
+            pointer = self.kernel32.GlobalLock(handle)
+            ctypes.memmove(pointer, data, ctypes.sizeof(data))
+            self.kernel32.GlobalUnlock(handle)
+            self.user32.SetClipboardData(CF_UNICODETEXT, handle)
+        finally:
+            self.user32.CloseClipboard()
+
+clipboard = None  # Created on first paste; benchmarks swap in RecordingClipboard
+
+def get_clipboard():
+    """The system clipboard, or None where there is no backend for it"""
+    global clipboard
+    if clipboard is None and sys.platform == "win32":
+        clipboard = WindowsClipboard()
+    return clipboard
+
+class RecordingClipboard:
+    """Stand-in for the system clipboard that records reads and writes."""
+
+    def __init__(self, events=None, call_cost=0.0, text=None):
+        self.events = [] if events is None else events
+        self.call_cost = call_cost
+        self.text = text
+
+    def get_text(self):
+        self.events.append((time.perf_counter(), "clipboard_get"))
+        sleep_until(time.perf_counter() + self.call_cost)
+        return self.text
+
+    def set_text(self, text):
+        self.events.append((time.perf_counter(), "clipboard_set", text))
+        sleep_until(time.perf_counter() + self.call_cost)
+        self.text = text
+
+def use_recording_injection(call_cost=0.0):
+    """Swap the injection backend and clipboard for recording fakes and return their shared event list.
+
+    Actions compiled afterwards inject into the list, so the whole pipeline
+    can run headless on any OS. `call_cost` simulates the time each OS call takes.
+    """
+    global injector, clipboard
+    events = []
+    injector = RecordingBackend(events, call_cost)
+    clipboard = RecordingClipboard(events, call_cost)
+    return events
+
+class ClipboardPaster:
+    """Pastes text through the clipboard, then restores the user's own clipboard text.
+
+    Pastes that follow each other before the restore keep the originally saved
+    text, so it is never replaced by one of our own. Only text is restored;
+    a clipboard that held no text is left with the pasted text. Each paste
+    bumps `generation`, so a restore timer that already fired while a newer
+    paste held the lock sees it is stale and does nothing.
+    """
+
+    def __init__(self, restore_delay=PASTE_RESTORE_DELAY):
+        self.restore_delay = restore_delay
+        self.saved = None
+        self.generation = 0
+        self.restore_timer = None
+        self.lock = threading.Lock()
+
+    def paste(self, text):
+        board = get_clipboard()
+        with self.lock:
+            if self.restore_timer is not None:
+                self.restore_timer.cancel()
+            else:
+                self.saved = board.get_text()
+            self.generation += 1
+            board.set_text(text)
+            backend = get_injector()
+            backend.send_chord(backend.parse_chord("ctrl+v"))
+            self.restore_timer = threading.Timer(self.restore_delay, self.restore, (self.generation,))
+            self.restore_timer.daemon = True
+            self.restore_timer.start()
+
+    def restore(self, generation):
+        with self.lock:
+            if generation != self.generation:
+                return  # A later paste owns the clipboard and its own restore
+            if self.saved is not None:
+                get_clipboard().set_text(self.saved)
+            self.saved = None
+            self.restore_timer = None
+
+paster = ClipboardPaster()
+
+def text_mode_for(text, mode="auto"):
+    """The strategy to use for this text, given the backends available here"""
+    if mode == "paste" or (mode == "auto" and len(text) >= PASTE_THRESHOLD):
+        if get_clipboard() is not None:
+            return "paste"
+        mode = "auto"
+    return "unicode" if mode == "auto" else mode
+
+def inject_text(text, mode="auto"):
+    """Type text with one of TEXT_MODES: per-key, batched Unicode, or clipboard paste"""
+    mode = text_mode_for(text, mode)
+    if mode == "paste":
+        paster.paste(text)
+    elif mode == "unicode":
+        get_injector().type_unicode(text)
+    else:
+        get_injector().type_keys(text)
+
+VOLUME_KEYS = {"up": "volume up", "down": "volume down", "mute": "volume mute"}
+MEDIA_KEYS = {
+    "play/pause": "play/pause media",
+    "next": "next track",
+    "previous": "previous track",
+    "stop": "stop media",
+}
+
+class CompiledAction(namedtuple("CompiledAction", "kind source run args")):
+    """An action string parsed once into a ready-to-run call; `source` is the string it came from."""
+    __slots__ = ()
+
+    def __call__(self):
+        return self.run(*self.args)
+
+def _noop():
+    pass
+
+def _fail(message):
+    raise ValueError(message)
+
+def chord_action(kind, source, keys, hold=None):
+    """Action pressing `keys` on the current backend; a bad key name fails when pressed, like before"""
+    backend = get_injector()
+    try:
+        chord = backend.parse_chord(keys)
+    except Exception as e:
+        return CompiledAction(kind, source, _fail, (f"{keys}: {e}",))
+    if hold is not None:
+        return CompiledAction(kind, source, backend.press_chord, (chord, hold))
+    return CompiledAction(kind, source, backend.send_chord, (chord,))
+
+# Prefixes that are commands only in actions the editor built from an explicit type; plain text
+# starting with one is stored as "text:<text>" (see text_action)
+TYPED_PREFIXES = ("text",) + TEXT_MODES[1:] + ("macro", "profile", "layer")
+
+def text_action(entry, mode="auto"):
+    """Action string typing `entry` with one of TEXT_MODES, never mistaken for a command"""
+    if mode != "auto":
+        return f"{mode}:{entry}"
+    prefix, colon, _ = entry.strip().partition(":")
+    return f"text:{entry}" if colon and prefix in TYPED_PREFIXES else entry
+
+def compile_action(action):
+    """Turn an action string ("hotkey:ctrl+c", "press:f13", "volume:up", text...) into a CompiledAction"""
+    source = action
+    action = action.strip()
+    if not action:
+        return CompiledAction("none", source, _noop, ())
+
+    prefix, _, key = action.partition(":")
+    if prefix == "hotkey":
+        return chord_action("hotkey", source, key)
+    if prefix == "press":
+        if key.startswith("f") and key[1:].isdigit() and 1 <= int(key[1:]) <= 24:
+            return chord_action("fkey", source, key, hold=KEY_HOLD)  # Held, as games poll for these
+        return chord_action("press", source, key)
+    if prefix == "volume" and key in VOLUME_KEYS:
+        return chord_action("volume", source, VOLUME_KEYS[key])
+    if prefix == "media" and key in MEDIA_KEYS:
+        return chord_action("media", source, MEDIA_KEYS[key])
+    if prefix in ("volume", "media"):
+        return CompiledAction("none", source, _noop, ())
+    if prefix == "macro":
+        return CompiledAction("macro", source, macros.play, (key.strip(),))
+    if prefix == "text":
+        return CompiledAction("text", source, inject_text, (key,))
+    if prefix in TEXT_MODES[1:]:
+        return CompiledAction("text", source, inject_text, (key, prefix))
+    if prefix in ("profile", "layer"):
+        # Deck-side profile switches; handle_command acts on these instead of running them
+        return CompiledAction(prefix, source, _noop, (key.strip(),))
+    return CompiledAction("text", source, inject_text, (action,))
+
+RATE_POLICIES = ("token_bucket", "drop", "coalesce", "queue")
+DEFAULT_RATE_POLICY = "token_bucket"
+DEFAULT_RATE_INTERVAL = 0.1  # Seconds per token / minimum spacing between runs of one key
+DEFAULT_RATE_BURST = 3  # Presses a token bucket lets through back to back
+DEFAULT_BOUNCE_WINDOW = 0.008  # Calls on one key closer together than this are contact bounce, not presses
+
+class _RateState:
+    __slots__ = ("tokens", "refilled", "last", "seen", "pending")
+
+    def __init__(self, burst):
+        self.tokens = burst
+        self.refilled = None
+        self.last = None
+        self.seen = None
+        self.pending = None
+
+class RateLimiter:
+    """Per-key rate limiting on a monotonic clock.
+
+    Each key (a button, a UI action) has its own state, so a press on one
+    button never costs another button anything. Policies:
+
+    token_bucket  one token every `interval`, at most `burst` saved; no token -> drop
+    drop          run only if `interval` has passed since the key last ran
+    coalesce      inside the window keep only the latest call, run it when the window ends
+    queue         never drop; delay calls so runs stay `interval` apart
+
+    In front of token_bucket and drop sits a bounce window: a call within
+    `bounce` seconds of the key's previous call, run or not, is dropped, so
+    a bouncing contact runs once however long it chatters instead of
+    spending the whole burst.
+    """
+
+    def __init__(self, policy=DEFAULT_RATE_POLICY, interval=DEFAULT_RATE_INTERVAL, burst=DEFAULT_RATE_BURST,
+                 clock=time.monotonic, schedule=None, bounce=DEFAULT_BOUNCE_WINDOW):
+        self.default = self.check_policy(policy, interval, burst)
+        self.bounce = bounce
+        self.clock = clock
+        self.schedule = schedule or self.start_timer
+        self.lock = threading.Lock()
+        self.policies = {}
+        self.states = {}
+        self.passed = {}
+        self.dropped = {}
+        self.coalesced = {}
+        self.delayed = {}
+
+    @staticmethod
+    def check_policy(policy, interval, burst):
+        if policy not in RATE_POLICIES:
+            raise ValueError(f"Unknown rate limit policy: {policy}")
+        if interval < 0 or burst < 1:
+            raise ValueError(f"Invalid rate limit: interval={interval}, burst={burst}")
+        return policy, float(interval), int(burst)
+
+    @staticmethod
+    def start_timer(delay, func):
+        timer = threading.Timer(delay, func)
+        timer.daemon = True
+        timer.start()
+        return timer
+
+    def configure(self, key, policy=None, interval=None, burst=None):
+        """Override the default policy for one key; omitted values keep the defaults"""
+        default_policy, default_interval, default_burst = self.default
+        self.policies[key] = self.check_policy(policy or default_policy,
+                                               default_interval if interval is None else interval,
+                                               default_burst if burst is None else burst)
+        self.states.pop(key, None)
+
+    def clear(self, key):
+        """Put one key back on the default policy"""
+        self.policies.pop(key, None)
+        self.states.pop(key, None)
+
+    def submit(self, key, func):
+        """Run `func` now, later or never according to the key's policy. Returns False if dropped."""
+        policy, interval, burst = self.policies.get(key, self.default)
+        with self.lock:
+            now = self.clock()
+            state = self.states.get(key)
+            if state is None:
+                state = self.states[key] = _RateState(burst)
+
+            if policy in ("token_bucket", "drop"):
+                seen, state.seen = state.seen, now
+                if seen is not None and now - seen < self.bounce:
+                    return self.count(self.dropped, key, False)
+            if policy == "token_bucket":
+                if state.refilled is not None:
+                    refill = (now - state.refilled) / interval if interval else burst
+                    state.tokens = min(burst, state.tokens + refill)
+                state.refilled = now
+                if state.tokens < 1:
+                    return self.count(self.dropped, key, False)
+                state.tokens -= 1
+                delay = 0
+            elif policy == "drop":
+                if state.last is not None and now - state.last < interval:
+                    return self.count(self.dropped, key, False)
+                delay = 0
+            elif policy == "coalesce":
+                if state.pending is not None:
+                    state.pending = func
+                    return self.count(self.coalesced, key, True)
+                delay = 0 if state.last is None else state.last + interval - now
+                if delay > 0:
+                    state.pending = func
+                    self.schedule(delay, lambda: self.run_pending(key))
+                    return True
+            else:  # queue
+                delay = 0 if state.last is None else state.last + interval - now
+                if delay > 0:
+                    state.last = now + delay
+                    self.count(self.delayed, key, True)
+                    self.schedule(delay, func)
+                    return self.count(self.passed, key, True)
+
+            state.last = now
+            self.count(self.passed, key, True)
+        func()
+        return True
+
+    def run_pending(self, key):
+        with self.lock:
+            state = self.states.get(key)
+            if state is None or state.pending is None:
+                return
+            func, state.pending = state.pending, None
+            state.last = self.clock()
+            self.count(self.passed, key, True)
+        func()
+
+    @staticmethod
+    def count(counter, key, result):
+        counter[key] = counter.get(key, 0) + 1
+        return result
+
+    def stats(self):
+        return {
+            "passed": dict(self.passed),
+            "dropped": dict(self.dropped),
+            "coalesced": dict(self.coalesced),
+            "delayed": dict(self.delayed),
+        }
+
+GESTURES = ("tap", "double", "long", "repeat")
+DOUBLE_TAP_WINDOW = 0.25  # A second press this soon after a release is a double tap
+LONG_PRESS_TIME = 0.5  # Held this long is a long press
+REPEAT_DELAY = 0.4  # Hold-to-repeat starts after this...
+REPEAT_INTERVAL = 0.08  # ...and then fires this often
+
+class _GestureState:
+    __slots__ = ("down", "handled", "pending", "generation", "timer")
+
+    def __init__(self):
+        self.down = False
+        self.handled = False
+        self.pending = False
+        self.generation = 0
+        self.timer = None
+
+class GestureRecognizer:
+    """Per-button state machine turning press and release edges into gestures.
+
+    `gestures_for(button)` returns the gestures a button uses besides a plain
+    tap ("double", "long", "repeat"). A button without any, and every button
+    whose deck does not report releases (`releases(button)`), fires "tap" on
+    the press edge with nothing added. Otherwise:
+
+    repeat  "tap" on press, then "repeat" every REPEAT_INTERVAL once held REPEAT_DELAY
+    long    "long" once held LONG_PRESS_TIME, else "tap" on release
+    double  a second press within DOUBLE_TAP_WINDOW of the release is "double";
+            a single tap fires when the window closes
+
+    Gestures go to `on_gesture(button, gesture, received)`, from the caller's
+    thread for edges and from a timer otherwise (`received` is then None).
+    Stale timers are recognised by a per-button generation number.
+    """
+
+    def __init__(self, on_gesture, gestures_for=None, releases=None, schedule=None):
+        self.on_gesture = on_gesture
+        self.gestures_for = gestures_for or (lambda button: ())
+        self.releases = releases or (lambda button: True)
+        self.schedule = schedule or RateLimiter.start_timer
+        self.lock = threading.Lock()
+        self.states = {}
+        self.counts = dict.fromkeys(GESTURES, 0)
+
+    def emit(self, button, gesture, received=None):
+        self.counts[gesture] += 1
+        self.on_gesture(button, gesture, received)
+
+    @staticmethod
+    def disarm(state):
+        if state.timer is not None:
+            state.timer.cancel()
+            state.timer = None
+
+    def arm(self, state, delay, func, *args):
+        """Replace the button's timer; callers hold the lock"""
+        self.disarm(state)
+        state.timer = self.schedule(delay, partial(func, state, state.generation, *args))
+
+    def press(self, button, received=None):
+        gestures = self.gestures_for(button)
+        if not gestures or not self.releases(button):
+            self.emit(button, "tap", received)
+            return
+        with self.lock:
+            state = self.states.get(button)
+            if state is None:
+                state = self.states[button] = _GestureState()
+            state.generation += 1
+            state.down = True
+            state.handled = False
+            gesture = None
+            if state.pending:
+                state.pending = False
+                state.handled = True
+                gesture = "double"
+            elif "repeat" in gestures:
+                state.handled = True
+                gesture = "tap"
+                self.arm(state, REPEAT_DELAY, self.repeat, button)
+            elif "long" in gestures:
+                self.arm(state, LONG_PRESS_TIME, self.long_press, button)
+        if gesture:
+            self.emit(button, gesture, received)
+
+    def release(self, button, received=None):
+        with self.lock:
+            state = self.states.get(button)
+            if state is None or not state.down:
+                return  # The press took the tap fast path
+            state.generation += 1
+            state.down = False
+            self.disarm(state)
+            if state.handled:
+                return
+            if "double" in (self.gestures_for(button) or ()):
+                state.pending = True
+                self.arm(state, DOUBLE_TAP_WINDOW, self.window_closed, button)
+                return
+        self.emit(button, "tap", received)
+
+    def long_press(self, state, generation, button):
+        with self.lock:
+            if state.generation != generation or not state.down:
+                return
+            state.handled = True
+        self.emit(button, "long")
+
+    def repeat(self, state, generation, button):
+        with self.lock:
+            if state.generation != generation or not state.down:
+                return
+            self.arm(state, REPEAT_INTERVAL, self.repeat, button)
+        self.emit(button, "repeat")
+
+    def window_closed(self, state, generation, button):
+        with self.lock:
+            if state.generation != generation or not state.pending:
+                return
+            state.pending = False
+        self.emit(button, "tap")
+
+    def reset(self):
+        """Forget held buttons and pending taps, e.g. after the deck went away"""
+        with self.lock:
+            for state in self.states.values():
+                self.disarm(state)
+            self.states.clear()
+
+BUTTONS = ['A', 'B', 'C', 'D', 'E', 'F', 'G', 'H']
+
+KEEPALIVE_INTERVAL = 1.0  # A PING goes out once the line has been quiet this long
+LIVENESS_TIMEOUT = 3.0  # No traffic for this long means the deck is gone
+HOST_TIMEOUT = 5.0  # streamdeck.ino drops back to text after this long without a binary host frame...
+HOST_HEARTBEAT = 2.0  # ...so in binary mode the host sends one at least this often, busy line or not
+
+MAX_FRAME_LENGTH = 256  # Longer runs without a newline are line noise and get dropped
+
+class FrameParser:
+    """Incremental parser for the deck's newline-framed serial stream.
+
+    Bytes are accumulated in a bytearray and frames are located in place, so a
+    single-byte button code (A-H) maps straight to its button id through a
+    lookup table without building a bytes or str object. Only the rare text
+    frames (DECK, PONG, ...) are decoded, directly from a memoryview slice. A
+    partial frame at the end of a chunk stays buffered until the rest arrives.
+    With `on_release`, the lowercase code (a-h) of a button is its release.
+    """
+
+    def __init__(self, on_button, on_line=None, buttons=BUTTONS, on_release=None):
+        self.on_button = on_button
+        self.on_line = on_line
+        self.on_release = on_release
+        self.buffer = bytearray()
+        self.button_codes = [None] * 256
+        self.release_codes = [None] * 256
+        for button in buttons:
+            if len(button) == 1:
+                self.button_codes[ord(button)] = button
+                if on_release and button.lower() != button:
+                    self.release_codes[ord(button.lower())] = button
+
+    def feed(self, data):
+        """Consume a chunk of received bytes and dispatch every complete frame in it"""
+        buffer = self.buffer
+        buffer += data
+        end = buffer.find(b"\n")
+        if end < 0:
+            if len(buffer) > MAX_FRAME_LENGTH:
+                buffer.clear()
+            return
+
+        codes = self.button_codes
+        releases = self.release_codes
+        view = memoryview(buffer)
+        pos = 0
+        try:
+            while end >= 0:
+                length = end - pos
+                # Fast path: "X\n" or "X\r\n" with X a button code
+                button = codes[buffer[pos]] if length == 1 or (length == 2 and buffer[pos + 1] == 13) else None
+                if button is not None:
+                    self.on_button(button)
+                elif length <= 2 and releases[buffer[pos]] is not None and (length == 1 or buffer[pos + 1] == 13):
+                    self.on_release(releases[buffer[pos]])
+                else:
+                    start, stop = pos, end
+                    # Trim CR/whitespace around the frame by index instead of strip()
+                    while start < stop and buffer[start] in b" \t\r\x0b\x0c":
+                        start += 1
+                    while stop > start and buffer[stop - 1] in b" \t\r\x0b\x0c":
+                        stop -= 1
+                    if stop - start == 1 and codes[buffer[start]] is not None:
+                        self.on_button(codes[buffer[start]])
+                    elif stop - start == 1 and releases[buffer[start]] is not None:
+                        self.on_release(releases[buffer[start]])
+                    elif stop > start and self.on_line:
+                        self.on_line(str(view[start:stop], "utf-8", "replace"))
+
+                pos = end + 1
+                end = buffer.find(b"\n", pos)
+        finally:
+            view.release()
+        del buffer[:pos]
+
+    def reset(self):
+        self.buffer.clear()
+
+# Binary protocol v1, negotiated with "BIN <baud>" after the DECK handshake. Every
+# frame is 6 bytes: start byte, version, sequence, type, argument, CRC-8 of bytes 1-4.
+FRAME_START = 0xA5
+PROTOCOL_VERSION = 1
+FRAME_LENGTH = 6
+FRAME_PRESS = 0x01
+FRAME_RELEASE = 0x02
+FRAME_PING = 0x10
+FRAME_PONG = 0x11
+FRAME_DECK = 0x12
+FRAME_TEST = 0x13
+CAP_RELEASE = 0x01  # DECK frame argument bit: the deck reports releases
+TEXT_BAUD = 9600
+BINARY_BAUD = 115200
+CONFIRM_TIMEOUT = 1.0  # The firmware falls back to text if no binary frame arrives by then
+
+def _crc8_table(poly=0x07):
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = ((crc << 1) ^ poly) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+        table.append(crc)
+    return bytes(table)
+
+CRC8_TABLE = _crc8_table()
+
+def crc8(data):
+    crc = 0
+    for byte in data:
+        crc = CRC8_TABLE[crc ^ byte]
+    return crc
+
+def encode_frame(frame_type, argument=0, sequence=0):
+    body = bytes((PROTOCOL_VERSION, sequence & 0xFF, frame_type, argument))
+    return bytes((FRAME_START,)) + body + bytes((crc8(body),))
+
+class BinaryFrameParser:
+    """Incremental parser for binary protocol v1 frames.
+
+    Same callback shape as FrameParser: press frames go to `on_button` with the
+    button id for their index, release frames to `on_release` when given, every
+    other frame to `on_frame(type, argument)`.
+    A frame with a bad version or checksum costs one byte and the scan resumes
+    at the next start byte. Gaps in the sequence number are counted in `lost`.
+    """
+
+    def __init__(self, on_button, on_frame=None, buttons=BUTTONS, on_release=None):
+        self.on_button = on_button
+        self.on_frame = on_frame
+        self.on_release = on_release
+        self.buttons = list(buttons)
+        self.buffer = bytearray()
+        self.sequence = None
+        self.errors = 0
+        self.lost = 0
+
+    def feed(self, data):
+        buffer = self.buffer
+        buffer += data
+        table = CRC8_TABLE
+        size = len(buffer)
+        pos = 0
+        while True:
+            start = buffer.find(FRAME_START, pos)
+            if start < 0:
+                pos = size
+                break
+            if size - start < FRAME_LENGTH:
+                pos = start
+                break
+            version, sequence, frame_type, argument, checksum = buffer[start + 1:start + FRAME_LENGTH]
+            if version != PROTOCOL_VERSION or table[table[table[table[version] ^ sequence] ^ frame_type] ^ argument] != checksum:
+                self.errors += 1
+                pos = start + 1
+                continue
+
+            if self.sequence is not None:
+                self.lost += (sequence - self.sequence - 1) & 0xFF
+            self.sequence = sequence
+            if frame_type == FRAME_PRESS and argument < len(self.buttons):
+                self.on_button(self.buttons[argument])
+            elif frame_type == FRAME_RELEASE and self.on_release and argument < len(self.buttons):
+                self.on_release(self.buttons[argument])
+            elif self.on_frame:
+                self.on_frame(frame_type, argument)
+            pos = start + FRAME_LENGTH
+        del buffer[:pos]
+
+    def reset(self):
+        self.buffer.clear()
+        self.sequence = None
+
+def negotiate_protocol(ser, baud=BINARY_BAUD, timeout=1.0):
+    """Ask the deck to switch to the binary protocol at `baud` after the DECK handshake.
+
+    Old firmware ignores the request and the port stays on the text protocol.
+    If the deck agrees but never answers a binary TEST at the new rate, the
+    host returns to TEXT_BAUD and waits out the firmware's own fallback.
+    Returns "binary" or "text".
+    """
+    old_timeout = ser.timeout
+    ser.timeout = 0.1
+    try:
+        ser.reset_input_buffer()
+        ser.write(f"BIN {baud}\n".encode())
+        reply = None
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            line = ser.readline().strip()
+            if line.startswith(b"OK ") or line == b"NO":
+                reply = line
+                break
+        if reply != f"OK {baud}".encode():
+            return "text"
+
+        ser.baudrate = baud
+        confirmed = []
+        parser = BinaryFrameParser(lambda button: None,
+                                   lambda frame_type, argument: confirmed.append(frame_type == FRAME_DECK))
+        for sequence in range(5):
+            ser.write(encode_frame(FRAME_TEST, 0, sequence))
+            parser.feed(ser.read(ser.in_waiting or 1))
+            if any(confirmed):
+                return "binary"
+
+        ser.baudrate = TEXT_BAUD
+        time.sleep(CONFIRM_TIMEOUT + 0.2)
+        ser.reset_input_buffer()
+        return "text"
+    finally:
+        ser.timeout = old_timeout
+
+# Deck traffic journal. A file is JOURNAL_MAGIC followed by records: a JOURNAL_RECORD
+# header (perf_counter nanoseconds, kind, channel, length) and that many bytes.
+JOURNAL_MAGIC = b"SDJ1"
+JOURNAL_RECORD = struct.Struct("<QBBH")
+JOURNAL_RX = 0  # Bytes as read from the deck
+JOURNAL_TX = 1  # Bytes as written to the deck
+JOURNAL_OPEN = 2  # A connection started; JSON with its device, port, identity and protocol
+JOURNAL_CLOSE = 3
+JOURNAL_MAX_BYTES = 4 * 1024 * 1024  # A file is rotated before it grows past this
+JOURNAL_BACKUPS = 3  # Rotated files kept as .1 (newest) to .3
+JOURNAL_FLUSH_INTERVAL = 0.5
+
+def device_channel(device):
+    """Journal channel of a deck: its number, deck2 -> 2"""
+    number = device[4:] if device.startswith("deck") else ""
+    return int(number) if number.isdigit() else 0
+
+class DeckJournal:
+    """Append-only binary capture of every byte to and from the decks, for replay_journal.
+
+    Recording only appends to a buffer under a lock; a thread writes it out
+    every JOURNAL_FLUSH_INTERVAL. Each run starts a new file (the previous
+    one is rotated away) and a file is rotated before it would grow past
+    `max_bytes`. A new file opens by repeating the OPEN records of the decks
+    still connected, so every file replays on its own.
+    """
+
+    def __init__(self, path, max_bytes=JOURNAL_MAX_BYTES, backups=JOURNAL_BACKUPS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.lock = threading.Lock()
+        self.io_lock = threading.Lock()
+        self.buffer = bytearray()
+        self.channels = {}  # channel -> OPEN record data, as of the end of the buffer
+        self.flushed_channels = {}  # The same, as of the end of the file
+        self.file = None
+        self.size = 0
+        self.records = 0
+        self.rotations = 0
+        self.closed = threading.Event()
+
+    def start(self):
+        with self.io_lock:
+            if os.path.exists(self.path) and os.path.getsize(self.path):
+                self.rotate()
+            else:
+                self.open_file()
+        threading.Thread(target=self.flush_loop, daemon=True).start()
+        return self
+
+    def record(self, kind, channel, data=b"", stamp=None):
+        """Append one record; `stamp` is in perf_counter nanoseconds, now by default"""
+        if stamp is None:
+            stamp = time.perf_counter_ns()
+        if len(data) <= 0xFFFF:
+            header = JOURNAL_RECORD.pack(stamp, kind, channel, len(data))
+            with self.lock:
+                self.buffer += header
+                self.buffer += data
+                self.records += 1
+            return
+        with self.lock:
+            for start in range(0, len(data), 0xFFFF):
+                chunk = data[start:start + 0xFFFF]
+                self.buffer += JOURNAL_RECORD.pack(stamp, kind, channel, len(chunk))
+                self.buffer += chunk
+                self.records += 1
+
+    def open_channel(self, channel, details):
+        data = json.dumps(details).encode()
+        with self.lock:
+            self.channels[channel] = data
+        self.record(JOURNAL_OPEN, channel, data)
+
+    def close_channel(self, channel):
+        with self.lock:
+            self.channels.pop(channel, None)
+        self.record(JOURNAL_CLOSE, channel)
+
+    def flush(self):
+        with self.io_lock:
+            with self.lock:
+                data, self.buffer = self.buffer, bytearray()
+                channels = dict(self.channels)
+            if not data or self.file is None:
+                return
+            try:
+                if self.size + len(data) > self.max_bytes and self.size > len(JOURNAL_MAGIC):
+                    self.rotate()
+                    stamp = JOURNAL_RECORD.unpack_from(data)[0]
+                    data = b"".join(JOURNAL_RECORD.pack(stamp, JOURNAL_OPEN, channel, len(details)) + details
+                                    for channel, details in self.flushed_channels.items()) + data
+                self.file.write(data)
+                self.file.flush()
+                self.size += len(data)
+            except OSError as e:
+                log.error("Journal write error", path=self.path, error=e)
+            self.flushed_channels = channels
+
+    def rotate(self):
+        if self.file:
+            self.file.close()
+        for number in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{number}"):
+                os.replace(f"{self.path}.{number}", f"{self.path}.{number + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        self.rotations += 1
+        self.open_file()
+
+    def open_file(self):
+        self.file = open(self.path, "wb")
+        self.file.write(JOURNAL_MAGIC)
+        self.size = len(JOURNAL_MAGIC)
+
+    def flush_loop(self):
+        while not self.closed.wait(JOURNAL_FLUSH_INTERVAL):
+            self.flush()
+
+    def close(self):
+        self.closed.set()
+        self.flush()
+        with self.io_lock:
+            if self.file:
+                self.file.close()
+                self.file = None
+
+    def stats(self):
+        return {"path": self.path, "records": self.records, "bytes": self.size, "rotations": self.rotations}
+
+def journal_files(path, backups=JOURNAL_BACKUPS):
+    """A journal's files oldest first: the rotated copies, then `path` itself"""
+    return [f"{path}.{number}" for number in range(backups, 0, -1) if os.path.exists(f"{path}.{number}")] + [path]
+
+def read_journal(path):
+    """Yield (stamp ns, kind, channel, data) for each record of one journal file.
+
+    A record cut short, by a crash during a write, ends the file.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    if not data.startswith(JOURNAL_MAGIC):
+        raise ValueError(f"Not a deck journal: {path}")
+    offset = len(JOURNAL_MAGIC)
+    while offset + JOURNAL_RECORD.size <= len(data):
+        stamp, kind, channel, length = JOURNAL_RECORD.unpack_from(data, offset)
+        offset += JOURNAL_RECORD.size
+        if offset + length > len(data):
+            break
+        yield stamp, kind, channel, data[offset:offset + length]
+        offset += length
+
+class DeckConnection:
+    """An open deck port with a blocking reader thread and a separate keepalive thread.
+
+    `protocol` is "text" for the newline protocol or "binary" once
+    negotiate_protocol has switched the deck over. With `on_release` the text
+    protocol asks the deck for releases (REL); `releases` turns True once the
+    deck has shown it reports them. With a `journal` every byte read and
+    written is recorded under `channel`.
+    """
+
+    def __init__(self, ser, on_button, on_lost=None, buttons=BUTTONS, protocol="text",
+                 keepalive_interval=KEEPALIVE_INTERVAL, liveness_timeout=LIVENESS_TIMEOUT, on_release=None,
+                 journal=None, channel=0):
+        self.ser = ser
+        self.journal = journal
+        self.channel = channel
+        self.device = None  # Name and port identity, set by DeckMonitor
+        self.identity = None
+        self.on_button = on_button
+        self.on_release = on_release
+        self.releases = False
+        self.on_lost = on_lost
+        self.buttons = list(buttons)
+        self.protocol = protocol
+        self.tx_sequence = 0
+        self.parser = None
+        self.keepalive_interval = keepalive_interval
+        self.liveness_timeout = liveness_timeout
+        self.last_rx = time.monotonic()
+        self.received = 0.0
+        self.pings = 0
+        self.write_lock = threading.Lock()
+        self.close_lock = threading.Lock()
+        self.closed = threading.Event()
+        self.reader_thread = threading.Thread(target=self.read_loop, daemon=True)
+        self.keepalive_thread = threading.Thread(target=self.keepalive_loop, daemon=True)
+
+    def start(self):
+        self.reader_thread.start()
+        if self.on_release and self.protocol == "text":
+            self.write(b"REL\n")
+        if self.keepalive_interval:
+            self.keepalive_thread.start()
+        return self
+
+    def write(self, data):
+        with self.write_lock:
+            self.ser.write(data)
+            if self.journal:
+                self.journal.record(JOURNAL_TX, self.channel, data)
+
+    def send_frame(self, frame_type, argument=0):
+        with self.write_lock:
+            frame = encode_frame(frame_type, argument, self.tx_sequence)
+            self.ser.write(frame)
+            self.tx_sequence = (self.tx_sequence + 1) & 0xFF
+            if self.journal:
+                self.journal.record(JOURNAL_TX, self.channel, frame)
+
+    def read_loop(self):
+        """Block on incoming bytes and dispatch every complete frame the moment it arrives"""
+        on_release = self.dispatch_release if self.on_release else None
+        if self.protocol == "binary":
+            parser = BinaryFrameParser(self.dispatch_button, self.handle_frame, self.buttons, on_release)
+        else:
+            parser = FrameParser(self.dispatch_button, self.handle_line, self.buttons, on_release)
+        self.parser = parser
+        journal = self.journal
+        try:
+            while not self.closed.is_set():
+                # Bulk-read whatever is waiting; read() returns as soon as a byte
+                # is available and the port timeout only bounds idle waits
+                chunk = self.ser.read(self.ser.in_waiting or 1)
+                if not chunk:
+                    continue
+                self.received = time.perf_counter()
+                self.last_rx = time.monotonic()
+                parser.feed(chunk)
+                if journal:  # After the dispatch, stamped with the read time
+                    journal.record(JOURNAL_RX, self.channel, chunk, int(self.received * 1e9))
+        except Exception as e:
+            if not self.closed.is_set():
+                log.error("Arduino read error", error=e)
+        self.close()
+
+    def dispatch_button(self, button):
+        log.debug("Button press received", button=button)
+        self.on_button(button, self.received)
+
+    def dispatch_release(self, button):
+        log.debug("Button release received", button=button)
+        self.releases = True
+        self.on_release(button, self.received)
+
+    def handle_line(self, data):
+        log.debug("Line received", line=data)
+        if data == "OK REL":
+            self.releases = True
+        elif data not in ("PONG", "DECK", "PING"):
+            log.warning("Unknown command received", line=data)
+
+    def handle_frame(self, frame_type, argument):
+        log.debug("Frame received", type=frame_type, argument=argument)
+        if frame_type == FRAME_DECK and argument & CAP_RELEASE:
+            self.releases = True
+        elif frame_type not in (FRAME_PONG, FRAME_DECK, FRAME_RELEASE):
+            log.warning("Unknown frame received", type=f"{frame_type:#x}", argument=argument)
+
+    def keepalive_loop(self):
+        """Watch for silence and PING only when the line is idle, without ever touching the read path.
+
+        Any received byte counts as a sign of life, so while the deck is
+        talking (presses, its own DECK keepalives) nothing is sent, except the
+        binary heartbeat the firmware needs to stay in binary mode.
+        """
+        last_tx = time.monotonic()
+        while True:
+            now = time.monotonic()
+            silent = now - self.last_rx
+            if silent > self.liveness_timeout:
+                log.warning("No traffic from Arduino, connection appears to be lost")
+                break
+            since_tx = now - last_tx
+            heartbeat = HOST_HEARTBEAT if self.protocol == "binary" else math.inf
+            if since_tx >= heartbeat or (silent >= self.keepalive_interval and since_tx >= self.keepalive_interval):
+                try:
+                    if self.protocol == "binary":
+                        self.send_frame(FRAME_PING)
+                    else:
+                        self.write(b"PING\n")
+                except Exception as e:
+                    if not self.closed.is_set():
+                        log.error("Keepalive write error", error=e)
+                    break
+                self.pings += 1
+                last_tx, since_tx = now, 0.0
+            # Sleep until a PING could next be due or the silence would become a loss
+            wake = min(max(self.keepalive_interval - silent, self.keepalive_interval - since_tx),
+                       heartbeat - since_tx, self.liveness_timeout - silent + 0.01)
+            if self.closed.wait(max(wake, 0.01)):
+                return
+        self.close()
+
+    def close(self):
+        with self.close_lock:
+            if self.closed.is_set():
+                return
+            self.closed.set()
+        try:
+            self.ser.close()
+        except:
+            pass
+        if self.journal:
+            self.journal.close_channel(self.channel)
+        if self.on_lost:
+            self.on_lost(self)
+
+PROBE_WORKERS = 4  # Ports probed at the same time during discovery
+RESET_DELAY = 2.0  # Opening the port resets the Arduino; its sketch prints DECK once it is up
+PROBE_TIMEOUT = 5.0  # Give up on a port that has not identified itself by then
+DEFAULT_PORT = "COM3"  # Tried first when no device has been cached yet
+PORT_POLL_INTERVAL = 0.25  # The port list is checked this often for decks coming and going
+HOTPLUG_GRACE = 10.0  # A new port is retried this long; Windows lists it before it can be opened
+FULL_SCAN_INTERVAL = 30.0  # Ports that were there all along are probed again this rarely
+
+def port_identity(port):
+    """Stable identity for a serial port: USB VID/PID/serial number when known, else the device name."""
+    if port.vid is not None and port.pid is not None:
+        return f"{port.vid:04X}:{port.pid:04X}:{port.serial_number or port.device}"
+    return port.device
+
+class NotADeck(Exception):
+    """A port answered the probe with text, none of it DECK: some other serial device"""
+
+def probe_port(port, cancelled=None, timeout=PROBE_TIMEOUT):
+    """Open `port` and wait for the deck to identify itself.
+
+    The deck prints DECK from setup() and once a second afterwards, so the
+    probe returns as soon as that line shows up instead of sleeping through
+    the reset. TEST is only sent after RESET_DELAY, for boards that were not
+    reset by opening the port. Returns the open Serial, or None; raises
+    NotADeck if the port sent readable lines but never DECK.
+    """
+    ser = None
+    answered = False
+    try:
+        ser = serial.Serial(
+            port=port.device,
+            baudrate=9600,
+            timeout=0.25,
+            write_timeout=1,
+            bytesize=serial.EIGHTBITS,
+            parity=serial.PARITY_NONE,
+            stopbits=serial.STOPBITS_ONE
+        )
+        started = time.monotonic()
+        next_test = started + RESET_DELAY
+        while time.monotonic() - started < timeout:
+            if cancelled is not None and cancelled.is_set():
+                break
+            if time.monotonic() >= next_test:
+                ser.write(b"TEST\n")
+                next_test += 0.5
+            line = ser.readline().strip()
+            if line == b"DECK":
+                ser.timeout = 1
+                return ser
+            # Binary noise, e.g. a deck still at its binary baud, does not count as an answer
+            answered = answered or (line.isascii() and line.decode().isprintable() and bool(line))
+        ser.close()
+    except Exception as e:
+        log.info("Error on port", port=port.device, error=e)
+        try:
+            ser.close()
+        except:
+            pass
+    if answered and not (cancelled is not None and cancelled.is_set()):
+        raise NotADeck(port.device)
+    return None
+
+SETTINGS_DEBOUNCE = 1.0  # Saves within this window are coalesced into one write
+SETTINGS_POLL_INTERVAL = 1.0  # How often the settings file's mtime and size are checked for outside edits
+
+def write_json_atomic(path, data, backup=False):
+    """Write `data` as JSON to a temp file, fsync it and rename it over `path`.
+
+    A crash leaves either the old file or the new one, never half of each.
+    With `backup`, the file being replaced is kept as `path + ".bak"` first;
+    it is linked (or copied) there, so `path` itself never goes missing.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    text = data if isinstance(data, str) else json.dumps(data, ensure_ascii=False, indent=4)
+    temp = path + ".tmp"
+    with open(temp, 'w', encoding='utf-8') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    if backup and os.path.exists(path):
+        staged = path + ".bak.tmp"
+        if os.path.exists(staged):
+            os.remove(staged)
+        try:
+            os.link(path, staged)
+        except OSError:  # No hard links on this file system
+            shutil.copy2(path, staged)
+        os.replace(staged, path + ".bak")
+    os.replace(temp, path)
+
+def write_private(path, text):
+    """Write `text` to `path` readable and writable by the owner only (0600)"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        if hasattr(os, "fchmod"):
+            os.fchmod(f.fileno(), 0o600)  # The file may predate us with looser permissions
+        f.write(text)
+
+class SettingsStore:
+    """Write-behind persistence for a JSON settings file.
+
+    save() only records the latest settings; a timer thread writes them
+    `debounce` seconds later, so a burst of saves costs one write and the Tk
+    thread never touches the disk, nor waits for a write in progress. A write is skipped when the serialized
+    settings match what is already on disk. Writes are atomic and keep the
+    previous file as `.bak`, which load() falls back to if the main file is
+    missing or corrupt. changes() notices edits made by other programs and
+    drops a save still waiting for its timer, so the outside edit is not
+    overwritten with settings from before it.
+    """
+
+    def __init__(self, path, debounce=SETTINGS_DEBOUNCE):
+        self.path = path
+        self.debounce = debounce
+        self.lock = threading.Lock()  # pending and timer; never held across disk I/O
+        self.io_lock = threading.Lock()  # File access, `written` and `signature`; taken before `lock`
+        self.pending = None
+        self.timer = None
+        self.written = None  # Serialized form of what is on disk
+        self.signature = None  # (mtime, size) of the file when it was last read or written here
+        self.writes = 0
+        self.skipped = 0
+
+    def load(self):
+        """Settings dict from the file, or from the last good copy if it is unreadable"""
+        with self.io_lock:
+            for path in (self.path, self.path + ".bak"):
+                try:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        text = f.read()
+                    settings = json.loads(text)
+                    if not isinstance(settings, dict):
+                        raise ValueError("top level is not an object")
+                except FileNotFoundError:
+                    continue
+                except Exception as e:
+                    log.warning("Settings file is corrupt", path=path, error=e)
+                    continue
+                if path != self.path:
+                    log.warning("Recovered settings from the last good copy", path=path)
+                self.written = text if path == self.path else None
+                self.signature = self.stat()
+                return settings
+            return {}
+
+    def stat(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def changes(self):
+        """Settings dict if another program changed the file since it was last read or written, else None.
+
+        A stat() per call while nothing changes. A file caught half written
+        is not valid JSON and is skipped; finishing the write changes the
+        signature again, and the next call picks it up.
+        """
+        # A flush cannot land between reading the file and dropping the pending save
+        with self.io_lock, self.lock:
+            signature = self.stat()
+            if signature is None or signature == self.signature:
+                return None
+            self.signature = signature
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    text = f.read()
+                if text == self.written:
+                    return None  # Touched, or our own write
+                settings = json.loads(text)
+                if not isinstance(settings, dict):
+                    raise ValueError("top level is not an object")
+            except Exception as e:
+                log.warning("Settings file change not applied", path=self.path, error=e)
+                return None
+            self.written = text
+            self.drop_pending()
+            return settings
+
+    def save(self, settings):
+        """Schedule `settings` to be written after the debounce period"""
+        with self.lock:
+            self.pending = settings
+            if self.timer is None:
+                self.timer = threading.Timer(self.debounce, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def cancel(self):
+        """Forget the settings waiting for the timer; True if there were any"""
+        with self.lock:
+            return self.drop_pending()
+
+    def drop_pending(self):
+        # Caller holds self.lock
+        pending, self.pending = self.pending, None
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if pending is not None:
+            log.info("Pending settings save dropped for the file's contents", path=self.path)
+        return pending is not None
+
+    def flush(self):
+        """Write pending settings now, if they differ from the file"""
+        with self.io_lock:
+            with self.lock:
+                settings, self.pending = self.pending, None
+                if self.timer is not None:
+                    self.timer.cancel()
+                    self.timer = None
+            if settings is None:
+                return
+            text = json.dumps(settings, ensure_ascii=False, indent=4)
+            if text == self.written:
+                self.skipped += 1
+                return
+            try:
+                write_json_atomic(self.path, text, backup=self.written is not None)
+                self.written = text
+                self.signature = self.stat()
+                self.writes += 1
+            except Exception as e:
+                log.error("Settings save error", error=e)
+
+DEFAULT_PROFILE = "Varsayılan"
+SETTINGS_VERSION = 2  # 2: plain text that looks like a command is stored as "text:..."
+
+def new_button_config(entry=""):
+    """Configuration of one button slot; 'message' is the action string compiled from it.
+
+    'gestures' maps "double" and "long" to action strings of their own and
+    'repeat' makes the tap action repeat while the button is held.
+    """
+    return {'type': "yazı", 'subtype': "", 'entry': entry, 'message': text_action(entry), 'rate_limit': None,
+            'gestures': {}, 'repeat': False}
+
+def button_config(data):
+    """Configuration of one button slot from its entry in the settings file"""
+    return {'type': data.get("command_type", "yazı"), 'subtype': data.get("command_subtype", ""),
+            'entry': data.get("command_text", ""), 'message': data.get("message", ""),
+            'rate_limit': data.get("rate_limit") or None,
+            'gestures': {gesture: message for gesture, message in data.get("gestures", {}).items()
+                         if gesture in ("double", "long") and message},
+            'repeat': bool(data.get("repeat"))}
+
+def surviving_edits(pending_edits, changed):
+    """The pending card edits a settings reload leaves standing.
+
+    An edit of a slot the reload changed, or of a profile it added or
+    removed, was made against the old configuration and is dropped, so the
+    file's contents are not written over by it later.
+    """
+    profiles = {profile for profile, button in changed if button is None}
+    slots = set(changed)
+    return {(profile, button): values for (profile, button), values in pending_edits.items()
+            if profile not in profiles and (profile, button) not in slots}
+
+class ProfileSet:
+    """Named button configurations, each with a precompiled action table.
+
+    Switching profiles only swaps `actions` to another table, so a press right
+    after a switch pays nothing. A "layer:<name>" button held down on a deck
+    that reports releases puts that profile on top until it comes back up; on
+    a presses-only deck it arms the profile for the next press only. Buttons
+    a layer leaves empty fall through to the active profile. Profiles may
+    name executables that select them automatically.
+    Double-tap and long-press actions live in the same tables under
+    (button, gesture) keys, and `gestures` is the active profile's
+    button -> gestures map for the GestureRecognizer.
+    """
+
+    def __init__(self, buttons=BUTTONS):
+        self.buttons = list(buttons)
+        self.profiles = {}  # name -> {button: config}
+        self.tables = {}  # name -> {button or (button, gesture): CompiledAction}
+        self.gesture_sets = {}  # name -> {button: gestures besides tap}
+        self.apps = {}  # name -> executable names that select it
+        self.app_index = {}
+        self.active = self.manual = DEFAULT_PROFILE
+        self.actions = {}
+        self.gestures = {}
+        self.layer = None  # One-shot layer table, for the next press
+        self.held_layers = {}  # Layer button -> layer table, while that button is held down
+        self.foreground = None
+        self.switches = 0
+        self.add(DEFAULT_PROFILE, {button: new_button_config(f"{button} Butonu işlevi") for button in self.buttons})
+        self.switch(DEFAULT_PROFILE)
+
+    def add(self, name, configs=None, apps=()):
+        configs = configs or {}
+        self.profiles[name] = {button: configs.get(button) or new_button_config() for button in self.buttons}
+        self.tables.setdefault(name, {})
+        self.gesture_sets.setdefault(name, {})
+        self.set_apps(name, apps)
+
+    def add_buttons(self, buttons):
+        """Give every profile a slot for buttons it has not seen, e.g. those of a newly connected deck"""
+        new = [button for button in buttons if button not in self.buttons]
+        self.buttons += new
+        for name, configs in self.profiles.items():
+            for button in new:
+                configs.setdefault(button, new_button_config())
+                self.compile_button(name, button)
+        return new
+
+    def remove(self, name):
+        if name == DEFAULT_PROFILE or name not in self.profiles:
+            return False
+        if self.manual == name:
+            self.manual = DEFAULT_PROFILE
+        if self.active == name:
+            self.switch(self.manual, manual=False)
+        del self.profiles[name], self.tables[name], self.gesture_sets[name]
+        self.set_apps(name, ())
+        return True
+
+    def set_apps(self, name, apps):
+        self.apps[name] = [app.strip().lower() for app in apps if app.strip()]
+        if name not in self.profiles:
+            del self.apps[name]
+        self.app_index = {app: profile for profile, names in self.apps.items() for app in names}
+
+    def compile(self, name=None):
+        """Compile every profile (or one), only for buttons whose message changed"""
+        for profile in ([name] if name else list(self.profiles)):
+            for button in self.profiles[profile]:
+                self.compile_button(profile, button)
+
+    def compile_button(self, name, button):
+        table = self.tables[name]
+        config = self.profiles[name][button]
+        message = config['message']
+        action = table.get(button)
+        if action is None or action.source != message:
+            table[button] = compile_action(message)
+
+        gestures = {"repeat"} if config.get('repeat') else set()
+        for gesture in ("double", "long"):
+            message = (config.get('gestures') or {}).get(gesture)
+            if not message:
+                table.pop((button, gesture), None)
+                continue
+            gestures.add(gesture)
+            action = table.get((button, gesture))
+            if action is None or action.source != message:
+                table[(button, gesture)] = compile_action(message)
+        self.gesture_sets[name][button] = frozenset(gestures)
+
+    def switch(self, name, manual=True):
+        """Make `name` the active profile; safe from any thread"""
+        if name not in self.tables:
+            return False
+        self.actions = self.tables[name]
+        self.gestures = self.gesture_sets[name]
+        self.active = name
+        self.layer = None
+        self.held_layers = {}
+        if manual:
+            self.manual = name
+        self.switches += 1
+        return True
+
+    def push_layer(self, name, button=None):
+        """Put a profile's table on top: while `button` is held, or for the next press without one"""
+        table = self.tables.get(name)
+        if button is None:
+            self.layer = table
+        elif table is not None:
+            self.held_layers[button] = table
+
+    def release_layer(self, button):
+        """Drop the layer `button` holds; True if it held one"""
+        return self.held_layers.pop(button, None) is not None
+
+    def gestures_for(self, button):
+        return self.gestures.get(button)
+
+    def lookup(self, button, gesture="tap"):
+        """Action for a gesture: a held layer's or the armed layer's if it has one, else the active profile's"""
+        key = button if gesture in ("tap", "repeat") else (button, gesture)
+        for table in reversed(list(self.held_layers.values())):  # The layer held last wins
+            action = table.get(key)
+            if action is not None and action.kind != "none":
+                return action
+        layer = self.layer
+        if layer is not None:
+            self.layer = None
+            action = layer.get(key)
+            if action is not None and action.kind != "none":
+                return action
+        return self.actions.get(key)
+
+    def on_foreground(self, app):
+        """Record the new foreground app; returns the profile it calls for, if that is a change"""
+        self.foreground = app
+        target = self.app_index.get((app or "").lower(), self.manual)
+        return target if target != self.active else None
+
+EVENT_SYSTEM_FOREGROUND = 0x0003
+WINEVENT_OUTOFCONTEXT = 0x0000
+PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+WM_QUIT = 0x0012
+
+class WindowsForegroundSource:
+    """Reports the foreground executable whenever it changes, from a SetWinEventHook.
+
+    Nothing is looked up per press: the hook fires on focus changes only and
+    the last name is kept by ProfileSet.
+    """
+
+    def __init__(self):
+        self.on_change = None
+        self.thread_id = None
+
+    def start(self, on_change):
+        self.on_change = on_change
+        threading.Thread(target=self.run, daemon=True).start()
+        return self
+
+    @staticmethod
+    def app_name(hwnd):
+        kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+        pid = wintypes.DWORD()
+        get_user32().GetWindowThreadProcessId(hwnd, ctypes.byref(pid))
+        handle = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid.value)
+        if not handle:
+            return None
+        try:
+            buffer = ctypes.create_unicode_buffer(260)
+            size = wintypes.DWORD(len(buffer))
+            if not kernel32.QueryFullProcessImageNameW(handle, 0, buffer, ctypes.byref(size)):
+                return None
+            return os.path.basename(buffer.value).lower()
+        finally:
+            kernel32.CloseHandle(handle)
+
+    def current(self):
+        api = get_user32()
+        api.GetForegroundWindow.restype = wintypes.HWND
+        return self.app_name(api.GetForegroundWindow())
+
+    def run(self):
+        api = get_user32()
+        self.thread_id = ctypes.WinDLL('kernel32').GetCurrentThreadId()
+        WinEventProc = ctypes.WINFUNCTYPE(None, wintypes.HANDLE, wintypes.DWORD, wintypes.HWND,
+                                          wintypes.LONG, wintypes.LONG, wintypes.DWORD, wintypes.DWORD)
+        self.callback = WinEventProc(lambda hook, event, hwnd, *rest: self.changed(hwnd))
+        api.SetWinEventHook.restype = wintypes.HANDLE
+        hook = api.SetWinEventHook(EVENT_SYSTEM_FOREGROUND, EVENT_SYSTEM_FOREGROUND, 0, self.callback,
+                                   0, 0, WINEVENT_OUTOFCONTEXT)
+        self.changed(None)
+        message = wintypes.MSG()
+        while api.GetMessageW(ctypes.byref(message), 0, 0, 0) > 0:
+            api.TranslateMessage(ctypes.byref(message))
+            api.DispatchMessageW(ctypes.byref(message))
+        api.UnhookWinEvent(hook)
+
+    def changed(self, hwnd):
+        try:
+            app = self.app_name(hwnd) if hwnd else self.current()
+            if self.on_change:
+                self.on_change(app)
+        except Exception as e:
+            log.warning("Foreground lookup failed", error=e)
+
+    def stop(self):
+        self.on_change = None
+        if self.thread_id:
+            get_user32().PostThreadMessageW(self.thread_id, WM_QUIT, 0, 0)
+
+PRIMARY_DECK = "deck1"  # The first deck ever seen; its buttons keep their bare ids (A-H)
+
+def device_button(device, button):
+    """Namespaced id of a deck's button: "C" on the primary deck, "deck2:C" on the others"""
+    return button if device == PRIMARY_DECK else f"{device}:{button}"
+
+def button_device(button_id):
+    """The deck a namespaced button id belongs to"""
+    return button_id.rpartition(":")[0] or PRIMARY_DECK
+
+def close_probe(future):
+    """Done callback for a probe nobody will collect: close the port it opened"""
+    if not future.cancelled() and future.exception() is None and future.result() is not None:
+        future.result()[0].close()
+
+class DeckMonitor:
+    """Finds every deck, keeps them connected and reconnects them after they go away.
+
+    Runs on its own thread; reading and keepalive run on each DeckConnection's
+    threads. Each deck is named after its USB identity ("deck1", "deck2", ...
+    kept in the device cache) and its buttons are namespaced with
+    device_button(). Events from all decks pass through one dispatch lock in
+    arrival order: presses go to `on_button(button_id, received)`, releases to
+    `on_release(button_id, received)`. Connection changes go to
+    `on_status("connected" | "waiting" | "disconnected")` for the set of decks
+    and `on_device(device, connected)` per deck, all from background threads.
+    `comports` lists candidate ports and can be swapped for a simulator's.
+    """
+
+    def __init__(self, on_button, on_status=None, buttons=BUTTONS, cache_file=None, comports=None, on_release=None,
+                 on_device=None, journal=None):
+        self.on_button = on_button
+        self.journal = journal  # DeckJournal recording every connection, or None
+        self.on_release = on_release
+        self.on_status = on_status or (lambda status: None)
+        self.on_device = on_device or (lambda device, connected: None)
+        self.buttons = list(buttons)
+        self.cache_file = cache_file
+        self.comports = comports  # Defaults to list_ports.comports, imported on first use
+        self.connections = {}  # identity -> DeckConnection
+        self.lost = []  # Identities whose connection closed since the last poll
+        self.probes = {}  # identity -> (port, Future) for probes in flight
+        self.not_decks = set()  # Identities that answered with something other than DECK, while they stay plugged in
+        self.pool = ThreadPoolExecutor(max_workers=PROBE_WORKERS, thread_name_prefix="probe")
+        self.device_stats = {}  # device -> {"events", "connected", "last"}
+        self.names = {}  # identity -> device name, for this run
+        self.status = None
+        self.last_connect_time = None
+        self.lock = threading.Lock()
+        self.dispatch_lock = threading.RLock()  # Also held by settings reloads, which save after a migration
+        self.sequence = 0
+        self.stopped = threading.Event()
+        self.wakeup = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    @property
+    def connection(self):
+        """The primary deck's connection, else any connected one"""
+        connections = list(self.connections.values())
+        return next((c for c in connections if c.device == PRIMARY_DECK), connections[0] if connections else None)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        self.wakeup.set()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        for connection in list(self.connections.values()):
+            connection.close()
+
+    def run(self):
+        """Watch the port list and probe ports as they appear; reading and keepalive run on the connections' threads.
+
+        A port that shows up (or whose deck was just lost) is probed on the
+        next poll and keeps being retried for HOTPLUG_GRACE, since a fresh USB
+        port may not open right away. Every port is probed at startup and,
+        while no deck is connected, every FULL_SCAN_INTERVAL, for boards that
+        were already plugged in but did not answer. Probes run on a pool, so
+        polling goes on while a port takes its time; a port that answered
+        with something other than DECK is left alone until it disappears.
+        """
+        known = set()
+        fresh = {}  # identity -> monotonic deadline for retrying it
+        next_full_scan = 0.0
+        try:
+            while not self.stopped.is_set():
+                now = time.monotonic()
+                try:
+                    ports = {port_identity(port): port for port in (self.comports or list_ports.comports)()}
+                except Exception as e:
+                    log.error("Port listing failed", error=e)
+                    ports = {}
+
+                for identity, connection in list(self.connections.items()):
+                    if identity not in ports and not connection.closed.is_set():
+                        # Unplugged: no need to wait for the silence to run out
+                        log.info("Deck port removed", device=connection.device, port=connection.ser.port)
+                        connection.close()
+                while self.lost:
+                    fresh[self.lost.pop()] = now + HOTPLUG_GRACE  # Lost but maybe still there: try it right away
+
+                for identity in set(ports) - known:
+                    fresh[identity] = now + HOTPLUG_GRACE
+                self.not_decks &= set(ports)  # Unplugged: whatever is plugged in there next gets probed
+                fresh = {identity: until for identity, until in fresh.items()
+                         if identity in ports and until > now and identity not in self.connections
+                         and identity not in self.not_decks}
+                known = set(ports)
+
+                with self.lock:
+                    self.finish_probes(ports)
+                    if now >= next_full_scan and not self.connections:
+                        next_full_scan = now + FULL_SCAN_INTERVAL
+                        candidates = list(ports.values())
+                    else:
+                        candidates = [ports[identity] for identity in fresh]
+                    self.start_probes(candidates)
+                    if not ports and not self.connections and self.status != "waiting":
+                        log.info("No COM ports found")
+                        self.set_status("waiting")
+                self.wakeup.wait(PORT_POLL_INTERVAL)
+                self.wakeup.clear()
+        finally:
+            for port, future in self.probes.values():
+                future.add_done_callback(close_probe)
+
+    def probe(self, port):
+        """On a pool thread: wait for DECK on `port`, then negotiate the protocol"""
+        started = time.perf_counter()
+        ser = probe_port(port, self.stopped)
+        if ser is None:
+            return None
+        try:
+            protocol = negotiate_protocol(ser)
+        except Exception:
+            ser.close()
+            raise
+        return ser, protocol, time.perf_counter() - started
+
+    def start_probes(self, ports):
+        """Queue a probe for each of `ports` that is not connected, being probed or known not to be a deck"""
+        ports = [port for port in ports if port_identity(port) not in self.probes
+                 and port_identity(port) not in self.connections and port_identity(port) not in self.not_decks]
+        if not ports:
+            return
+        cached = self.load_device_cache()["devices"]
+        ports.sort(key=lambda port: (port_identity(port) not in cached, port.device != DEFAULT_PORT))  # Known decks first
+        log.debug("Arduino connection attempt", ports=[port.device for port in ports])
+        for port in ports:
+            future = self.pool.submit(self.probe, port)
+            self.probes[port_identity(port)] = port, future
+            future.add_done_callback(lambda future: self.wakeup.set())
+
+    def finish_probes(self, ports):
+        """Connect the decks whose probes have finished; `ports` is the current port list by identity"""
+        finished = [identity for identity, (port, future) in self.probes.items() if future.done()]
+        for identity in finished:
+            port, future = self.probes.pop(identity)
+            try:
+                result = future.result()
+            except NotADeck:
+                log.info("Port is not a deck, skipped until it is unplugged", port=port.device)
+                self.not_decks.add(identity)
+                continue
+            except Exception as e:
+                log.error("Connection error", port=port.device, error=e)
+                continue
+            if result is None:
+                continue
+            ser, protocol, connect_time = result
+            if self.stopped.is_set() or identity not in ports or identity in self.connections:
+                ser.close()
+                continue
+            try:
+                self.attach(ser, port, protocol, connect_time)
+            except Exception as e:
+                log.error("Connection error", port=port.device, error=e)
+                ser.close()
+        if finished and not self.probes and not self.connections and not self.stopped.is_set():
+            if self.status != "waiting":
+                log.info("No Arduino found", ports=[port.device for port in ports.values()])
+            self.set_status("waiting")
+
+    def on_connection_lost(self, connection):
+        """Called once when a DeckConnection closes"""
+        if self.connections.get(connection.identity) is not connection:
+            return
+        log.warning("Arduino connection lost", device=connection.device)
+        del self.connections[connection.identity]
+        self.device_stats[connection.device]["connected"] = None
+        self.lost.append(connection.identity)
+        self.wakeup.set()
+        self.on_device(connection.device, False)
+        if not self.connections:
+            self.set_status("disconnected")
+
+    def releases(self, button_id=None):
+        """True while the deck a button belongs to (or the primary deck) reports releases"""
+        device = button_device(button_id) if button_id else PRIMARY_DECK
+        return any(c.releases for c in list(self.connections.values()) if c.device == device)
+
+    def dispatch(self, device, callback, button_id, received):
+        """Every event from every deck goes through here, one at a time in arrival order"""
+        with self.dispatch_lock:
+            self.sequence += 1
+            stats = self.device_stats[device]
+            stats["events"] += 1
+            stats["last"] = received
+            callback(button_id, received)
+
+    def attach(self, ser, port, protocol, connect_time):
+        """Start the connection of a deck that answered a probe and negotiated `protocol`"""
+        identity = port_identity(port)
+        device = self.device_name(identity)
+        self.last_connect_time = connect_time
+        log.info("Arduino connected", device=device, port=port.device, protocol=protocol, baud=ser.baudrate,
+                 seconds=round(connect_time, 3))
+        self.save_device_cache(port, device, connect_time)
+        self.connect(ser, port.device, identity, device, protocol)
+
+    def connect(self, ser, port_name, identity, device, protocol, keepalive_interval=KEEPALIVE_INTERVAL):
+        """Start the DeckConnection of a negotiated port; replay_journal calls this with recorded traffic"""
+        names = {button: device_button(device, button) for button in self.buttons}
+        on_button = lambda button, received: self.dispatch(device, self.on_button, names[button], received)
+        on_release = (lambda button, received: self.dispatch(device, self.on_release, names[button], received)
+                      if self.on_release else None)
+        channel = device_channel(device)
+        connection = DeckConnection(ser, on_button, self.on_connection_lost, buttons=self.buttons,
+                                    protocol=protocol, keepalive_interval=keepalive_interval, on_release=on_release,
+                                    journal=self.journal, channel=channel)
+        connection.device = device
+        connection.identity = identity
+        stats = self.device_stats.setdefault(device, {"events": 0, "last": None})
+        stats.update(connected=time.perf_counter(), connected_events=stats["events"])
+        self.connections[identity] = connection
+        if self.journal:
+            self.journal.open_channel(channel, {"device": device, "port": port_name, "identity": identity,
+                                                "protocol": protocol})
+        connection.start()
+        self.on_device(device, True)
+        self.set_status("connected")
+        return connection
+
+    def device_name(self, identity):
+        """Stable name for a deck: the one it had before, else the next free "deckN" """
+        if identity not in self.names:
+            names = {identity: entry["name"] for identity, entry in self.load_device_cache()["devices"].items()}
+            names.update(self.names)
+            if identity not in names:
+                number = 1
+                while f"deck{number}" in names.values():
+                    number += 1
+                names[identity] = f"deck{number}"
+            self.names[identity] = names[identity]
+        return self.names[identity]
+
+    def devices(self):
+        """Per-deck connection details, event counts and event rate since connecting"""
+        now = time.perf_counter()
+        connected = {c.device: c for c in list(self.connections.values())}
+        report = {}
+        for device, stats in sorted(self.device_stats.items()):
+            connection = connected.get(device)
+            since = stats.get("connected")
+            events = stats["events"] - stats.get("connected_events", 0)
+            report[device] = {
+                "connected": connection is not None,
+                "port": connection.ser.port if connection else None,
+                "protocol": connection.protocol if connection else None,
+                "releases": connection.releases if connection else False,
+                "events": stats["events"],
+                "events_per_second": events / (now - since) if connection and since and now > since else 0.0,
+            }
+        return report
+
+    def set_status(self, status):
+        """Report a status change; repeats (another empty poll) are not reported"""
+        if status != self.status:
+            self.status = status
+            self.on_status(status)
+
+    def load_device_cache(self):
+        """Known decks keyed by USB identity: {"devices": {identity: {"name", "device", ...}}}"""
+        cache = {}
+        if self.cache_file:
+            try:
+                with open(self.cache_file, 'r', encoding='utf-8') as f:
+                    cache = json.load(f)
+            except Exception:
+                cache = {}
+        if "devices" not in cache:
+            # A single-deck cache: that deck is the primary one
+            cache = {"devices": {cache["identity"]: dict(cache, name=PRIMARY_DECK)} if "identity" in cache else {}}
+        return cache
+
+    def save_device_cache(self, port, device, connect_time):
+        if not self.cache_file:
+            return
+        try:
+            cache = self.load_device_cache()
+            cache["devices"][port_identity(port)] = {
+                "name": device,
+                "device": port.device,
+                "description": port.description,
+                "connect_seconds": round(connect_time, 3)
+            }
+            write_json_atomic(self.cache_file, cache)
+        except Exception as e:
+            log.error("Device cache save error", error=e)
+
+def percentile(samples, p):
+    """Nearest-rank percentile of an already sorted list."""
+    if not samples:
+        return 0.0
+    index = min(len(samples) - 1, max(0, int(round(p / 100 * len(samples))) - 1))
+    return samples[index]
+
+class ActionExecutor:
+    """Runs actions on a worker thread in press order, so slow injection never blocks Tk.
+
+    A single worker drains one FIFO queue: keystrokes from consecutive presses
+    must not interleave, so order matters more than parallelism here. Queue
+    depth and the time each press waited before running are recorded.
+    """
+
+    def __init__(self, run, on_error=None, on_done=None, history=1000):
+        self.run = run
+        self.on_error = on_error
+        self.on_done = on_done
+        self.queue = queue.Queue()
+        self.wait_times = deque(maxlen=history)
+        self.max_depth = 0
+        self.executed = 0
+        self.thread = threading.Thread(target=self.worker, daemon=True)
+        self.thread.start()
+
+    def submit(self, button, action, received=None, dispatched=None):
+        """Queue an action; `received`/`dispatched` are perf_counter stamps passed through to on_done"""
+        queued = time.perf_counter()
+        self.queue.put((button, action, received or queued, dispatched or queued, queued))
+        depth = self.queue.qsize()
+        if depth > self.max_depth:
+            self.max_depth = depth
+
+    def worker(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            button, action, received, dispatched, queued = item
+            with injection_lock:  # A macro step waits for the whole action
+                started = time.perf_counter()
+                self.wait_times.append(started - queued)
+                try:
+                    self.run(button, action)
+                except Exception as e:
+                    log.error("Action execution error", button=button, error=e)
+                    if self.on_error:
+                        self.on_error(button, e)
+            self.executed += 1
+            if self.on_done:
+                self.on_done(button, action, (received, dispatched, queued, started, time.perf_counter()))
+
+    def stop(self):
+        self.queue.put(None)
+
+    def stats(self):
+        waits = sorted(self.wait_times)
+        return {
+            "depth": self.queue.qsize(),
+            "max_depth": self.max_depth,
+            "executed": self.executed,
+            "wait_p50_ms": percentile(waits, 50) * 1000,
+            "wait_p95_ms": percentile(waits, 95) * 1000,
+            "wait_max_ms": (waits[-1] if waits else 0.0) * 1000,
+        }
+
+class LatencyHistogram:
+    """Fixed log-bucket histogram of millisecond values: constant memory, approximate percentiles."""
+
+    MIN_MS = 0.01
+    GROWTH = 1.1  # Bucket width, so percentiles are within 10%
+    BUCKETS = 170  # 0.01 ms .. ~100 s
+
+    def __init__(self):
+        self.counts = [0] * self.BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, ms):
+        if ms <= self.MIN_MS:
+            index = 0
+        else:
+            index = min(self.BUCKETS - 1, int(math.log(ms / self.MIN_MS, self.GROWTH)) + 1)
+        self.counts[index] += 1
+        self.count += 1
+        self.total += ms
+        if ms > self.max:
+            self.max = ms
+
+    def percentile(self, p):
+        """Upper edge of the bucket holding the p-th percentile"""
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(p / 100 * self.count))
+        seen = 0
+        for index, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return min(self.max, self.MIN_MS * self.GROWTH ** index)
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count, 3) if self.count else 0.0,
+            "p50_ms": round(self.percentile(50), 3),
+            "p95_ms": round(self.percentile(95), 3),
+            "p99_ms": round(self.percentile(99), 3),
+            "max_ms": round(self.max, 3),
+        }
+
+MAX_MACRO_EVENTS = 10000  # Guards against runaway repeats
+
+class MacroRun:
+    """Handle on one playing macro"""
+
+    def __init__(self, name, events):
+        self.name = name
+        self.remaining = events
+        self.cancelled = False
+        self.held = set()  # Keys this run pressed and has not released yet
+        self.done = threading.Event()
+        if not events:
+            self.done.set()
+
+    def cancel(self):
+        self.cancelled = True
+
+    def wait(self, timeout=None):
+        return self.done.wait(timeout)
+
+def compile_macro(steps):
+    """Flatten macro steps into a timeline of (offset seconds, action, key) events.
+
+    Steps are action strings ("hotkey:ctrl+c", "press:f13", "text:..." or plain
+    text), "wait:<ms>", and "repeat:<n>" ... "end" blocks, which may nest.
+    Function keys become separate down/up events `KEY_HOLD` apart, tagged with
+    key=("down"|"up", vk) so a cancelled macro still releases what it pressed.
+    """
+    def parse(index, depth):
+        block = []
+        while index < len(steps):
+            step = steps[index].strip()
+            index += 1
+            if not step:
+                continue
+            prefix, _, value = step.partition(":")
+            if step == "end":
+                if not depth:
+                    raise ValueError("'end' without 'repeat'")
+                return block, index
+            if prefix == "repeat":
+                body, index = parse(index, depth + 1)
+                block.append(("repeat", int(value), body))
+            elif prefix == "wait":
+                block.append(("wait", float(value) / 1000))
+            else:
+                action = compile_action(step)
+                if action.kind in ("macro", "profile", "layer"):
+                    raise ValueError(f"{action.kind} steps can't be used inside a macro: {step}")
+                block.append(("action", action))
+        if depth:
+            raise ValueError("'repeat' without 'end'")
+        return block, index
+
+    timeline = []
+    def expand(block, offset):
+        for node in block:
+            if node[0] == "wait":
+                offset += node[1]
+            elif node[0] == "repeat":
+                for _ in range(node[1]):
+                    offset = expand(node[2], offset)
+            elif node[1].kind == "fkey" and node[1].run != _fail:
+                backend, chord = node[1].run.__self__, node[1].args[0]
+                timeline.append((offset, partial(backend.chord_down, chord), ("down", chord)))
+                timeline.append((offset + KEY_HOLD, partial(backend.chord_up, chord), ("up", chord)))
+                offset += KEY_HOLD
+            else:
+                timeline.append((offset, node[1], None))
+            if len(timeline) > MAX_MACRO_EVENTS:
+                raise ValueError(f"Macro expands to more than {MAX_MACRO_EVENTS} events")
+        return offset
+
+    expand(parse(0, 0)[0], 0.0)
+    return timeline
+
+class MacroEngine:
+    """Stored macros played on one scheduler thread against perf_counter deadlines.
+
+    Each event's deadline is fixed when the macro starts, so waits don't drift
+    with the time earlier steps take. The thread sleeps until just before a
+    deadline and spins the last SPIN_MARGIN; lateness goes into `jitter`.
+    Each step takes `injection_lock`, so it waits for a button's action in
+    progress instead of interleaving with it.
+    """
+
+    def __init__(self, clock=time.perf_counter, spin=SPIN_MARGIN):
+        self.clock = clock
+        self.spin = spin
+        self.macros = {}  # name -> steps, as stored in settings
+        self.compiled = {}
+        self.queue = []  # heap of (deadline, sequence, run, action, key)
+        self.sequence = 0
+        self.condition = threading.Condition()
+        self.thread = None
+        self.jitter = LatencyHistogram()
+        self.played = 0
+
+    def define(self, name, steps):
+        """Store (or with steps=None, delete) a macro; it is compiled on first play"""
+        self.compiled.pop(name, None)
+        if steps is None:
+            self.macros.pop(name, None)
+        else:
+            self.macros[name] = list(steps)
+
+    def timeline(self, name):
+        timeline = self.compiled.get(name)
+        if timeline is None:
+            timeline = self.compiled[name] = compile_macro(self.macros[name])
+        return timeline
+
+    def play(self, name):
+        """Schedule a stored macro from now; returns its MacroRun"""
+        if name not in self.macros:
+            log.warning("Unknown macro", macro=name)
+            return None
+        timeline = self.timeline(name)
+        run = MacroRun(name, len(timeline))
+        with self.condition:
+            started = self.clock()
+            for offset, action, key in timeline:
+                self.sequence += 1
+                heapq.heappush(self.queue, (started + offset, self.sequence, run, action, key))
+            self.played += 1
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.loop, daemon=True)
+                self.thread.start()
+            self.condition.notify()
+        return run
+
+    def cancel_all(self):
+        with self.condition:
+            for event in self.queue:
+                event[2].cancel()
+            self.condition.notify()
+
+    def loop(self):
+        while True:
+            with self.condition:
+                while not self.queue:
+                    self.condition.wait()
+                remaining = self.queue[0][0] - self.clock()
+                if remaining > self.spin:
+                    # A macro started meanwhile may have an earlier deadline, so look again after waking
+                    self.condition.wait(remaining - self.spin)
+                    continue
+                deadline, _, run, action, key = heapq.heappop(self.queue)
+            while self.clock() < deadline:
+                time.sleep(0)
+            if key and key[0] == "up":
+                due = key[1] in run.held
+                run.held.discard(key[1])
+            else:
+                due = not run.cancelled
+                if due and key:
+                    run.held.add(key[1])
+            if due:
+                with injection_lock:
+                    self.jitter.add((self.clock() - deadline) * 1000)
+                    try:
+                        action()
+                    except Exception as e:
+                        log.error("Macro step failed", macro=run.name, error=e)
+            run.remaining -= 1
+            if not run.remaining:
+                run.done.set()
+
+macros = MacroEngine()
+
+STATS_REFRESH_MS = 1000
+LOG_REFRESH_MS = 500
+
+LATENCY_STAGES = (
+    ("read_to_dispatch", 0, 1),  # serial read until handle_command
+    ("dispatch_to_queue", 1, 2),  # rate limiter, including any delay it imposed
+    ("queue_wait", 2, 3),  # waiting behind earlier presses on the executor
+    ("inject", 3, 4),  # the key injection itself
+    ("total", 0, 4),
+)
+
+class LatencyStats:
+    """Press latency per stage, per button, per deck and per action type, plus press and drop counts.
+
+    Timestamps are perf_counter stamps (received, dispatched, queued, started,
+    finished) recorded by the reader thread, handle_command and the executor.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.started = time.time()
+            self.stages = {name: LatencyHistogram() for name, _, _ in LATENCY_STAGES}
+            self.buttons = {}
+            self.devices = {}
+            self.action_types = {}
+            self.presses = {}
+            self.drops = {}
+
+    def record(self, button, kind, stamps):
+        with self.lock:
+            for name, start, end in LATENCY_STAGES:
+                self.stages[name].add((stamps[end] - stamps[start]) * 1000)
+            total = (stamps[4] - stamps[0]) * 1000
+            self.buttons.setdefault(button, LatencyHistogram()).add(total)
+            self.devices.setdefault(button_device(button), LatencyHistogram()).add(total)
+            self.action_types.setdefault(kind, LatencyHistogram()).add(total)
+            self.presses[button] = self.presses.get(button, 0) + 1
+
+    def record_drop(self, button):
+        with self.lock:
+            self.drops[button] = self.drops.get(button, 0) + 1
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "since": self.started,
+                "presses": sum(self.presses.values()),
+                "drops": sum(self.drops.values()),
+                "stages": {name: h.summary() for name, h in self.stages.items()},
+                "buttons": {
+                    button: dict(self.buttons[button].summary() if button in self.buttons else {},
+                                 presses=self.presses.get(button, 0), drops=self.drops.get(button, 0))
+                    for button in sorted(set(self.presses) | set(self.drops))
+                },
+                "devices": {device: h.summary() for device, h in sorted(self.devices.items())},
+                "action_types": {kind: h.summary() for kind, h in sorted(self.action_types.items())},
+            }
+
+CARD_HEIGHT = 225  # Every command card gets the same row, so scrolling is arithmetic
+
+class VirtualCardList:
+    """Scrollable column of fixed-height cards that only realizes the visible rows.
+
+    `make_card(canvas)` builds one reusable card (any object with a `.frame`)
+    and `bind_card(card, slot)` points it at a slot's configuration. The pool
+    only grows to the number of rows that fit on screen, so build time and
+    widget count don't depend on how many slots there are.
+    """
+
+    def __init__(self, parent, make_card, bind_card, row_height=CARD_HEIGHT):
+        self.make_card = make_card
+        self.bind_card = bind_card
+        self.row_height = row_height
+        self.gap = 10
+        self.slots = []
+        self.pool = []
+        self.visible = range(0)
+
+        self.scrollbar = ttk.Scrollbar(parent, orient=tk.VERTICAL)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.canvas = tk.Canvas(parent, highlightthickness=0, yscrollincrement=row_height // 4)
+        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.scrollbar.config(command=self.canvas.yview)
+        self.canvas.config(yscrollcommand=self.on_scroll)
+        self.canvas.bind("<Configure>", self.on_resize)
+
+    def set_slots(self, slots):
+        """Show a new list of slots, e.g. another page, from the top"""
+        self.slots = list(slots)
+        for card in self.pool:
+            card.index = None
+        self.canvas.configure(scrollregion=(0, 0, 0, len(self.slots) * self.row_height))
+        self.canvas.yview_moveto(0)
+        self.visible = range(0)
+        self.layout()
+
+    def refresh(self):
+        """Rebind the visible cards, after their slots' configuration changed underneath them"""
+        for card in self.pool:
+            if card.index is not None:
+                self.bind_card(card, self.slots[card.index])
+
+    def refresh_slots(self, slots):
+        """Rebind only the visible cards showing one of `slots`"""
+        for card in self.pool:
+            if card.index is not None and self.slots[card.index] in slots:
+                self.bind_card(card, self.slots[card.index])
+
+    def scroll(self, units):
+        self.canvas.yview_scroll(units, "units")
+
+    def on_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        self.layout()
+
+    def on_resize(self, event):
+        for card in self.pool:
+            self.canvas.itemconfigure(card.window, width=event.width - self.gap)
+        self.layout()
+
+    def layout(self):
+        """Give each visible row a card, reusing the ones that scrolled out of view"""
+        top = self.canvas.canvasy(0)
+        height = max(self.canvas.winfo_height(), self.row_height)
+        first = int(top // self.row_height)
+        visible = range(max(first, 0), min(int((top + height) // self.row_height) + 1, len(self.slots)))
+        if visible == self.visible:
+            return
+        self.visible = visible
+
+        free = [card for card in self.pool if card.index not in visible]
+        shown = {card.index for card in self.pool if card.index in visible}
+        for index in visible:
+            if index in shown:
+                continue
+            if free:
+                card = free.pop()
+            else:
+                card = self.make_card(self.canvas)
+                card.window = self.canvas.create_window(0, 0, window=card.frame, anchor=tk.NW,
+                                                        width=self.canvas.winfo_width() - self.gap,
+                                                        height=self.row_height - self.gap)
+                self.pool.append(card)
+            card.index = index
+            self.bind_card(card, self.slots[index])
+            self.canvas.coords(card.window, self.gap // 2, index * self.row_height + self.gap // 2)
+            self.canvas.itemconfigure(card.window, state="normal")
+        for card in free:
+            card.index = None
+            self.canvas.itemconfigure(card.window, state="hidden")
+
+SETTINGS_FILE = os.path.join(os.path.expanduser("~"), "Documents", "StreamDeckSettings.json")
+DEVICE_CACHE_FILE = os.path.join(os.path.expanduser("~"), "Documents", "StreamDeckDevice.json")
+
+class DeckEngine:
+    """Everything between the decks and the injected keys, without any UI.
+
+    Owns the settings, the profiles and their compiled tables, the deck
+    connections and the dispatch path (gestures, rate limits, executor). The
+    GUI is one front-end on top of it and run_daemon() another. Front-ends
+    hook in by replacing on_status(status), on_device(device, connected),
+    on_profile(name), on_error(error) and on_reload(changed); all are called
+    from background threads.
+    Edits to the settings file by other programs are applied while running,
+    slot by slot (see apply_settings), under the monitor's dispatch lock, so
+    they land between presses; front-ends take the same lock around their
+    own edits of the profiles. A save still waiting to be written is dropped
+    for the file's contents.
+    Settings keys the engine does not use (the GUI's theme) are kept in
+    `preferences` and written back unchanged.
+    """
+
+    def __init__(self, settings_file=SETTINGS_FILE, device_cache_file=DEVICE_CACHE_FILE, comports=None,
+                 watch_interval=SETTINGS_POLL_INTERVAL, journal_file=None):
+        self.settings_store = SettingsStore(settings_file)
+        self.watch_interval = watch_interval  # None: only reload_settings() applies outside edits
+        self.stopping = threading.Event()
+        self.preferences = {}
+        # Per-button configuration as plain data, one map per profile; each profile keeps a
+        # compiled action table, rebuilt only where a message changes
+        self.profiles = ProfileSet(BUTTONS)
+        self.window_source = None
+        # Per-button rate limits, then actions run on the executor's thread, in press order
+        self.rate_limiter = RateLimiter()
+        self.latency = LatencyStats()
+        self.executor = ActionExecutor(lambda button, action: self.execute_action(action),
+                                       on_done=lambda button, action, stamps: self.latency.record(button, action.kind, stamps))
+        self.gestures = GestureRecognizer(self.on_gesture, self.profiles.gestures_for,
+                                          lambda button: self.monitor.releases(button))
+        # Raw deck traffic, for replay_journal; only with a journal file
+        self.journal = DeckJournal(journal_file) if journal_file else None
+        self.down = set()  # Buttons held down on decks that report releases
+        self.monitor = DeckMonitor(self.on_deck_press, self.on_monitor_status, cache_file=device_cache_file,
+                                   comports=comports, on_release=self.on_deck_release,
+                                   on_device=self.on_monitor_device, journal=self.journal)
+        self.on_status = _ignore
+        self.on_device = _ignore
+        self.on_profile = _ignore
+        self.on_error = _ignore
+        self.on_reload = _ignore
+        self.listeners = []  # Called with (button, gesture, received) for every press, e.g. ControlServer
+
+    def start(self):
+        """Compile the actions, follow the foreground window and start looking for decks"""
+        self.compile_actions()  # Imports the injection backend
+        startup.mark("actions")
+        if sys.platform == "win32":
+            self.window_source = WindowsForegroundSource().start(self.on_foreground_changed)
+        if self.journal:
+            self.journal.start()
+        # Deck discovery runs on its own thread; it imports pyserial there
+        self.monitor.start()
+        if self.watch_interval:
+            threading.Thread(target=self.watch_settings, daemon=True).start()
+        return self
+
+    def watch_settings(self):
+        while not self.stopping.wait(self.watch_interval):
+            with self.monitor.dispatch_lock:  # No save from the GUI between reading the file and applying it
+                settings = self.settings_store.changes()
+                if settings is not None:
+                    self.reload_settings(settings)
+
+    def stop(self):
+        self.stopping.set()
+        if self.window_source:
+            self.window_source.stop()
+        macros.cancel_all()
+        self.monitor.stop()
+        if self.journal:
+            self.journal.close()
+        self.executor.stop()
+        self.settings_store.flush()
+
+    def save_settings(self):
+        """Hand the current settings to the write-behind store"""
+        try:
+            with self.monitor.dispatch_lock:  # A consistent copy, never half a reload
+                settings = {
+                    **self.preferences,
+                    "version": SETTINGS_VERSION,
+                    "active_profile": self.profiles.manual,
+                    "macros": {name: list(steps) for name, steps in macros.macros.items()},
+                    "profiles": {
+                        name: {
+                            "apps": self.profiles.apps.get(name, []),
+                            "buttons": {
+                                button: {
+                                    "command_type": config['type'],
+                                    "command_subtype": config['subtype'],
+                                    "command_text": config['entry'],
+                                    "message": config['message'],
+                                    **({"rate_limit": config['rate_limit']} if config['rate_limit'] else {}),
+                                    **({"gestures": config['gestures']} if config.get('gestures') else {}),
+                                    **({"repeat": True} if config.get('repeat') else {})
+                                }
+                                for button, config in configs.items()
+                            }
+                        }
+                        for name, configs in self.profiles.profiles.items()
+                    }
+                }
+            self.settings_store.save(settings)
+            
+        except Exception as e:
+            log.error("Settings save error", error=e)
+
+    def load_settings(self):
+        """Load the settings file into the profiles, macros and rate limits"""
+        try:
+            self.apply_settings(self.settings_store.load())
+        except Exception as e:
+            log.error("Settings load error", error=e)
+
+    def apply_settings(self, settings, reload=False):
+        """Bring the profiles, macros and rate limits in line with `settings`.
+
+        Only slots whose configuration differs are touched; the others keep
+        their config dicts and compiled actions, so applying an unchanged file
+        does nothing. A reload also recompiles the changed slots right away
+        and drops the profiles, buttons, macros and rate limits the settings
+        no longer have (the first load leaves the built-in defaults alone).
+        Returns the changed (profile, button) slots; a profile that was
+        added or removed shows up as (profile, None).
+        """
+        changed = []
+        self.preferences = {key: value for key, value in settings.items()
+                            if key not in ("version", "active_profile", "macros", "profiles", "buttons")}
+        # Before version 2 plain text was stored bare, so text such as "paste: ..." ran as a
+        # command; it is turned into "text:..." here and the file written back once
+        legacy = settings.get("version", 1) < SETTINGS_VERSION
+        migrated = False
+
+        saved_macros = settings.get("macros", {})
+        for name, steps in saved_macros.items():
+            if macros.macros.get(name) != list(steps):
+                macros.define(name, steps)
+        if reload:
+            for name in set(macros.macros) - set(saved_macros):
+                macros.define(name, None)
+
+        # Settings from before profiles hold a single "buttons" map: the default profile
+        profiles = settings.get("profiles") or {DEFAULT_PROFILE: {"buttons": settings.get("buttons", {})}}
+        for name, profile in profiles.items():
+            buttons = profile.get("buttons", {})
+            # Buttons of other decks ("deck2:C") get their slots before the deck connects
+            self.profiles.add_buttons([button for button in buttons if button_device(button) != PRIMARY_DECK])
+            if name not in self.profiles.profiles:
+                self.profiles.add(name)
+                changed.append((name, None))
+            self.profiles.set_apps(name, profile.get("apps", []))
+            for button, config in self.profiles.profiles[name].items():
+                data = buttons.get(button)
+                if data is None and not reload:
+                    continue
+                new = new_button_config() if data is None else button_config(data)
+                if legacy and new['type'] == "yazı" and (new['subtype'] or "auto") == "auto":
+                    message = text_action(new['message'])
+                    migrated |= message != new['message']
+                    new['message'] = message
+                if new == config:
+                    continue
+                config.update(new, rate_limit=None)
+                self.configure_rate_limit(button, new['rate_limit'], config)
+                if reload:
+                    self.profiles.compile_button(name, button)
+                changed.append((name, button))
+
+        if reload:
+            for name in [name for name in self.profiles.profiles if name not in profiles]:
+                if self.profiles.remove(name):
+                    changed.append((name, None))
+            limited = {button for configs in self.profiles.profiles.values()
+                       for button, config in configs.items() if config['rate_limit']}
+            for button in set(self.rate_limiter.policies) - limited:
+                self.rate_limiter.clear(button)
+
+        active = settings.get("active_profile", DEFAULT_PROFILE)
+        # A reload leaves a profile picked by the foreground window alone unless the file picks another
+        if not reload or active != self.profiles.manual:
+            self.profiles.switch(active)
+        if migrated:
+            log.info("Plain text actions migrated", settings=self.settings_store.path, version=SETTINGS_VERSION)
+            self.save_settings()
+        return changed
+
+    def configure_rate_limit(self, button, rate_limit, config=None):
+        """Apply a button's {"policy", "interval", "burst"} settings, keeping defaults on bad values.
+
+        Limits belong to the physical button, whichever profile they were saved in.
+        """
+        if not rate_limit:
+            return
+        try:
+            self.rate_limiter.configure(button, rate_limit.get("policy"), rate_limit.get("interval"),
+                                        rate_limit.get("burst"))
+            (config or self.profiles.profiles[self.profiles.active][button])['rate_limit'] = rate_limit
+        except Exception as e:
+            log.warning("Rate limit ignored", button=button, error=e)
+
+    def compile_actions(self):
+        """Recompile the action tables, only for buttons whose message changed"""
+        self.profiles.compile()
+
+    def reload_settings(self, settings=None):
+        """Apply the settings file (or `settings`) again, slot by slot; the decks stay connected.
+
+        Runs between two presses, and a save not yet written is dropped: the
+        file wins over edits made before it was read.
+        """
+        try:
+            with self.monitor.dispatch_lock:
+                self.settings_store.cancel()
+                changed = self.apply_settings(self.settings_store.load() if settings is None else settings,
+                                              reload=True)
+        except Exception as e:
+            log.error("Settings reload error", error=e)
+            return []
+        log.info("Settings reloaded", profile=self.profiles.active, changed=len(changed))
+        self.on_reload(changed)
+        return changed
+
+    def switch_profile(self, name, manual=True):
+        """Swap the active action table; safe from any thread"""
+        if not self.profiles.switch(name, manual):
+            log.warning("Unknown profile", profile=name)
+            return False
+        log.info("Profile switched", profile=name, manual=manual)
+        self.on_profile(name)
+        return True
+
+    def on_foreground_changed(self, app):
+        """Foreground window callback; the app name is cached, so presses never look it up"""
+        target = self.profiles.on_foreground(app)
+        if target:
+            self.switch_profile(target, manual=False)
+
+    def on_monitor_status(self, status):
+        """DeckMonitor status callback, from its own thread"""
+        if status != "connected":
+            self.gestures.reset()
+        if status == "connected" and self.monitor.last_connect_time is not None:
+            startup.mark("first_connect")
+            log.info("Startup", phases=startup.summary())
+        self.on_status(status)
+
+    def on_monitor_device(self, device, connected):
+        """A deck came or went; a new one gets button slots in every profile"""
+        with self.monitor.dispatch_lock:  # Not while a press, a save or a reload walks the profiles
+            if connected:
+                self.profiles.add_buttons([device_button(device, button) for button in BUTTONS])
+            else:
+                for button in [button for button in self.down if button_device(button) == device]:
+                    self.down.discard(button)
+                    self.profiles.release_layer(button)
+        self.on_device(device, connected)
+
+    def on_deck_press(self, button, received):
+        """Press edge from a deck, on the dispatching thread"""
+        if self.monitor.releases(button):
+            self.down.add(button)
+        self.gestures.press(button, received)
+
+    def on_deck_release(self, button, received):
+        """Release edge: a layer this button holds ends here"""
+        self.down.discard(button)
+        self.profiles.release_layer(button)
+        self.gestures.release(button, received)
+
+    def on_gesture(self, button, gesture, received):
+        self.handle_command(button, received, gesture)
+
+    def execute_action(self, action):
+        """Run one action; rate limiting happens per button in handle_command"""
+        try:
+            if isinstance(action, str):
+                action = compile_action(action)
+            action()
+        except Exception as e:
+            log.error("Action execution error", error=e)
+            self.on_error(e)
+
+    def handle_command(self, button, received=None, gesture="tap"):
+        """Queue a button's compiled action on the executor; safe to call from any thread"""
+        dispatched = time.perf_counter()
+        for listener in self.listeners:
+            listener(button, gesture, received)
+        action = self.profiles.lookup(button, gesture)
+        if action is None:
+            return
+        if action.kind == "profile":
+            self.switch_profile(action.args[0])
+            return
+        if action.kind == "layer":
+            # Momentary while the button is down on a deck that reports releases, else one-shot
+            self.profiles.push_layer(action.args[0], button if button in self.down else None)
+            return
+        if gesture == "repeat":
+            # Repeats are paced by the recognizer; the button's limit is for presses
+            self.executor.submit(button, action, received, dispatched)
+            return
+        if not self.rate_limiter.submit(button, lambda: self.executor.submit(button, action, received, dispatched)):
+            self.latency.record_drop(button)
+
+    def stats_report(self):
+        """Latency, queue, rate limit, deck and profile statistics, as a JSON-ready dict"""
+        return dict(self.latency.snapshot(),
+                    exported=time.time(),
+                    executor=self.executor.stats(),
+                    rate_limiter=self.rate_limiter.stats(),
+                    last_connect_seconds=self.monitor.last_connect_time,
+                    devices=self.monitor.devices(),
+                    profile=self.profiles.active,
+                    profile_switches=self.profiles.switches,
+                    macro_jitter=macros.jitter.summary(),
+                    injection={"backend": injector.name, "calls": injector.calls} if injector else None,
+                    journal=self.journal.stats() if self.journal else None,
+                    startup=startup.report())
+
+CONTROL_PORT = 47800  # TCP fallback where there are no Unix sockets (Windows), on 127.0.0.1 only
+CONTROL_QUEUE = 1000  # Events buffered per subscriber; a slower reader loses the newest ones
+HTTP_METHODS = (b"GET ", b"POST ", b"PUT ", b"HEAD ", b"DELETE ", b"OPTIONS ", b"PATCH ", b"CONNECT ", b"TRACE ")
+
+def default_control_address(settings_file=SETTINGS_FILE):
+    """A Unix socket beside the settings file, or 127.0.0.1:CONTROL_PORT where there are none"""
+    if hasattr(socket, "AF_UNIX"):
+        return "unix:" + os.path.join(os.path.dirname(settings_file) or ".", "StreamDeckControl.sock")
+    return f"127.0.0.1:{CONTROL_PORT}"
+
+def control_token_file(settings_file=SETTINGS_FILE):
+    """Where the running instance keeps its control token: beside the settings file"""
+    return os.path.splitext(settings_file)[0] + ".control-token"
+
+def control_family(address):
+    """(socket family, bind/connect address) for "host:port" or "unix:/path" """
+    if address.startswith("unix:"):
+        return socket.AF_UNIX, address[5:]
+    host, _, port = address.rpartition(":")
+    return socket.AF_INET, (host or "127.0.0.1", int(port))
+
+class ControlServer:
+    """Local control endpoint for other tools: newline-delimited JSON, one response line per request.
+
+    Requests name an "op" and carry the session "token"; an "id" is echoed
+    back. Errors come back as {"ok": false, "error": ...}. A request with a
+    missing or wrong token, or a line that is not JSON at all, closes the
+    connection; so does an HTTP request line, so a web page that makes the
+    browser talk to the port gets nowhere.
+
+    ping                              liveness
+    trigger  button, gesture="tap"    run the button's action through handle_command
+    batch    triggers=[{button, gesture}, ...]
+    status                            deck connection status, decks and active profile
+    stats                             press/drop counters and latency, as in the stats export
+    reload                            read the settings file again
+    subscribe                         turn this connection into a stream of press events
+
+    The token is made fresh by start() and written, readable by the owner
+    only, to `token_file` (control_token_file() of the settings by default),
+    where ControlClient picks it up. Each client gets its own thread; events
+    reach subscribers through a bounded queue, so a slow reader never holds
+    up dispatch.
+    """
+
+    def __init__(self, engine, address=None, token_file=None):
+        settings_file = engine.settings_store.path
+        self.engine = engine
+        self.address = address or default_control_address(settings_file)
+        self.family, self.bind_address = control_family(self.address)
+        self.token_file = token_file or control_token_file(settings_file)
+        self.token = None
+        self.sock = None
+        self.clients = set()
+        self.subscribers = []
+        self.requests = 0
+        self.dropped = 0
+
+    def start(self):
+        self.token = secrets.token_hex(16)
+        write_private(self.token_file, self.token)
+        sock = socket.socket(self.family, socket.SOCK_STREAM)
+        if self.family == socket.AF_UNIX:
+            if os.path.exists(self.bind_address):
+                os.unlink(self.bind_address)  # Left over from a process that did not shut down
+        else:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(self.bind_address)
+        if self.family == socket.AF_UNIX:
+            os.chmod(self.bind_address, 0o600)
+        sock.listen()
+        self.sock = sock
+        self.engine.listeners.append(self.publish)
+        threading.Thread(target=self.accept_loop, daemon=True).start()
+        log.info("Control socket listening", address=self.local_address())
+        return self
+
+    def local_address(self):
+        """Where clients connect; resolves port 0 to the port actually bound"""
+        if self.family == socket.AF_UNIX:
+            return f"unix:{self.bind_address}"
+        host, port = self.sock.getsockname()[:2]
+        return f"{host}:{port}"
+
+    def stop(self):
+        if self.publish in self.engine.listeners:
+            self.engine.listeners.remove(self.publish)
+        if self.sock:
+            self.sock.close()
+            if self.family == socket.AF_UNIX and os.path.exists(self.bind_address):
+                os.unlink(self.bind_address)
+        for events in list(self.subscribers):
+            try:
+                events.put_nowait(None)
+            except queue.Full:
+                pass
+        for client in list(self.clients):
+            try:
+                client.shutdown(socket.SHUT_RDWR)  # Wakes the thread blocked reading it
+            except OSError:
+                pass
+            client.close()
+        try:
+            os.unlink(self.token_file)
+        except OSError:
+            pass
+
+    def accept_loop(self):
+        while True:
+            try:
+                client, _ = self.sock.accept()
+            except OSError:
+                break  # Closed by stop()
+            if self.family != socket.AF_UNIX:
+                client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.clients.add(client)
+            threading.Thread(target=self.serve, args=(client,), daemon=True).start()
 
-# Virtual key codes for F1-F24
-VK_F1 = 0x70
-VK_F13 = 0x7C
+    def authorized(self, line):
+        """The decoded request, or None when the connection must be dropped"""
+        if line.lstrip().upper().startswith(HTTP_METHODS):
+            log.warning("Control socket got an HTTP request, closing it")
+            return None
+        try:
+            request = json.loads(line)
+        except ValueError:
+            return None
+        token = request.get("token") if isinstance(request, dict) else None
+        if not isinstance(token, str) or not hmac.compare_digest(token, self.token):
+            log.warning("Control request without a valid token, closing the connection")
+            return None
+        return request
 
-# Define ULONG_PTR based on system architecture
-ULONG_PTR = ctypes.c_ulong if ctypes.sizeof(ctypes.c_void_p) == 4 else ctypes.c_ulonglong
+    def serve(self, client):
+        try:
+            for line in client.makefile("rb"):
+                if not line.strip():
+                    continue
+                request = self.authorized(line)
+                if request is None:
+                    break
+                try:
+                    response = self.handle(request)
+                except Exception as e:
+                    response = {"ok": False, "error": str(e)}
+                if "id" in request:
+                    response["id"] = request["id"]
+                events = None
+                if response["ok"] and request.get("op") == "subscribe":
+                    events = queue.Queue(CONTROL_QUEUE)
+                    self.subscribers.append(events)  # Before the reply, so no press after it is missed
+                client.sendall(json.dumps(response, ensure_ascii=False).encode() + b"\n")
+                if events is not None:
+                    self.stream(client, events)
+                    break
+        except OSError:
+            pass  # Client went away, or stop() closed it
+        finally:
+            self.clients.discard(client)
+            client.close()
 
-user32 = ctypes.WinDLL('user32', use_last_error=True)
-user32.keybd_event.argtypes = [ctypes.c_byte, ctypes.c_byte, wintypes.DWORD, ULONG_PTR]
+    def handle(self, request):
+        op = request.get("op")
+        handler = getattr(self, f"op_{op}", None)
+        if handler is None:
+            raise ValueError(f"Unknown op: {op}")
+        self.requests += 1
+        return dict(handler(request), ok=True)
 
-def press_function_key(key_number):
-    """Press a function key using Windows API."""
-    if 1 <= key_number <= 24:
-        # Calculate virtual key code
-        vk = VK_F1 + (key_number - 1) if key_number <= 12 else VK_F13 + (key_number - 13)
-        
+    def check_trigger(self, request):
+        button, gesture = request.get("button"), request.get("gesture", "tap")
+        if button not in self.engine.profiles.buttons:
+            raise ValueError(f"Unknown button: {button}")
+        if gesture not in GESTURES:
+            raise ValueError(f"Unknown gesture: {gesture}")
+        return button, gesture
+
+    def op_ping(self, request):
+        return {}
+
+    def op_trigger(self, request):
+        button, gesture = self.check_trigger(request)
+        with self.engine.monitor.dispatch_lock:  # In order with presses from the decks
+            self.engine.handle_command(button, time.perf_counter(), gesture)
+        return {}
+
+    def op_batch(self, request):
+        triggers = [self.check_trigger(trigger) for trigger in request.get("triggers", [])]
+        received = time.perf_counter()
+        with self.engine.monitor.dispatch_lock:  # No deck press lands inside a batch
+            for button, gesture in triggers:
+                self.engine.handle_command(button, received, gesture)
+        return {"count": len(triggers)}
+
+    def op_status(self, request):
+        monitor = self.engine.monitor
+        return {"status": monitor.status or "waiting", "devices": monitor.devices(),
+                "profile": self.engine.profiles.active}
+
+    def op_stats(self, request):
+        return {"stats": dict(self.engine.stats_report(), control={"requests": self.requests, "dropped": self.dropped})}
+
+    def op_reload(self, request):
+        changed = self.engine.reload_settings()
+        return {"profile": self.engine.profiles.active, "changed": len(changed)}
+
+    def op_subscribe(self, request):
+        return {}
+
+    def publish(self, button, gesture, received):
+        """Engine listener, on the dispatching thread: encode once, queue for every subscriber"""
+        if not self.subscribers:
+            return
+        data = json.dumps({"event": "press", "button": button, "gesture": gesture,
+                           "time": time.time()}).encode() + b"\n"
+        for events in list(self.subscribers):
+            try:
+                events.put_nowait(data)
+            except queue.Full:
+                self.dropped += 1
+
+    def stream(self, client, events):
         try:
-            # Press the key
-            user32.keybd_event(vk, 0, KEYEVENTF_EXTENDEDKEY, 0)
-            # Small delay between press and release
-            time.sleep(0.05)
-            # Release the key
-            user32.keybd_event(vk, 0, KEYEVENTF_EXTENDEDKEY | KEYEVENTF_KEYUP, 0)
-            # Small delay after key press
-            time.sleep(0.05)
-        except Exception as e:
-            print(f"Error pressing function key {key_number}: {e}")
-
-def throttle(seconds=0):
-    """A decorator that prevents a function from being called more than once every `seconds` seconds."""
-    def decorator(func):
-        last_called = [0]  # Using list to maintain state in closure
-        def wrapper(*args, **kwargs):
-            now = time.time()
-            if now - last_called[0] >= seconds:
-                last_called[0] = now
-                return func(*args, **kwargs)
-        return wrapper
-    return decorator
+            while True:
+                data = events.get()
+                if data is None:
+                    break
+                client.sendall(data)
+        finally:
+            self.subscribers.remove(events)
+
+class ControlClient:
+    """Blocking client for ControlServer, for scripts and --send.
+
+    The token is read from `token_file` and added to every request.
+    """
+
+    def __init__(self, address=None, token_file=None, timeout=5.0):
+        with open(token_file or control_token_file(), encoding='utf-8') as f:
+            self.token = f.read().strip()
+        family, target = control_family(address or default_control_address())
+        self.sock = socket.socket(family, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(target)
+        if family != socket.AF_UNIX:
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = self.sock.makefile("rb")
+
+    def request(self, op, **fields):
+        return self.send(dict(fields, op=op))
+
+    def send(self, request):
+        self.sock.sendall(json.dumps(dict(request, token=self.token)).encode() + b"\n")
+        return self.read()
+
+    def read(self):
+        line = self.reader.readline()
+        if not line:
+            raise ConnectionError("Control socket closed")
+        return json.loads(line)
+
+    def close(self):
+        self.reader.close()
+        self.sock.close()
 
 class ModernStreamDeckApp:
-    def __init__(self, root):
+    """Tk front-end for a DeckEngine: cards to edit the profiles, status and statistics"""
+
+    def __init__(self, root, settings_file=SETTINGS_FILE, journal_file=None):
         self.root = root
         self.root.title("Stream Deck Kontrol Paneli")
         self.root.geometry("800x700")
@@ -70,16 +3433,14 @@ class ModernStreamDeckApp:
         self.current_recording_button = None
 
         # Add throttling for intensive operations
-        self.last_arduino_check = 0
-        self.arduino_check_interval = 0.1  # Check every 100ms instead of continuous polling
         self.last_ui_update = 0
         self.ui_update_interval = 0.5  # Update UI every 500ms
 
-        self.settings_file = os.path.join(os.path.expanduser("~"), "Documents", "StreamDeckSettings.json")
+        self.settings_file = settings_file
         self.theme_mode = tk.StringVar(value="dark")
         
         # Initialize variables and command types first
-        self.command_types = ["yazı", "press", "hotkey", "volume", "media"]
+        self.command_types = ["yazı", "press", "hotkey", "volume", "media", "macro", "profile", "layer"]
         self.press_keys = [
             "press:enter", "press:esc", "press:tab", "press:space", "press:backspace",
             "press:delete", "press:up", "press:down", "press:left", "press:right",
@@ -91,21 +3452,28 @@ class ModernStreamDeckApp:
         self.volume_keys = ["volume:up", "volume:down", "volume:mute"]
         self.media_keys = ["media:play/pause", "media:next", "media:previous", "media:stop"]
 
-        # Initialize command variables
-        self.command_vars = {}
-        buttons = ['A', 'B', 'C', 'D', 'E', 'F', 'G', 'H']
-        for button in buttons:
-            self.command_vars[button] = {
-                'type': tk.StringVar(value="yazı"),
-                'subtype': tk.StringVar(),
-                'entry': tk.StringVar(value=f"{button} Butonu işlevi"),
-                'message': f"{button} Butonu işlevi"
-            }
+        # The engine owns the configuration, as plain data; only the visible cards hold tk variables
+        self.engine = DeckEngine(settings_file, journal_file=journal_file)
+        self.profiles = self.engine.profiles
+        self.settings_store = self.engine.settings_store
+        self.rate_limiter = self.engine.rate_limiter
+        self.latency = self.engine.latency
+        self.executor = self.engine.executor
+        self.monitor = self.engine.monitor
+        self.ui_limiter = RateLimiter("drop", 0.5, bounce=0)
+        self.ui_limiter.configure("update_button_status", interval=2.0)
 
         # Load settings after initializing variables
-        self.load_settings()
-        
+        self.engine.load_settings()
+        self.theme_mode.set(self.engine.preferences.get("theme_mode", "dark"))
+        self.shown_profile = self.profiles.active  # The profile the cards edit; presses follow profiles.active
+        self.button_configs = self.profiles.profiles[self.shown_profile]
+        self.pending_edits = {}  # (profile, button) -> card values that "Komutları Güncelle" has yet to apply
+        startup.mark("settings")
+
         # Set theme
+        self.themed_widgets = []  # Raw tk widgets that ttk.Style can't reach: (widget, {option: color attribute})
+        self.theme_switch_ms = None
         self.set_theme(self.theme_mode.get())
         
         # Create main container
@@ -114,75 +3482,48 @@ class ModernStreamDeckApp:
         
         # Create UI components
         self.create_header()
+        self.create_profile_bar()
         self.create_command_interface_with_scrollbar()
         self.create_footer()
+        startup.mark("widgets")
         
-        # Arduino connection setup
-        self.arduino = None
+        # Engine events arrive on background threads; the hooks hop to the Tk thread
         self.arduino_connected = False
-        self.arduino_lock = threading.Lock()
-        
-        # Start Arduino monitoring in a separate thread
-        self.arduino_thread = threading.Thread(target=self.monitor_arduino, daemon=True)
-        self.arduino_thread.start()
+        self.engine.on_status = self.on_monitor_status
+        self.engine.on_device = self.on_device_changed
+        self.engine.on_profile = lambda name: self.root.after(0, lambda: self.show_profile(name))
+        self.engine.on_error = self.on_action_error
+        self.engine.on_reload = lambda changed: self.root.after(0, lambda: self.on_settings_reloaded(changed))
+
+        self.log_window = None
+        self.macro_window = None
+        self.schedule_stats_refresh()
 
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
 
-    def save_settings(self):
-        """Throttled settings save"""
-        try:
-            settings = {
-                "theme_mode": self.theme_mode.get(),
-                "buttons": {
-                    button: {
-                        "command_type": vars['type'].get(),
-                        "command_subtype": vars['subtype'].get(),
-                        "command_text": vars['entry'].get(),
-                        "message": vars['message']
-                    }
-                    for button, vars in self.command_vars.items()
-                }
-            }
-            
-            os.makedirs(os.path.dirname(self.settings_file), exist_ok=True)
-            
-            with open(self.settings_file, 'w', encoding='utf-8') as f:
-                json.dump(settings, f, ensure_ascii=False, indent=4)
-            
-        except Exception as e:
-            print(f"Settings save error: {e}")
+        # Show the window before paying for keyboard, pyserial and the first connect
+        self.root.update()
+        startup.mark("first_paint")
+        self.root.after_idle(self.finish_startup)
 
-    def load_settings(self):
-        """Optimized settings loading"""
-        try:
-            if not os.path.exists(self.settings_file):
-                return
+    def finish_startup(self):
+        """Work deferred until the window is on screen: compiling, the foreground hook and the decks"""
+        self.engine.start()
+        log.info("Startup", phases=startup.summary())
 
-            with open(self.settings_file, 'r', encoding='utf-8') as f:
-                settings = json.load(f)
-            
-            if "theme_mode" in settings:
-                self.theme_mode.set(settings["theme_mode"])
-            
-            if "buttons" in settings:
-                for button, data in settings["buttons"].items():
-                    if button in self.command_vars:
-                        vars = self.command_vars[button]
-                        vars['type'].set(data.get("command_type", "yazı"))
-                        vars['subtype'].set(data.get("command_subtype", ""))
-                        vars['entry'].set(data.get("command_text", ""))
-                        vars['message'] = data.get("message", "")
-                        
-        except Exception as e:
-            print(f"Settings load error: {e}")
+    def save_settings(self):
+        """Hand the current settings, theme included, to the engine's write-behind store"""
+        self.engine.preferences["theme_mode"] = self.theme_mode.get()
+        self.engine.save_settings()
 
     def on_closing(self):
         try:
             self.update_message(auto_save=True)  # Önce son komutları güncelle
             self.save_settings()  # Sonra ayarları kaydet
+            self.engine.stop()  # Bekleyen yazmayı diske indirir, cihazları bırakır
             self.root.destroy()
         except Exception as e:
-            print(f"Uygulama kapatılırken hata oluştu: {e}")
+            log.error("Uygulama kapatılırken hata oluştu", error=e)
             self.root.destroy()
 
     def set_theme(self, mode):
@@ -220,9 +3561,10 @@ class ModernStreamDeckApp:
             self.combo_selectbackground = "#3498db"
             self.combo_selectforeground = "#e0e0e0"
         
-        # ttk teması oluştur
+        # ttk teması oluştur; yeniden seçmek tüm widget'ları yeniden çizdirir, bu yüzden bir kez
         self.style = ttk.Style()
-        self.style.theme_use("clam")
+        if self.style.theme_use() != "clam":
+            self.style.theme_use("clam")
         
         # Arkaplan rengi
         self.root.configure(bg=self.bg_color)
@@ -293,6 +3635,14 @@ class ModernStreamDeckApp:
         self.style.configure("CardInner.TFrame", background=self.card_bg_color)
         self.style.configure("CardLabel.TLabel", background=self.card_bg_color, foreground=self.text_color)
         
+        # İstatistik tablosu stili
+        self.style.configure("Treeview",
+                             background=self.card_bg_color,
+                             fieldbackground=self.card_bg_color,
+                             foreground=self.text_color,
+                             font=("Segoe UI", 9))
+        self.style.configure("Treeview.Heading", font=("Segoe UI", 9, "bold"))
+        
         # Scrollbar stilleri
         self.style.configure("TScrollbar", 
                          background=self.card_bg_color, 
@@ -303,48 +3653,41 @@ class ModernStreamDeckApp:
                     background=[("active", self.primary_color)],
                     arrowcolor=[("active", "white")])
 
-    def configure_dark_mode_combobox(self):
-        """Koyu mod için combobox özel ayarları"""
+        self.recolor_widgets()
+
+    def register_themed(self, widget, **options):
+        """Have a raw tk widget follow the theme, e.g. register_themed(canvas, bg="bg_color")"""
+        self.themed_widgets.append((widget, options))
+        widget.configure(**{option: getattr(self, color) for option, color in options.items()})
+        return widget
+
+    def recolor_widgets(self):
+        """Apply the current colors to registered tk widgets, forgetting destroyed ones"""
+        alive = []
+        for widget, options in self.themed_widgets:
+            try:
+                widget.configure(**{option: getattr(self, color) for option, color in options.items()})
+            except tk.TclError:
+                continue
+            alive.append((widget, options))
+        self.themed_widgets = alive
+
+    def style_combobox_popdown(self, combobox):
+        """Color the dropdown list, a plain tk Listbox, as it opens"""
         try:
-            for child in self.root.winfo_children():
-                self.configure_comboboxes_recursive(child)
-        except Exception as e:
-            print(f"Combobox yapılandırma hatası: {e}")
-            
-    def configure_comboboxes_recursive(self, parent):
-        """Tüm alt widget'ları bularak combobox'ları yapılandır"""
-        for child in parent.winfo_children():
-            if isinstance(child, ttk.Combobox):
-                child.configure(
-                    background=self.combo_background,
-                    foreground=self.combo_foreground,
-                    selectbackground=self.combo_selectbackground,
-                    selectforeground=self.combo_selectforeground
-                )
-                child.tk.eval(f"""
-                    [ttk::combobox::PopdownWindow %s].f.l configure -background {self.combo_background} -foreground {self.combo_foreground}
-                    [ttk::combobox::PopdownWindow %s].f.l configure -selectbackground {self.combo_selectbackground} -selectforeground {self.combo_selectforeground}
-                """ % (child, child))
-            
-            if len(child.winfo_children()) > 0:
-                self.configure_comboboxes_recursive(child)
+            combobox.tk.eval(f"""
+                [ttk::combobox::PopdownWindow {combobox}].f.l configure -background {self.combo_background} -foreground {self.combo_foreground} -selectbackground {self.combo_selectbackground} -selectforeground {self.combo_selectforeground}
+            """)
+        except tk.TclError as e:
+            log.error("Combobox yapılandırma hatası", error=e)
 
     def toggle_theme(self):
+        started = time.perf_counter()
         new_mode = "dark" if self.theme_mode.get() == "light" else "light"
         self.theme_mode.set(new_mode)
+        # Only styles and registered colors change; widgets, entries and selections stay as they are
         self.set_theme(new_mode)
         
-        self.main_container.destroy()
-        self.main_container = ttk.Frame(self.root)
-        self.main_container.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
-        
-        self.create_header()
-        self.create_command_interface_with_scrollbar()  # Scrollbar'lı sürümü kullan
-        self.create_footer()
-        
-        if new_mode == "dark":
-            self.configure_dark_mode_combobox()
-        
         theme_text = "☀️ Açık Mod" if new_mode == "dark" else "🌙 Koyu Mod"
         self.theme_button.configure(text=theme_text)
         
@@ -354,6 +3697,10 @@ class ModernStreamDeckApp:
         else:
             self.update_status_indicator("waiting")
 
+        self.root.update_idletasks()
+        self.theme_switch_ms = (time.perf_counter() - started) * 1000
+        log.info("Tema değiştirildi", mode=new_mode, ms=round(self.theme_switch_ms, 1))
+
     def create_header(self):
         header_frame = ttk.Frame(self.main_container)
         header_frame.pack(fill=tk.X, pady=(0, 20))
@@ -380,6 +3727,93 @@ class ModernStreamDeckApp:
         self.status_label = ttk.Label(self.status_frame, text="Arduino bağlantısı bekleniyor...", style="Waiting.TLabel")
         self.status_label.pack(side=tk.LEFT)
 
+    def create_profile_bar(self):
+        profile_frame = ttk.Frame(self.main_container)
+        profile_frame.pack(fill=tk.X, pady=(0, 10))
+
+        ttk.Label(profile_frame, text="Profil:").pack(side=tk.LEFT)
+        self.profile_var = tk.StringVar(value=self.shown_profile)
+        self.profile_combobox = ttk.Combobox(profile_frame, textvariable=self.profile_var, width=20,
+                                             values=list(self.profiles.profiles), state="readonly")
+        self.profile_combobox.configure(postcommand=lambda: self.style_combobox_popdown(self.profile_combobox))
+        self.profile_combobox.pack(side=tk.LEFT, padx=5)
+        self.profile_combobox.bind("<<ComboboxSelected>>", lambda e: self.switch_profile(self.profile_var.get()))
+
+        ttk.Button(profile_frame, text="➕", width=3, style="Theme.TButton",
+                   command=self.add_profile).pack(side=tk.LEFT)
+        ttk.Button(profile_frame, text="🗑", width=3, style="Theme.TButton",
+                   command=self.remove_profile).pack(side=tk.LEFT, padx=(5, 0))
+
+        # Executables that bring this profile up when they take the foreground
+        self.profile_apps_var = tk.StringVar(value=", ".join(self.profiles.apps.get(self.shown_profile, [])))
+        apps_entry = ttk.Entry(profile_frame, textvariable=self.profile_apps_var)
+        apps_entry.pack(side=tk.RIGHT, fill=tk.X, expand=True, padx=(5, 0))
+        apps_entry.bind("<FocusOut>", lambda e: self.update_profile_apps())
+        apps_entry.bind("<Return>", lambda e: self.update_profile_apps())
+        ttk.Label(profile_frame, text="Uygulamalar:").pack(side=tk.RIGHT, padx=(10, 0))
+
+    def add_profile(self):
+        name = simpledialog.askstring("Yeni Profil", "Profil adı:", parent=self.root)
+        if not name or not name.strip():
+            return
+        name = name.strip()
+        if name not in self.profiles.profiles:
+            with self.engine.monitor.dispatch_lock:  # Not in the middle of a settings reload
+                self.profiles.add(name)
+                self.profiles.compile(name)
+            self.profile_combobox.configure(values=list(self.profiles.profiles))
+            self.save_settings()
+        self.switch_profile(name)
+
+    def remove_profile(self):
+        name = self.shown_profile
+        if name == DEFAULT_PROFILE:
+            messagebox.showinfo("Profil", "Varsayılan profil silinemez.")
+            return
+        if not messagebox.askyesno("Profil", f"'{name}' profili silinsin mi?"):
+            return
+        with self.engine.monitor.dispatch_lock:
+            self.profiles.remove(name)
+        self.profile_combobox.configure(values=list(self.profiles.profiles))
+        self.show_profile(self.profiles.active)
+        self.save_settings()
+
+    def update_profile_apps(self):
+        apps = self.profile_apps_var.get().split(",")
+        if [app.strip().lower() for app in apps if app.strip()] != self.profiles.apps.get(self.shown_profile, []):
+            with self.engine.monitor.dispatch_lock:
+                self.profiles.set_apps(self.shown_profile, apps)
+            self.save_settings()
+
+    def switch_profile(self, name, manual=True):
+        """Swap the active action table now; the engine's on_profile hook moves the cards"""
+        self.engine.switch_profile(name, manual)
+
+    def show_profile(self, name):
+        """Point the cards at another profile's configuration, without rebuilding them"""
+        if name == self.shown_profile or name not in self.profiles.profiles:
+            return
+        self.update_profile_apps()
+        self.shown_profile = name
+        self.button_configs = self.profiles.profiles[name]
+        self.profile_var.set(name)
+        self.profile_apps_var.set(", ".join(self.profiles.apps.get(name, [])))
+        self.command_cards.refresh()
+
+    def on_settings_reloaded(self, changed):
+        """Show settings read again from disk; the configs were updated in place"""
+        self.pending_edits = surviving_edits(self.pending_edits, changed)
+        name = self.profiles.active
+        if name == self.shown_profile and all(button is not None for profile, button in changed):
+            self.command_cards.refresh_slots({button for profile, button in changed if profile == name})
+            return
+        self.shown_profile = name
+        self.button_configs = self.profiles.profiles[name]
+        self.profile_var.set(name)
+        self.profile_apps_var.set(", ".join(self.profiles.apps.get(name, [])))
+        self.profile_combobox.configure(values=list(self.profiles.profiles))
+        self.command_cards.refresh()
+
     def update_status_indicator(self, status):
         if status == "connected":
             self.status_indicator.config(bg=self.accent_color)
@@ -394,74 +3828,43 @@ class ModernStreamDeckApp:
             self.arduino_connected = False
 
     def create_command_interface_with_scrollbar(self):
-        """Optimized command interface creation with reduced redraws"""
+        """Virtualized command list: a few pooled cards are rebound to whichever buttons are in view"""
         commands_outer_frame = ttk.Frame(self.main_container)
         commands_outer_frame.pack(fill=tk.BOTH, expand=True)
         
-        # Create canvas with scrollbar
-        canvas_frame = ttk.Frame(commands_outer_frame)
-        canvas_frame.pack(fill=tk.BOTH, expand=True)
-        
-        scrollbar = ttk.Scrollbar(canvas_frame, orient=tk.VERTICAL)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        
-        canvas = tk.Canvas(canvas_frame, bg=self.bg_color, highlightthickness=0)
-        canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        
-        scrollbar.config(command=canvas.yview)
-        canvas.config(yscrollcommand=scrollbar.set)
-        
-        commands_frame = ttk.Frame(canvas)
-        canvas_window = canvas.create_window((0, 0), window=commands_frame, anchor=tk.NW, tags="commands_frame")
-        
-        # Create command cards efficiently
-        for button in self.command_vars.keys():
-            self.create_command_card(
-                commands_frame,
-                f"{button} Butonu",
-                self.command_vars[button]['type'],
-                self.command_vars[button]['subtype'],
-                self.command_vars[button]['entry'],
-                self.get_button_color(button)
-            )
-        
-        # Optimize canvas resizing
-        def update_scroll_region(event=None):
-            canvas.configure(scrollregion=canvas.bbox("all"))
-        
-        def configure_canvas(event):
-            canvas.itemconfig(canvas_window, width=canvas.winfo_width())
-        
-        # Efficient event binding
-        canvas.bind("<Configure>", configure_canvas)
-        commands_frame.bind("<Configure>", update_scroll_region)
+        self.command_cards = VirtualCardList(commands_outer_frame, self.create_command_card, self.bind_command_card)
+        self.register_themed(self.command_cards.canvas, bg="bg_color")
+        self.command_cards.set_slots(self.button_configs)
         
         # Optimize mousewheel scrolling
         def on_mousewheel(event):
             if event.num == 5 or event.delta < 0:
-                canvas.yview_scroll(1, "units")
+                self.command_cards.scroll(1)
             elif event.num == 4 or event.delta > 0:
-                canvas.yview_scroll(-1, "units")
+                self.command_cards.scroll(-1)
         
         # Bind mousewheel events based on platform
         if sys.platform.startswith('win'):
-            canvas.bind_all("<MouseWheel>", on_mousewheel)
+            self.root.bind_all("<MouseWheel>", on_mousewheel)
         else:
-            canvas.bind_all("<Button-4>", on_mousewheel)
-            canvas.bind_all("<Button-5>", on_mousewheel)
+            self.root.bind_all("<Button-4>", on_mousewheel)
+            self.root.bind_all("<Button-5>", on_mousewheel)
 
-    def create_command_card(self, parent, title, command_type_var, command_subtype_var, entry_var, color_accent):
-        card = ttk.LabelFrame(parent, text=title, style="Card.TLabelframe")
-        card.pack(fill=tk.X, pady=10, ipady=10, padx=5)
+    def create_command_card(self, parent):
+        """One reusable card; bind_command_card points it at a button"""
+        card = SimpleNamespace(button=None, index=None, shown=None,
+                               type=tk.StringVar(), subtype=tk.StringVar(), entry=tk.StringVar(),
+                               double=tk.StringVar(), long=tk.StringVar(), repeat=tk.BooleanVar())
+        card.frame = ttk.LabelFrame(parent, text="", style="Card.TLabelframe")
         
-        inner_frame = ttk.Frame(card, style="CardInner.TFrame")
+        inner_frame = ttk.Frame(card.frame, style="CardInner.TFrame")
         inner_frame.pack(fill=tk.X, padx=15, pady=10)
         
         inner_frame.columnconfigure(0, weight=1)
         inner_frame.columnconfigure(1, weight=3)
         
-        color_indicator = tk.Frame(inner_frame, width=4, height=40, bg=color_accent)
-        color_indicator.grid(row=0, column=0, rowspan=3, sticky="ns", padx=(0, 10))
+        card.color_indicator = tk.Frame(inner_frame, width=4, height=40)
+        card.color_indicator.grid(row=0, column=0, rowspan=3, sticky="ns", padx=(0, 10))
         
         type_frame = ttk.Frame(inner_frame, style="CardInner.TFrame")
         type_frame.grid(row=0, column=1, sticky="ew", pady=(0, 8))
@@ -472,50 +3875,101 @@ class ModernStreamDeckApp:
             type_frame,
             values=self.command_types,
             width=15,
-            textvariable=command_type_var,
+            textvariable=card.type,
             state="readonly"
         )
+        type_combobox.configure(postcommand=lambda c=type_combobox: self.style_combobox_popdown(c))
         type_combobox.pack(side=tk.LEFT, padx=5)
         
-        subtype_frame = ttk.Frame(inner_frame, style="CardInner.TFrame")
-        subtype_frame.grid(row=1, column=1, sticky="ew", pady=(0, 8))
+        card.subtype_frame = ttk.Frame(inner_frame, style="CardInner.TFrame")
+        card.subtype_frame.grid(row=1, column=1, sticky="ew", pady=(0, 8))
         
-        ttk.Label(subtype_frame, text="Alt Tip:", width=12, style="CardLabel.TLabel").pack(side=tk.LEFT)
+        ttk.Label(card.subtype_frame, text="Alt Tip:", width=12, style="CardLabel.TLabel").pack(side=tk.LEFT)
         
-        subtype_combobox = ttk.Combobox(
-            subtype_frame,
+        card.subtype_combobox = ttk.Combobox(
+            card.subtype_frame,
             width=30,
-            textvariable=command_subtype_var,
+            textvariable=card.subtype,
             state="readonly"
         )
-        subtype_combobox.pack(side=tk.LEFT, padx=5, fill=tk.X, expand=True)
+        card.subtype_combobox.configure(postcommand=lambda c=card.subtype_combobox: self.style_combobox_popdown(c))
+        card.subtype_combobox.pack(side=tk.LEFT, padx=5, fill=tk.X, expand=True)
         
-        entry_frame = ttk.Frame(inner_frame, style="CardInner.TFrame")
-        entry_frame.grid(row=2, column=1, sticky="ew")
+        card.entry_frame = ttk.Frame(inner_frame, style="CardInner.TFrame")
+        card.entry_frame.grid(row=2, column=1, sticky="ew")
         
-        ttk.Label(entry_frame, text="Özel Komut:", width=12, style="CardLabel.TLabel").pack(side=tk.LEFT)
+        ttk.Label(card.entry_frame, text="Özel Komut:", width=12, style="CardLabel.TLabel").pack(side=tk.LEFT)
         
-        entry = ttk.Entry(entry_frame, textvariable=entry_var)
-        entry.pack(side=tk.LEFT, padx=5, fill=tk.X, expand=True)
+        card.entry_widget = ttk.Entry(card.entry_frame, textvariable=card.entry)
+        card.entry_widget.pack(side=tk.LEFT, padx=5, fill=tk.X, expand=True)
 
         # Create record button frame
-        record_frame = ttk.Frame(inner_frame, style="CardInner.TFrame")
-        record_frame.grid(row=3, column=1, sticky="ew", pady=(8, 0))
-        record_frame.grid_remove()  # Initially hidden
+        card.record_frame = ttk.Frame(inner_frame, style="CardInner.TFrame")
+        card.record_frame.grid(row=3, column=1, sticky="ew", pady=(8, 0))
+        card.record_frame.grid_remove()  # Initially hidden
 
         # Create record button
-        self.record_button = ttk.Button(
-            record_frame,
+        card.record_button = ttk.Button(
+            card.record_frame,
             text="🎙️ Tuş Kombinasyonu Kaydet",
-            command=lambda e=entry: self.start_recording_hotkey(e, self.record_button)
+            command=lambda: self.start_recording_hotkey(card.entry_widget, card.record_button)
         )
-        self.record_button.pack(fill=tk.X)
-        
-        type_combobox.bind("<<ComboboxSelected>>",
-                         lambda e, st=subtype_combobox, sf=subtype_frame, ef=entry_frame, rf=record_frame:
-                         self.update_subtype_options(command_type_var.get(), st, sf, ef, rf))
+        card.record_button.pack(fill=tk.X)
+
+        # Extra gestures: raw action strings for double tap and long press
+        gesture_frame = ttk.Frame(inner_frame, style="CardInner.TFrame")
+        gesture_frame.grid(row=4, column=1, sticky="ew", pady=(8, 0))
+        ttk.Label(gesture_frame, text="Çift Dokunma:", width=12, style="CardLabel.TLabel").pack(side=tk.LEFT)
+        ttk.Entry(gesture_frame, textvariable=card.double, width=14).pack(side=tk.LEFT, padx=5, fill=tk.X, expand=True)
+        ttk.Label(gesture_frame, text="Uzun Basma:", style="CardLabel.TLabel").pack(side=tk.LEFT, padx=(5, 0))
+        ttk.Entry(gesture_frame, textvariable=card.long, width=14).pack(side=tk.LEFT, padx=5, fill=tk.X, expand=True)
+        ttk.Checkbutton(gesture_frame, text="Basılı Tutunca Tekrarla", variable=card.repeat).pack(side=tk.LEFT, padx=5)
         
-        self.update_subtype_options(command_type_var.get(), subtype_combobox, subtype_frame, entry_frame, record_frame)
+        type_combobox.bind("<<ComboboxSelected>>", lambda e: self.update_card_subtype(card))
+        for var in (card.type, card.subtype, card.entry, card.double, card.long, card.repeat):
+            var.trace_add("write", lambda *args: self.on_card_changed(card))
+        return card
+
+    def bind_command_card(self, card, button):
+        """Show `button`'s configuration on a pooled card"""
+        if self.current_recording_entry is card.entry_widget:
+            self.stop_recording_hotkey()
+        card.button = None  # Mute the traces while the card is loaded
+        config = self.pending_edits.get((self.shown_profile, button)) or self.button_configs[button]
+        card.frame.configure(text=f"{button} Butonu")
+        card.color_indicator.configure(bg=self.get_button_color(button))
+        card.type.set(config['type'])
+        card.subtype.set(config['subtype'])
+        card.entry.set(config['entry'])
+        gestures = config.get('gestures') or {}
+        card.double.set(gestures.get("double", ""))
+        card.long.set(gestures.get("long", ""))
+        card.repeat.set(bool(config.get('repeat')))
+        self.update_card_subtype(card)
+        # The subtype list may fill in a default ("" shows as "auto"); that alone is not an edit
+        card.shown = (config['type'], card.subtype.get(), config['subtype'])
+        card.button = button
+
+    def update_card_subtype(self, card):
+        self.update_subtype_options(card.type.get(), card.subtype_combobox, card.subtype_frame,
+                                    card.entry_frame, card.record_frame)
+
+    def on_card_changed(self, card):
+        """Keep a card's edits as pending; update_message applies them, as the button says"""
+        if card.button is None:
+            return
+        config = self.button_configs[card.button]
+        gestures = {name: var.get().strip() for name, var in (("double", card.double), ("long", card.long))}
+        subtype = card.subtype.get()
+        if (card.type.get(), subtype) == card.shown[:2]:
+            subtype = card.shown[2]
+        values = {'type': card.type.get(), 'subtype': subtype, 'entry': card.entry.get(),
+                  'gestures': {name: message for name, message in gestures.items() if message},
+                  'repeat': card.repeat.get()}
+        if any(config.get(name) != value for name, value in values.items()):
+            self.pending_edits[(self.shown_profile, card.button)] = values
+        else:
+            self.pending_edits.pop((self.shown_profile, card.button), None)
 
     def update_subtype_options(self, command_type, command_subtype_combobox, subtype_frame, entry_frame, record_frame=None):
         # Mevcut alt tip değerini koru
@@ -551,6 +4005,18 @@ class ModernStreamDeckApp:
             entry_frame.grid_remove()
             if record_frame:
                 record_frame.grid_remove()
+        elif command_type in ("macro", "profile", "layer"):
+            names = sorted(macros.macros) if command_type == "macro" else list(self.engine.profiles.profiles)
+            action_keys = [f"{command_type}:{name}" for name in names]
+            command_subtype_combobox['values'] = action_keys
+            if current_subtype in action_keys:
+                command_subtype_combobox.set(current_subtype)
+            else:
+                command_subtype_combobox.set(action_keys[0] if action_keys else "")
+            subtype_frame.grid(row=1, column=1, sticky="ew", pady=(0, 8))
+            entry_frame.grid_remove()
+            if record_frame:
+                record_frame.grid_remove()
         elif command_type == "hotkey":
             command_subtype_combobox.set("")
             command_subtype_combobox['values'] = []
@@ -559,8 +4025,14 @@ class ModernStreamDeckApp:
             if record_frame:
                 record_frame.grid(row=3, column=1, sticky="ew", pady=(8, 0))
         elif command_type == "yazı":
-            subtype_frame.grid_remove()
-            entry_frame.grid(row=1, column=1, sticky="ew")
+            # The subtype picks how the text is injected
+            command_subtype_combobox['values'] = TEXT_MODES
+            if current_subtype in TEXT_MODES:
+                command_subtype_combobox.set(current_subtype)
+            else:
+                command_subtype_combobox.set(TEXT_MODES[0])
+            subtype_frame.grid(row=1, column=1, sticky="ew", pady=(0, 8))
+            entry_frame.grid(row=2, column=1, sticky="ew")
             if record_frame:
                 record_frame.grid_remove()
 
@@ -646,7 +4118,7 @@ class ModernStreamDeckApp:
                         break
         
         except Exception as e:
-            print(f"Error during hotkey recording: {e}")
+            log.error("Error during hotkey recording", error=e)
         finally:
             # Ensure we stop recording if there's an error
             if self.recording_hotkey:
@@ -671,17 +4143,215 @@ class ModernStreamDeckApp:
         )
         info_text.pack(pady=(5, 0))
 
-    @throttle(seconds=0.5)
+        self.create_stats_panel(footer_frame)
+
+    def create_stats_panel(self, parent):
+        """Collapsible latency panel: one row per stage, button and action type"""
+        stats_bar = ttk.Frame(parent)
+        stats_bar.pack(fill=tk.X, pady=(10, 0))
+
+        self.stats_summary = ttk.Label(stats_bar, text="", style="Info.TLabel")
+        self.stats_summary.pack(side=tk.LEFT)
+
+        ttk.Button(stats_bar, text="Dışa Aktar", style="Theme.TButton",
+                   command=self.export_stats).pack(side=tk.RIGHT)
+        ttk.Button(stats_bar, text="📊 İstatistikler", style="Theme.TButton",
+                   command=self.toggle_stats_panel).pack(side=tk.RIGHT, padx=(0, 5))
+        ttk.Button(stats_bar, text="📜 Günlük", style="Theme.TButton",
+                   command=self.show_log_window).pack(side=tk.RIGHT, padx=(0, 5))
+        ttk.Button(stats_bar, text="⏯ Makrolar", style="Theme.TButton",
+                   command=self.show_macro_window).pack(side=tk.RIGHT, padx=(0, 5))
+
+        self.stats_frame = ttk.Frame(parent)
+        columns = ("count", "drops", "p50", "p95", "p99")
+        self.stats_tree = ttk.Treeview(self.stats_frame, columns=columns, height=8)
+        self.stats_tree.heading("#0", text="")
+        self.stats_tree.column("#0", width=160)
+        for column, title in zip(columns, ("Basış", "Düşen", "p50 ms", "p95 ms", "p99 ms")):
+            self.stats_tree.heading(column, text=title)
+            self.stats_tree.column(column, width=80, anchor=tk.E)
+        self.stats_tree.pack(fill=tk.X)
+        self.refresh_stats()
+
+    def schedule_stats_refresh(self):
+        try:
+            self.refresh_stats()
+        except tk.TclError:
+            pass  # Panel is being rebuilt
+        self.root.after(STATS_REFRESH_MS, self.schedule_stats_refresh)
+
+    def toggle_stats_panel(self):
+        if self.stats_frame.winfo_ismapped():
+            self.stats_frame.pack_forget()
+        else:
+            self.stats_frame.pack(fill=tk.X, pady=(5, 0))
+            self.refresh_stats()
+
+    def refresh_stats(self):
+        """Redraw the summary line, and the table while it is visible"""
+        snapshot = self.latency.snapshot()
+        total = snapshot["stages"]["total"]
+        self.stats_summary.configure(
+            text=f"Basış: {snapshot['presses']}  Düşen: {snapshot['drops']}  "
+                 f"Gecikme p50/p95/p99: {total['p50_ms']:.1f}/{total['p95_ms']:.1f}/{total['p99_ms']:.1f} ms")
+        if not self.stats_frame.winfo_ismapped():
+            return
+
+        tree = self.stats_tree
+        tree.delete(*tree.get_children())
+        devices = {f"{device} ({info['events_per_second']:.1f}/s)" if info["connected"] else f"{device} (bağlı değil)":
+                   dict(snapshot["devices"].get(device, {}), presses=info["events"], drops="")
+                   for device, info in self.monitor.devices().items()}
+        sections = (
+            ("Aşamalar", {name: dict(s, drops="") for name, s in snapshot["stages"].items()}),
+            ("Cihazlar", devices),
+            ("Butonlar", snapshot["buttons"]),
+            ("Komut Tipleri", {kind: dict(s, drops="") for kind, s in snapshot["action_types"].items()}),
+        )
+        for title, rows in sections:
+            parent = tree.insert("", tk.END, text=title, open=True)
+            for name, row in rows.items():
+                tree.insert(parent, tk.END, text=name, values=(
+                    row.get("presses", row.get("count", 0)), row.get("drops", 0),
+                    row.get("p50_ms", ""), row.get("p95_ms", ""), row.get("p99_ms", "")))
+
+    def show_log_window(self):
+        """Live view of the in-memory log ring buffer"""
+        if self.log_window is not None and self.log_window.winfo_exists():
+            self.log_window.lift()
+            return
+
+        window = tk.Toplevel(self.root)
+        window.title("Günlük")
+        window.geometry("760x400")
+        self.register_themed(window, bg="bg_color")
+        self.log_window = window
+
+        toolbar = ttk.Frame(window)
+        toolbar.pack(fill=tk.X, padx=10, pady=(10, 5))
+        ttk.Label(toolbar, text="Seviye:").pack(side=tk.LEFT)
+        level = tk.StringVar(value="INFO")
+        level_combobox = ttk.Combobox(toolbar, values=[LEVEL_NAMES[value] for value in sorted(LEVEL_NAMES)], width=10,
+                                      textvariable=level, state="readonly")
+        level_combobox.configure(postcommand=lambda: self.style_combobox_popdown(level_combobox))
+        level_combobox.pack(side=tk.LEFT, padx=5)
+
+        text = tk.Text(window, font=("Consolas", 9), relief=tk.FLAT, wrap=tk.NONE)
+        self.register_themed(text, bg="entry_bg", fg="entry_fg", insertbackground="text_color")
+        text.pack(fill=tk.BOTH, expand=True, padx=10, pady=(0, 10))
+
+        shown = [None]
+        def refresh():
+            if not window.winfo_exists():
+                return
+            min_level = next(value for value, name in LEVEL_NAMES.items() if name == level.get())
+            lines = log.tail(min_level)
+            if lines != shown[0]:
+                at_end = text.yview()[1] >= 0.999
+                text.configure(state=tk.NORMAL)
+                text.delete("1.0", tk.END)
+                text.insert(tk.END, "\n".join(lines))
+                text.configure(state=tk.DISABLED)
+                if at_end:
+                    text.see(tk.END)
+                shown[0] = lines
+            window.after(LOG_REFRESH_MS, refresh)
+        refresh()
+
+    def show_macro_window(self):
+        """Edit stored macros, one step per line"""
+        if self.macro_window is not None and self.macro_window.winfo_exists():
+            self.macro_window.lift()
+            return
+
+        window = tk.Toplevel(self.root)
+        window.title("Makrolar")
+        window.geometry("520x420")
+        self.register_themed(window, bg="bg_color")
+        self.macro_window = window
+
+        toolbar = ttk.Frame(window)
+        toolbar.pack(fill=tk.X, padx=10, pady=(10, 5))
+        ttk.Label(toolbar, text="Makro:").pack(side=tk.LEFT)
+        name = tk.StringVar()
+        name_combobox = ttk.Combobox(toolbar, values=sorted(macros.macros), width=20, textvariable=name)
+        name_combobox.configure(postcommand=lambda: self.style_combobox_popdown(name_combobox))
+        name_combobox.pack(side=tk.LEFT, padx=5)
+
+        ttk.Label(window, text="hotkey:ctrl+c · press:f13 · text:merhaba · wait:50 · repeat:3 … end",
+                  style="Info.TLabel").pack(fill=tk.X, padx=10)
+        text = tk.Text(window, font=("Consolas", 10), relief=tk.FLAT, height=12)
+        self.register_themed(text, bg="entry_bg", fg="entry_fg", insertbackground="text_color")
+        text.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+
+        def steps():
+            return [line for line in text.get("1.0", tk.END).splitlines() if line.strip()]
+
+        def select(event=None):
+            text.delete("1.0", tk.END)
+            text.insert(tk.END, "\n".join(macros.macros.get(name.get(), [])))
+
+        def save():
+            macro_name = name.get().strip()
+            if not macro_name:
+                return
+            try:
+                compile_macro(steps())
+            except Exception as e:
+                messagebox.showerror("Hata", f"Makro geçersiz: {e}", parent=window)
+                return
+            macros.define(macro_name, steps())
+            name_combobox.configure(values=sorted(macros.macros))
+            self.command_cards.refresh()
+            self.save_settings()
+
+        def delete():
+            macros.define(name.get().strip(), None)
+            name_combobox.configure(values=sorted(macros.macros))
+            name.set("")
+            select()
+            self.command_cards.refresh()
+            self.save_settings()
+
+        name_combobox.bind("<<ComboboxSelected>>", select)
+        buttons = ttk.Frame(window)
+        buttons.pack(fill=tk.X, padx=10, pady=(0, 10))
+        ttk.Button(buttons, text="Kaydet", style="Theme.TButton", command=save).pack(side=tk.LEFT)
+        ttk.Button(buttons, text="Sil", style="Theme.TButton", command=delete).pack(side=tk.LEFT, padx=5)
+        ttk.Button(buttons, text="▶ Oynat", style="Theme.TButton",
+                   command=lambda: macros.play(name.get().strip())).pack(side=tk.LEFT)
+        ttk.Button(buttons, text="■ Durdur", style="Theme.TButton",
+                   command=macros.cancel_all).pack(side=tk.LEFT, padx=5)
+
+    def stats_report(self):
+        """Everything the stats panel knows, as a JSON-ready dict"""
+        return dict(self.engine.stats_report(), theme_switch_ms=self.theme_switch_ms)
+
+    def export_stats(self):
+        path = filedialog.asksaveasfilename(
+            title="İstatistikleri Dışa Aktar",
+            defaultextension=".json",
+            initialfile="StreamDeckStats.json",
+            filetypes=[("JSON", "*.json")])
+        if not path:
+            return
+        try:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(self.stats_report(), f, ensure_ascii=False, indent=4)
+        except Exception as e:
+            messagebox.showerror("Hata", f"İstatistikler kaydedilemedi: {e}")
+
     def update_message(self, auto_save=False):
-        """Throttled message update"""
+        """Apply the cards' pending edits and save; rate limited, but the save on close is never dropped"""
+        if not auto_save and not self.ui_limiter.submit("update_message", _noop):
+            return
         try:
-            for button, vars in self.command_vars.items():
-                if vars['type'].get() == "yazı":
-                    vars['message'] = vars['entry'].get()
-                elif vars['type'].get() == "hotkey":
-                    vars['message'] = f"hotkey:{vars['entry'].get()}"
-                else:
-                    vars['message'] = vars['subtype'].get()
+            edits, self.pending_edits = self.pending_edits, {}
+            with self.engine.monitor.dispatch_lock:  # Not in the middle of a settings reload
+                for (profile, button), values in edits.items():
+                    if button in self.profiles.profiles.get(profile, {}):  # The profile may be gone by now
+                        self.profiles.profiles[profile][button].update(values)
+                        self.sync_button(profile, button)
 
             if not auto_save:
                 self.update_button_status()
@@ -690,257 +4360,39 @@ class ModernStreamDeckApp:
         except Exception as e:
             messagebox.showerror("Hata", f"Komutlar güncellenirken bir hata oluştu: {e}")
 
-    @throttle(seconds=1)
     def update_button_status(self):
-        """Throttled button status update"""
+        """Rate limited button status update, at most once per 2 s feedback period"""
+        if not self.ui_limiter.submit("update_button_status", _noop):
+            return
         original_text = self.update_button["text"]
         self.update_button["text"] = "✓ Komutlar Güncellendi!"
         self.root.after(2000, lambda: self.update_button.configure(text=original_text))
 
-    def monitor_arduino(self):
-        """Optimized Arduino monitoring with continuous communication"""
-        reconnect_delay = 2  # Initial delay between reconnection attempts
-        max_reconnect_delay = 30  # Maximum delay between attempts
-        
-        while True:
-            current_time = time.time()
-            
-            if current_time - self.last_arduino_check < self.arduino_check_interval:
-                time.sleep(0.01)
-                continue
-                
-            self.last_arduino_check = current_time
-            
-            with self.arduino_lock:
-                if not self.arduino:
-                    print(f"\nAttempting to reconnect (delay: {reconnect_delay}s)...")
-                    self.try_connect_arduino()
-                    time.sleep(reconnect_delay)
-                    # Increase reconnect delay (with maximum limit)
-                    reconnect_delay = min(reconnect_delay * 1.5, max_reconnect_delay)
-                else:
-                    try:
-                        if not self.arduino.is_open:
-                            print("\nArduino connection lost (port closed)")
-                            self.arduino = None
-                            self.update_status_indicator("disconnected")
-                            reconnect_delay = 2  # Reset delay on disconnect
-                            continue
-
-                        # Send keepalive and check for response
-                        self.arduino.write(b"PING\n")
-                        time.sleep(0.1)
-                        
-                        if not self.check_arduino_data():
-                            print("No response to keepalive, checking connection...")
-                            self.arduino.write(b"TEST\n")
-                            time.sleep(0.1)
-                            if not self.check_arduino_data():
-                                print("Connection appears to be lost")
-                                self.arduino.close()
-                                self.arduino = None
-                                self.update_status_indicator("disconnected")
-                                reconnect_delay = 2
-                        else:
-                            # Reset reconnect delay on successful communication
-                            reconnect_delay = 2
-                            
-                    except Exception as e:
-                        print(f"\nError in Arduino monitoring: {str(e)}")
-                        try:
-                            self.arduino.close()
-                        except:
-                            pass
-                        self.arduino = None
-                        self.update_status_indicator("disconnected")
-                        reconnect_delay = 2
-            
-            time.sleep(self.arduino_check_interval)
-
-    def try_connect_arduino(self):
-        """Attempt to connect to Arduino with improved error handling and debugging"""
-        try:
-            print("\n=== Arduino Connection Attempt ===")
-            available_ports = list(list_ports.comports())
-            if not available_ports:
-                print("No COM ports found!")
-                self.update_status_indicator("waiting")
-                return
-
-            print(f"Available ports: {[port.device for port in available_ports]}")
-            
-            # Try COM3 first if available
-            com3_port = next((port for port in available_ports if port.device == "COM3"), None)
-            if com3_port:
-                print("COM3 found - attempting connection first...")
-                if self.try_connect_to_port(com3_port):
-                    return
-                print("COM3 connection failed, trying other ports...")
-
-            # Try other ports
-            for port in available_ports:
-                if port.device != "COM3":  # Skip COM3 as we already tried it
-                    if self.try_connect_to_port(port):
-                        return
-
-            print("No Arduino found on any port")
-            self.update_status_indicator("waiting")
-            
-        except Exception as e:
-            print(f"Connection error: {str(e)}")
-            self.update_status_indicator("disconnected")
+    def on_monitor_status(self, status):
+        """Engine status hook, from the monitor's thread"""
+        self.root.after(0, lambda: self.update_status_indicator(status))
 
-    def try_connect_to_port(self, port):
-        """Try to connect to a specific port with continuous communication"""
-        try:
-            print(f"\nTrying to connect to {port.device}...")
-            print(f"Port details: {port.description}")
-            
-            ser = serial.Serial(
-                port=port.device,
-                baudrate=9600,
-                timeout=1,
-                write_timeout=1,
-                bytesize=serial.EIGHTBITS,
-                parity=serial.PARITY_NONE,
-                stopbits=serial.STOPBITS_ONE
-            )
-            
-            # Give Arduino time to reset
-            time.sleep(2)
-            print(f"Port opened: {ser.is_open}")
-            
-            # Clear any existing data
-            ser.reset_input_buffer()
-            ser.reset_output_buffer()
-            
-            # Keep trying to establish initial communication
-            attempts = 0
-            max_attempts = 5
-            while attempts < max_attempts:
-                print(f"Connection attempt {attempts + 1}/{max_attempts}")
-                try:
-                    ser.write(b"TEST\n")
-                    time.sleep(0.5)
-                    
-                    if ser.in_waiting > 0:
-                        response = ser.readline().decode().strip()
-                        print(f"Received response: '{response}'")
-                        
-                        if response == "DECK":
-                            print(f"Arduino successfully connected on {port.device}")
-                            self.arduino = ser
-                            self.update_status_indicator("connected")
-                            return True
-                except Exception as e:
-                    print(f"Attempt failed: {str(e)}")
-                
-                attempts += 1
-                time.sleep(0.5)
-            
-            print(f"No valid response from {port.device} after {max_attempts} attempts")
-            ser.close()
-            return False
-            
-        except Exception as e:
-            print(f"Error on port {port.device}: {str(e)}")
-            try:
-                ser.close()
-            except:
-                pass
-            return False
+    def on_device_changed(self, device, connected):
+        """Engine hook: a deck came or went, and a new one got button slots in every profile"""
+        if connected:
+            self.root.after(0, lambda: self.command_cards.set_slots(self.button_configs))
 
-    def check_arduino_data(self):
-        """Check for Arduino data with improved continuous communication"""
-        try:
-            if not self.arduino:
-                return False
+    def on_action_error(self, error):
+        self.root.after(0, lambda: messagebox.showerror("Hata", f"Komut yürütülürken hata oluştu: {error}"))
 
-            data_received = False
-            start_time = time.time()
-            timeout = 1.0  # 1 second timeout
-            
-            while self.arduino.in_waiting > 0 and (time.time() - start_time) < timeout:
-                data = self.arduino.readline().decode().strip()
-                if not data:
-                    continue
-                    
-                print(f"Raw data received: '{data}'")
-                data_received = True
-                
-                if data == "PONG":
-                    print("Received keepalive response")
-                elif data == "DECK":
-                    print("Received identification response")
-                elif data in self.command_vars:
-                    print(f"Valid button press received: {data}")
-                    self.root.after(0, lambda d=data: self.handle_command(d))
-                else:
-                    print(f"Unknown command received: {data}")
-            
-            return data_received
-                        
-        except Exception as e:
-            print(f"Arduino read error: {str(e)}")
-            self.arduino = None
-            self.update_status_indicator("disconnected")
-            return False
+    def button_message(self, config):
+        """Action string for a button's current type/subtype/entry values"""
+        if config['type'] == "yazı":
+            return text_action(config['entry'], config['subtype'] or "auto")
+        elif config['type'] == "hotkey":
+            return f"hotkey:{config['entry']}"
+        return config['subtype']
 
-    @throttle(seconds=0.1)
-    def execute_action(self, action):
-        """Throttled action execution"""
-        try:
-            action = action.strip()
-            if action.startswith("hotkey:"):
-                keys = action.replace("hotkey:", "").split("+")
-                keyboard.press_and_release("+".join(keys))
-            elif action.startswith("press:"):
-                key = action.replace("press:", "")
-                if key.startswith("f") and key[1:].isdigit():
-                    # Get the function key number
-                    f_num = int(key[1:])
-                    if 1 <= f_num <= 24:
-                        press_function_key(f_num)
-                    else:
-                        keyboard.press_and_release(key)
-                else:
-                    keyboard.press_and_release(key)
-            elif action.startswith("volume:"):
-                key = action.split(":")[1]
-                if key == "up":
-                    keyboard.press_and_release("volume up")
-                elif key == "down":
-                    keyboard.press_and_release("volume down")
-                elif key == "mute":
-                    keyboard.press_and_release("volume mute")
-            elif action.startswith("media:"):
-                action_type = action.split(":")[1]
-                if action_type == "play/pause":
-                    keyboard.press_and_release("play/pause media")
-                elif action_type == "next":
-                    keyboard.press_and_release("next track")
-                elif action_type == "previous":
-                    keyboard.press_and_release("previous track")
-                elif action_type == "stop":
-                    keyboard.press_and_release("stop media")
-            else:
-                keyboard.write(action)
-        except Exception as e:
-            print(f"Action execution error: {e}")
-            messagebox.showerror("Hata", f"Komut yürütülürken hata oluştu: {e}")
-
-    def handle_command(self, button):
-        """Handle button commands"""
-        if button in self.command_vars:
-            vars = self.command_vars[button]
-            command_type = vars['type'].get()
-            
-            if command_type == "yazı":
-                self.execute_action(vars['entry'].get())
-            elif command_type == "hotkey":
-                self.execute_action(f"hotkey:{vars['entry'].get()}")
-            else:
-                self.execute_action(vars['subtype'].get())
+    def sync_button(self, profile, button):
+        """Recompile one button after its configuration changed"""
+        config = self.profiles.profiles[profile][button]
+        config['message'] = self.button_message(config)
+        self.profiles.compile_button(profile, button)
 
     def get_button_color(self, button):
         """Get color for button"""
@@ -954,9 +4406,257 @@ class ModernStreamDeckApp:
             'G': "#e74c3c",
             'H': "#f39c12"
         }
-        return colors.get(button, "#3498db")
+        return colors.get(button.rpartition(":")[2], "#3498db")
+
+class ReplaySerial:
+    """Serial port stand-in for replay: read() hands out the journaled chunks as they are fed, writes are counted"""
+
+    in_waiting = 0
+
+    def __init__(self, port):
+        self.port = port
+        self.baudrate = None
+        self.chunks = queue.SimpleQueue()
+        self.fed = 0
+        self.reads = 0
+        self.written = 0
+
+    def feed(self, data):
+        self.fed += 1
+        self.chunks.put(data)
+
+    def read(self, size=1):
+        self.reads += 1
+        return self.chunks.get()
+
+    def wait_drained(self, timeout=5.0):
+        """Wait until the reader has parsed every chunk fed so far and is back in read()"""
+        deadline = time.perf_counter() + timeout
+        while self.reads <= self.fed and time.perf_counter() < deadline:
+            time.sleep(0.0005)
+
+    def write(self, data):
+        self.written += len(data)
+        return len(data)
+
+    def close(self):
+        self.chunks.put(b"")  # Wakes the reader, which then sees its connection closed
+
+class _JournalTimer:
+    __slots__ = ("func", "cancelled")
+
+    def __init__(self, func):
+        self.func = func
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+class JournalClock:
+    """Virtual time for a replay as fast as possible.
+
+    Calling it returns the journal time being replayed, in seconds. Timers
+    from schedule() fire, in deadline order, when advance() moves past their
+    deadline, so rate limits and gestures decide as they did live however
+    fast the records go by.
+    """
+
+    def __init__(self):
+        self.now = 0.0
+        self.lock = threading.Lock()
+        self.timers = []  # (deadline, sequence, timer) heap
+        self.sequence = 0
+
+    def __call__(self):
+        return self.now
+
+    def schedule(self, delay, func):
+        timer = _JournalTimer(func)
+        with self.lock:
+            self.sequence += 1
+            heapq.heappush(self.timers, (self.now + delay, self.sequence, timer))
+        return timer
+
+    def advance(self, to):
+        """Fire the timers due by `to`, each at its own deadline, then move to `to`"""
+        while True:
+            with self.lock:
+                if not self.timers or self.timers[0][0] > to:
+                    self.now = max(self.now, to)
+                    return
+                deadline, _, timer = heapq.heappop(self.timers)
+                self.now = max(self.now, deadline)
+            if not timer.cancelled:
+                timer.func()
+
+def replay_journal(paths, settings_file=None, speed=1.0):
+    """Feed journal files back through the real parsers, dispatch and actions, into the recording backend.
+
+    Each deck in the journal gets a DeckConnection over a ReplaySerial, so
+    its RX chunks are parsed and dispatched exactly as they were read, at the
+    recorded pace divided by `speed` (0: as fast as possible). Rate limits
+    and gesture timers run `speed` times faster too, so they decide as they
+    did live; as fast as possible they run on a JournalClock instead, and
+    each chunk is dispatched before the clock moves on to the next record.
+    Actions come from `settings_file`, or the built-in defaults without one.
+    Returns a summary and the recorded injection events.
+    """
+    events = use_recording_injection()
+    engine = DeckEngine(settings_file or SETTINGS_FILE, device_cache_file=None, comports=lambda: [],
+                        watch_interval=None)
+    if settings_file:
+        engine.load_settings()
+    engine.compile_actions()
+    if speed:
+        origin = time.monotonic()
+        scaled = lambda delay, func: RateLimiter.start_timer(delay / speed, func)
+        engine.rate_limiter.clock = lambda: origin + (time.monotonic() - origin) * speed
+        engine.rate_limiter.schedule = scaled
+        engine.gestures.schedule = scaled
+    else:
+        clock = JournalClock()
+        engine.rate_limiter.clock = clock
+        engine.rate_limiter.schedule = clock.schedule
+        engine.gestures.schedule = clock.schedule
+    serials, connections = {}, {}
+    summary = {"records": 0, "rx_bytes": 0, "tx_bytes": 0, "decks": 0}
+    started = time.perf_counter()
+    first = last = None
+    try:
+        for path in paths:
+            for stamp, kind, channel, data in read_journal(path):
+                if first is None:
+                    first = last = stamp
+                if stamp < last:
+                    first -= last - stamp  # Another run's clock: carry on from where the last one ended
+                last = stamp
+                if speed:
+                    sleep_until(started + (stamp - first) / 1e9 / speed)
+                else:
+                    clock.advance((stamp - first) / 1e9)
+                summary["records"] += 1
+                if kind == JOURNAL_OPEN and channel not in connections:
+                    details = json.loads(data)
+                    serials[channel] = ReplaySerial(details["port"])
+                    connections[channel] = engine.monitor.connect(serials[channel], details["port"], details["identity"],
+                                                                  details["device"], details["protocol"],
+                                                                  keepalive_interval=0)
+                    summary["decks"] += 1
+                elif kind == JOURNAL_RX and channel in serials:
+                    serials[channel].feed(data)
+                    if not speed:
+                        serials[channel].wait_drained()  # Dispatched at this record's time, not a later one's
+                    summary["rx_bytes"] += len(data)
+                elif kind == JOURNAL_TX:
+                    summary["tx_bytes"] += len(data)
+                elif kind == JOURNAL_CLOSE and channel in connections:
+                    serials.pop(channel).wait_drained()
+                    connections.pop(channel).close()
+        # Let the readers catch up, timed gestures fire and the executor drain
+        for ser in serials.values():
+            ser.wait_drained()
+        if speed:
+            time.sleep(max(DOUBLE_TAP_WINDOW, LONG_PRESS_TIME) / speed + 0.05)
+        else:
+            clock.advance(clock() + max(DOUBLE_TAP_WINDOW, LONG_PRESS_TIME) + 0.05)
+        while engine.executor.queue.qsize():
+            time.sleep(0.001)
+    finally:
+        engine.stop()
+        engine.executor.thread.join(5)
+    summary.update(recorded_seconds=(last - first) / 1e9 if first is not None else 0.0,
+                   replay_seconds=time.perf_counter() - started,
+                   events=sum(stats["events"] for stats in engine.monitor.device_stats.values()),
+                   actions=engine.executor.executed,
+                   injected=len(events),
+                   drops=engine.latency.snapshot()["drops"],
+                   latency=engine.latency.snapshot()["stages"])
+    return summary, events
+
+def run_daemon(settings_file=SETTINGS_FILE, profile_startup=False, control_address=None, journal_file=None):
+    """Headless front-end: the engine alone, without Tk, until SIGINT/SIGTERM"""
+    engine = DeckEngine(settings_file, journal_file=journal_file)
+    engine.load_settings()
+    startup.mark("settings")
+    engine.on_status = lambda status: log.info("Deck status", status=status)
+    engine.on_device = lambda device, connected: log.info("Deck " + ("connected" if connected else "gone"), device=device)
+    engine.start()
+    control = ControlServer(engine, control_address).start() if control_address is not None else None
+    startup.mark("started")
+    log.info("Daemon running", settings=settings_file, profile=engine.profiles.active, phases=startup.summary())
+    if profile_startup:
+        print(json.dumps(startup.report(), indent=4))
+        if control:
+            control.stop()
+        engine.stop()
+        return engine
+
+    stopped = threading.Event()
+    for name in ("SIGINT", "SIGTERM", "SIGBREAK"):
+        if hasattr(signal, name):
+            signal.signal(getattr(signal, name), lambda signum, frame: stopped.set())
+    try:
+        while not stopped.wait(0.5):  # A timed wait, so Ctrl+C is seen on Windows too
+            pass
+    finally:
+        log.info("Daemon stopping")
+        if control:
+            control.stop()
+        engine.stop()
+    return engine
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream Deck Kontrol Paneli")
+    parser.add_argument("--log-level", default="info", choices=["debug", "info", "warning", "error"])
+    parser.add_argument("--log-file", help="also append log records to this file")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="print the startup phase report once the window is ready, then exit")
+    parser.add_argument("--daemon", action="store_true", help="run headless, without the window")
+    parser.add_argument("--settings", default=SETTINGS_FILE, help="settings file to load")
+    parser.add_argument("--control", nargs="?", const="", metavar="ADDRESS",
+                        help="serve the local control socket (unix:/path or host:port; default a Unix socket "
+                             f"beside the settings file, or 127.0.0.1:{CONTROL_PORT} on Windows)")
+    parser.add_argument("--send", metavar="JSON", nargs="+",
+                        help="send requests to a running instance's control socket and print the replies")
+    parser.add_argument("--journal", metavar="FILE", help="record all deck traffic to this journal file")
+    parser.add_argument("--replay", metavar="FILE", nargs="+",
+                        help="replay journal files (oldest first) against a recording backend and print a summary")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed factor; 0 replays as fast as possible")
+    args = parser.parse_args()
+    startup.mark("imports")
+
+    log.set_level({"debug": DEBUG, "info": INFO, "warning": WARNING, "error": ERROR}[args.log_level])
+    if args.log_file:
+        log.add_file(args.log_file)
+
+    if args.send:
+        client = ControlClient(args.control or default_control_address(args.settings), control_token_file(args.settings))
+        for request in args.send:
+            print(json.dumps(client.send(json.loads(request)), ensure_ascii=False))
+        client.close()
+        return
+    if args.replay:
+        summary, events = replay_journal(args.replay, args.settings, args.speed)
+        print(json.dumps(summary, indent=4))
+        for event in events:
+            print(f"{event[0]:.6f}", *event[1:])
+        return
+    if args.daemon:
+        run_daemon(args.settings, args.profile_startup, args.control, args.journal)
+        return
 
-if __name__ == "__main__":
     root = tk.Tk()
-    app = ModernStreamDeckApp(root)
-    root.mainloop()
\ No newline at end of file
+    startup.mark("tk")
+    app = ModernStreamDeckApp(root, args.settings, args.journal)
+    control = ControlServer(app.engine, args.control).start() if args.control is not None else None
+    if args.profile_startup:
+        def report():
+            print(json.dumps(startup.report(), indent=4))
+            app.on_closing()
+        root.after_idle(lambda: root.after_idle(report))
+    root.mainloop()
+    if control:
+        control.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.dirname(os.path.abspath(__file__))]
+
+import streamdeck  # noqa: E402
+
+needs_pty = pytest.mark.skipif(not hasattr(os, "openpty"), reason="software decks need POSIX ptys")
+
+@pytest.fixture
+def recording():
+    """The recording injection backend for one test; returns its event list"""
+    saved = streamdeck.injector, streamdeck.clipboard
+    events = streamdeck.use_recording_injection()
+    yield events
+    streamdeck.injector, streamdeck.clipboard = saved
+
+@pytest.fixture
+def hotkey_settings(tmp_path):
+    """A settings file mapping every button to ctrl+<letter>"""
+    path = str(tmp_path / "settings.json")
+    streamdeck.write_json_atomic(path, {"profiles": {streamdeck.DEFAULT_PROFILE: {"buttons": {
+        button: {"command_type": "hotkey", "command_text": f"ctrl+{button.lower()}",
+                 "message": f"hotkey:ctrl+{button.lower()}"} for button in streamdeck.BUTTONS}}}})
+    return path
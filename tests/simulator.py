@@ -0,0 +1,297 @@
+"""Software stand-ins for the hardware, shared by the tests and bench/bench.py."""
+import os
+import queue
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+from streamdeck import (BUTTONS, CAP_RELEASE, FRAME_DECK, FRAME_PING, FRAME_PONG, FRAME_PRESS, FRAME_RELEASE,
+                        FRAME_START, FRAME_TEST, HOST_TIMEOUT, KEEPALIVE_INTERVAL, BinaryFrameParser, FrameParser,
+                        encode_frame)
+
+class SoftwareDeck:
+    """A scriptable software stand-in for streamdeck.ino on the master side of a pty (POSIX only).
+
+    Speaks the text protocol (DECK/TEST/PING/PONG and button letters) and,
+    unless `binary` is False to play old firmware, the BIN negotiation and
+    binary frames. Open `device` with pyserial as if it were the board, or
+    hand `comports` to DeckMonitor. Besides single presses it can produce
+    releases, holds and taps, paced bursts, bounce and line noise, dropouts
+    (the board stops talking) and unplug/replug cycles, either directly or
+    through play(script). `releases` False plays firmware that reports presses only.
+    Like the firmware it drops back to text after `host_timeout` without a
+    binary frame from the host.
+    """
+
+    def __init__(self, binary=True, keepalive_interval=KEEPALIVE_INTERVAL, serial_number="SIM0001", releases=True,
+                 host_timeout=HOST_TIMEOUT):
+        self.binary = binary
+        self.releases = releases
+        self.host_timeout = host_timeout
+        self.fallbacks = 0
+        self.keepalive_interval = keepalive_interval
+        self.serial_number = serial_number
+        self.write_lock = threading.Lock()
+        self.muted_until = 0.0
+        self.plugged = False
+        self.plug()
+
+    def plug(self):
+        """Create a fresh pty, as if the board had just been connected and reset"""
+        self.master, self.slave = os.openpty()
+        self.device = os.ttyname(self.slave)
+        self.port_info = SimpleNamespace(device=self.device, vid=0x2341, pid=0x0043,
+                                         serial_number=self.serial_number, description="Software deck")
+        self.binary_mode = False
+        self.last_host_frame = 0.0
+        self.text_releases = False
+        self.tx_sequence = 0
+        self.closed = threading.Event()
+        self.text_parser = FrameParser(lambda button: None, self.handle_line, buttons=())
+        self.binary_parser = BinaryFrameParser(lambda button: None, self.handle_frame)
+        self.plugged = True
+        threading.Thread(target=self.read_loop, args=(self.master, self.closed), daemon=True).start()
+        threading.Thread(target=self.keepalive_loop, args=(self.closed,), daemon=True).start()
+
+    def comports(self):
+        """list_ports.comports() replacement that only lists this deck while it is plugged in"""
+        return [self.port_info] if self.plugged else []
+
+    def send(self, data):
+        if time.monotonic() < self.muted_until:
+            return
+        with self.write_lock:
+            os.write(self.master, data)
+
+    def send_frame(self, frame_type, argument=0):
+        if time.monotonic() < self.muted_until:
+            return
+        with self.write_lock:
+            os.write(self.master, encode_frame(frame_type, argument, self.tx_sequence))
+            self.tx_sequence = (self.tx_sequence + 1) & 0xFF
+
+    def press(self, button):
+        if self.binary_mode:
+            self.send_frame(FRAME_PRESS, BUTTONS.index(button))
+        else:
+            self.send(button.encode() + b"\r\n")
+
+    def release(self, button):
+        if not self.releases:
+            return
+        if self.binary_mode:
+            self.send_frame(FRAME_RELEASE, BUTTONS.index(button))
+        elif self.text_releases:
+            self.send(button.lower().encode() + b"\r\n")
+
+    def hold(self, button, seconds):
+        """Press, keep the button down for `seconds`, release"""
+        self.press(button)
+        time.sleep(seconds)
+        self.release(button)
+
+    def tap(self, button, seconds=0.05):
+        self.hold(button, seconds)
+
+    def double_tap(self, button, gap=0.1, seconds=0.05):
+        """Two taps with `gap` seconds between the first release and the second press"""
+        self.hold(button, seconds)
+        time.sleep(gap)
+        self.hold(button, seconds)
+
+    def burst(self, buttons, count, rate):
+        """Press `count` times cycling through `buttons`, paced at `rate` presses per second"""
+        interval = 1.0 / rate
+        deadline = time.perf_counter()
+        for i in range(count):
+            while time.perf_counter() < deadline:
+                pass
+            self.press(buttons[i % len(buttons)])
+            deadline += interval
+        return count
+
+    def bounce(self, button, count=5, spacing=0.001):
+        """Repeated presses of one button `spacing` seconds apart, like a contact that bounces"""
+        for _ in range(count):
+            self.press(button)
+            time.sleep(spacing)
+
+    def noise(self, length=16, seed=None):
+        """Random line noise, never containing a newline or frame start byte"""
+        rng = random.Random(seed)
+        self.send(bytes(rng.choice([b for b in range(256) if b not in (10, FRAME_START)]) for _ in range(length)))
+
+    def dropout(self, seconds):
+        """Stop sending anything, replies and keepalives included, for `seconds`"""
+        self.muted_until = time.monotonic() + seconds
+
+    def unplug(self):
+        self.plugged = False
+        self.closed.set()
+        for fd in (self.master, self.slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def replug(self):
+        if self.plugged:
+            self.unplug()
+        self.plug()
+
+    def play(self, script):
+        """Run steps such as ("press", "A"), ("release", "A"), ("hold", "B", 0.6), ("tap", "C"),
+        ("double_tap", "D"), ("wait", 0.1), ("burst", "AB", 100, 500), ("bounce", "C", 8),
+        ("noise", 32), ("dropout", 3), ("unplug",), ("replug",)"""
+        for step in script:
+            name, args = step[0], step[1:]
+            if name == "wait":
+                time.sleep(*args)
+            else:
+                getattr(self, name)(*args)
+
+    def handle_line(self, line):
+        if time.monotonic() < self.muted_until:
+            return
+        if line == "TEST":
+            self.text_releases = False
+            self.send(b"DECK\r\n")
+        elif line == "REL" and self.releases:
+            self.text_releases = True
+            self.send(b"OK REL\r\n")
+        elif line == "PING":
+            self.send(b"PONG\r\n")
+        elif line.startswith("BIN ") and self.binary:
+            self.send(f"OK {line[4:]}\r\n".encode())
+            self.last_host_frame = time.monotonic()
+            self.binary_mode = True
+
+    def handle_frame(self, frame_type, argument):
+        self.last_host_frame = time.monotonic()
+        if frame_type == FRAME_TEST:
+            self.send_frame(FRAME_DECK, self.capabilities())
+        elif frame_type == FRAME_PING:
+            self.send_frame(FRAME_PONG)
+
+    def capabilities(self):
+        return CAP_RELEASE if self.releases else 0
+
+    def read_loop(self, master, closed):
+        while not closed.is_set():
+            try:
+                data = os.read(master, 4096)
+                if self.binary_mode:
+                    self.binary_parser.feed(data)
+                else:
+                    self.text_parser.feed(data)
+            except OSError:
+                break  # Unplugged
+
+    def keepalive_loop(self, closed):
+        while not closed.wait(self.keepalive_interval):
+            if self.binary_mode and time.monotonic() - self.last_host_frame > self.host_timeout:
+                self.binary_mode = False  # The host went quiet: back to text, as streamdeck.ino does
+                self.fallbacks += 1
+            try:
+                if self.binary_mode:
+                    self.send_frame(FRAME_DECK, self.capabilities())
+                else:
+                    self.send(b"DECK\r\n")
+            except OSError:
+                break
+
+    def close(self):
+        self.unplug()
+
+class OtherSerialDevice:
+    """A pty playing some other serial device (a GPS, a modem) next to the decks.
+
+    Prints `line` every `interval` seconds and ignores what it is sent;
+    with `line` None it stays silent, like a port that opens but never talks.
+    """
+
+    def __init__(self, line=b"$GPGGA,123519,4807.038,N,01131.000,E,1,08,0.9,545.4,M,46.9,M,,*47",
+                 interval=0.2, serial_number="OTHER01"):
+        self.line = line
+        self.interval = interval
+        self.serial_number = serial_number
+        self.plugged = False
+        self.plug()
+
+    def plug(self):
+        self.master, self.slave = os.openpty()
+        self.device = os.ttyname(self.slave)
+        self.port_info = SimpleNamespace(device=self.device, vid=0x1546, pid=0x01A7,
+                                         serial_number=self.serial_number, description="Other serial device")
+        self.closed = threading.Event()
+        self.plugged = True
+        threading.Thread(target=self.talk_loop, args=(self.closed,), daemon=True).start()
+        threading.Thread(target=self.drain_loop, args=(self.master, self.closed), daemon=True).start()
+
+    def comports(self):
+        return [self.port_info] if self.plugged else []
+
+    def talk_loop(self, closed):
+        while not closed.wait(self.interval):
+            if self.line is not None:
+                try:
+                    os.write(self.master, self.line + b"\r\n")
+                except OSError:
+                    return
+
+    def drain_loop(self, master, closed):
+        while not closed.is_set():
+            try:
+                if not os.read(master, 1024):
+                    return
+            except OSError:
+                return
+
+    def unplug(self):
+        self.plugged = False
+        self.closed.set()
+        for fd in (self.master, self.slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def replug(self):
+        if self.plugged:
+            self.unplug()
+        self.plug()
+
+    def close(self):
+        self.unplug()
+
+class FakeWindowSource:
+    """Scriptable stand-in for WindowsForegroundSource"""
+
+    def __init__(self, app=None):
+        self.app = app
+        self.on_change = None
+
+    def start(self, on_change):
+        self.on_change = on_change
+        on_change(self.app)
+        return self
+
+    def activate(self, app):
+        self.app = app
+        if self.on_change:
+            self.on_change(app)
+
+    def stop(self):
+        self.on_change = None
+
+def wait_for_status(statuses, wanted, timeout):
+    """Read DeckMonitor statuses from a queue until `wanted` shows up; False on timeout"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if statuses.get(timeout=deadline - time.monotonic()) == wanted:
+                return True
+        except queue.Empty:
+            break
+    return False
@@ -0,0 +1,128 @@
+import os
+import socket
+import time
+
+import pytest
+
+import streamdeck as sd
+
+ADDRESSES = ["127.0.0.1:0"] + (["unix"] if hasattr(socket, "AF_UNIX") else [])
+
+@pytest.fixture(params=ADDRESSES)
+def server(request, tmp_path, recording, hotkey_settings):
+    engine = sd.DeckEngine(hotkey_settings, None, comports=lambda: [], watch_interval=None)
+    engine.load_settings()
+    engine.compile_actions()
+    address = f"unix:{tmp_path / 'control.sock'}" if request.param == "unix" else request.param
+    server = sd.ControlServer(engine, address).start()
+    yield server
+    server.stop()
+    engine.executor.stop()
+
+def wait_for_events(events, count):
+    deadline = time.monotonic() + 2
+    while len(events) < count and time.monotonic() < deadline:
+        time.sleep(0.001)
+
+def test_trigger_batch_and_subscribe(server, recording):
+    client = sd.ControlClient(server.local_address(), server.token_file)
+    subscriber = sd.ControlClient(server.local_address(), server.token_file)
+    try:
+        assert subscriber.request("subscribe")["ok"]
+        assert client.request("ping", id=7) == {"ok": True, "id": 7}
+        assert client.request("trigger", button="A")["ok"]
+        assert subscriber.read()["button"] == "A"
+        wait_for_events(recording, 1)
+        assert recording[0][1:] == ("chord", ("ctrl", "a"))
+
+        reply = client.request("batch", triggers=[{"button": "B"}, {"button": "C", "gesture": "tap"}])
+        assert reply["count"] == 2
+        assert [subscriber.read()["button"] for _ in range(2)] == ["B", "C"]
+
+        status = client.request("status")
+        assert status["status"] == "waiting" and status["profile"] == sd.DEFAULT_PROFILE
+        assert client.request("stats")["stats"]["control"]["requests"] >= 5
+        assert client.request("reload")["changed"] == 0
+    finally:
+        client.close()
+        subscriber.close()
+
+def test_bad_requests_get_errors(server):
+    client = sd.ControlClient(server.local_address(), server.token_file)
+    try:
+        assert client.request("trigger", button="nope") == {"ok": False, "error": "Unknown button: nope"}
+        assert not client.request("trigger", button="A", gesture="wiggle")["ok"]
+        assert not client.request("nonsense")["ok"]
+    finally:
+        client.close()
+
+def connect(server):
+    family, target = sd.control_family(server.local_address())
+    sock = socket.create_connection(target, timeout=2) if family == socket.AF_INET else socket.socket(family)
+    if family != socket.AF_INET:
+        sock.settimeout(2)
+        sock.connect(target)
+    return sock
+
+@pytest.mark.parametrize("line", [
+    b'{"op": "ping"}\n',
+    b'{"op": "ping", "token": "0000"}\n',
+    b"not json\n",
+    b"GET / HTTP/1.1\r\nHost: localhost\r\n\r\n",
+    b'POST /trigger HTTP/1.1\r\nContent-Type: text/plain\r\n\r\n{"op": "ping"}\n',
+])
+def test_unauthorized_lines_close_the_connection(server, recording, line):
+    sock = connect(server)
+    try:
+        sock.sendall(line)
+        assert sock.recv(1024) == b""
+    finally:
+        sock.close()
+    assert server.requests == 0 and not recording
+
+def test_token_file_is_private_and_removed_on_stop(tmp_path, recording, hotkey_settings):
+    engine = sd.DeckEngine(hotkey_settings, None, comports=lambda: [], watch_interval=None)
+    server = sd.ControlServer(engine, "127.0.0.1:0").start()
+    assert server.token_file == sd.control_token_file(hotkey_settings)
+    if os.name == "posix":
+        assert os.stat(server.token_file).st_mode & 0o777 == 0o600
+    with open(server.token_file) as f:
+        assert f.read() == server.token
+    server.stop()
+    engine.executor.stop()
+    assert not os.path.exists(server.token_file)
+
+def test_stop_closes_every_client(server):
+    idle = sd.ControlClient(server.local_address(), server.token_file)
+    subscriber = sd.ControlClient(server.local_address(), server.token_file)
+    try:
+        assert idle.request("ping")["ok"] and subscriber.request("subscribe")["ok"]
+        server.stop()
+        for client in (idle, subscriber):
+            with pytest.raises(ConnectionError):
+                client.read()
+        deadline = time.monotonic() + 2
+        while server.clients and time.monotonic() < deadline:
+            time.sleep(0.001)
+        assert not server.clients
+    finally:
+        idle.close()
+        subscriber.close()
+
+def test_default_address_is_a_unix_socket_beside_the_settings(hotkey_settings):
+    if not hasattr(socket, "AF_UNIX"):
+        assert sd.default_control_address(hotkey_settings) == f"127.0.0.1:{sd.CONTROL_PORT}"
+    else:
+        assert sd.default_control_address(hotkey_settings) == "unix:" + os.path.join(
+            os.path.dirname(hotkey_settings), "StreamDeckControl.sock")
+
+def test_unix_socket_file_is_removed_on_stop(tmp_path, recording, hotkey_settings):
+    if not hasattr(socket, "AF_UNIX"):
+        pytest.skip("no Unix sockets")
+    engine = sd.DeckEngine(hotkey_settings, None, comports=lambda: [], watch_interval=None)
+    path = tmp_path / "control.sock"
+    server = sd.ControlServer(engine, f"unix:{path}").start()
+    assert os.path.exists(path) and os.stat(path).st_mode & 0o777 == 0o600
+    server.stop()
+    engine.executor.stop()
+    assert not os.path.exists(path)
@@ -0,0 +1,138 @@
+import queue
+import threading
+import time
+
+import pytest
+
+import streamdeck as sd
+from conftest import needs_pty
+from simulator import OtherSerialDevice, SoftwareDeck, wait_for_status
+
+pytestmark = needs_pty
+
+def wait_for(condition, timeout):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+@pytest.mark.parametrize("binary", [True, False], ids=["new firmware", "old firmware"])
+def test_negotiated_protocol_delivers_presses(binary):
+    deck = SoftwareDeck(binary=binary)
+    ser = sd.probe_port(deck.port_info)
+    assert ser is not None
+    protocol = sd.negotiate_protocol(ser)
+    assert protocol == ("binary" if binary else "text")
+    dispatched = queue.Queue()
+    connection = sd.DeckConnection(ser, lambda button, received: dispatched.put(button), protocol=protocol).start()
+    try:
+        for i in range(50):
+            deck.press(sd.BUTTONS[i % len(sd.BUTTONS)])
+            assert dispatched.get(timeout=2) == sd.BUTTONS[i % len(sd.BUTTONS)]
+    finally:
+        connection.close()
+        deck.close()
+
+def test_unplug_and_replug_are_detected(tmp_path):
+    statuses = queue.Queue()
+    deck = SoftwareDeck()
+    monitor = sd.DeckMonitor(lambda button, received: None, statuses.put,
+                             cache_file=str(tmp_path / "device.json"), comports=deck.comports).start()
+    try:
+        assert wait_for_status(statuses, "connected", 30)
+        unplugged = time.monotonic()
+        deck.unplug()
+        assert wait_for_status(statuses, "disconnected", 10)
+        assert time.monotonic() - unplugged < 1.0
+        deck.replug()
+        assert wait_for_status(statuses, "connected", 30)
+    finally:
+        monitor.stop()
+        deck.close()
+
+def test_decks_keep_their_names_and_merge_in_order(tmp_path):
+    sims = [SoftwareDeck(serial_number=f"SIM{i + 1:04d}") for i in range(3)]
+    got = []
+    monitor = sd.DeckMonitor(lambda button, received: got.append((button, received)), None,
+                             cache_file=str(tmp_path / "device.json"),
+                             comports=lambda: [port for deck in sims for port in deck.comports()]).start()
+    try:
+        assert wait_for(lambda: len(monitor.connections) == len(sims), 30)
+        names = {deck.serial_number: monitor.connections[sd.port_identity(deck.port_info)].device for deck in sims}
+        assert sorted(names.values()) == ["deck1", "deck2", "deck3"]
+
+        burst = 500
+        threads = [threading.Thread(target=deck.burst, args=(sd.BUTTONS, burst, 2000)) for deck in sims]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert wait_for(lambda: len(got) >= len(sims) * burst, 5)
+        assert all(b[1] >= a[1] for a, b in zip(got, got[1:]))
+        for deck in sims:
+            name = names[deck.serial_number]
+            mine = [button for button, _ in got if sd.button_device(button) == name]
+            assert mine == [sd.device_button(name, sd.BUTTONS[i % len(sd.BUTTONS)]) for i in range(burst)]
+
+        for deck in sims:
+            deck.unplug()
+        assert wait_for(lambda: not monitor.connections, 10)
+        for deck in reversed(sims):
+            deck.replug()
+            time.sleep(0.3)
+        assert wait_for(lambda: len(monitor.connections) == len(sims), 30)
+        for deck in sims:
+            assert monitor.connections[sd.port_identity(deck.port_info)].device == names[deck.serial_number]
+    finally:
+        monitor.stop()
+        for deck in sims:
+            deck.close()
+
+@pytest.fixture
+def counted_probes(monkeypatch):
+    """Short probes, and how often each port was probed"""
+    probes = {}
+    probe_port = sd.probe_port
+    def short_probe(port, cancelled=None):
+        probes[port.device] = probes.get(port.device, 0) + 1
+        return probe_port(port, cancelled, timeout=1.0)
+    monkeypatch.setattr(sd, "probe_port", short_probe)
+    monkeypatch.setattr(sd, "FULL_SCAN_INTERVAL", 0.5)
+    return probes
+
+def test_other_device_is_probed_once_until_unplugged(tmp_path, counted_probes):
+    other = OtherSerialDevice()
+    monitor = sd.DeckMonitor(lambda button, received: None, cache_file=str(tmp_path / "device.json"),
+                             comports=other.comports).start()
+    try:
+        identity = sd.port_identity(other.port_info)
+        assert wait_for(lambda: identity in monitor.not_decks, 5)
+        time.sleep(2.5)  # Several full scans and hotplug retries
+        assert counted_probes == {other.device: 1}
+        assert monitor.status == "waiting"
+
+        other.unplug()
+        assert wait_for(lambda: identity not in monitor.not_decks, 2)
+        other.plug()
+        assert wait_for(lambda: sum(counted_probes.values()) == 2 and identity in monitor.not_decks, 5)
+    finally:
+        monitor.stop()
+        other.close()
+
+def test_slow_port_does_not_hold_up_a_new_deck(tmp_path, monkeypatch):
+    silent = OtherSerialDevice(line=None)
+    deck = SoftwareDeck()
+    plugged = []
+    statuses = queue.Queue()
+    monitor = sd.DeckMonitor(lambda button, received: None, statuses.put, cache_file=str(tmp_path / "device.json"),
+                             comports=lambda: silent.comports() + (deck.comports() if plugged else [])).start()
+    try:
+        time.sleep(0.5)  # The silent port's probe is now waiting out PROBE_TIMEOUT
+        plugged.append(time.monotonic())
+        assert wait_for_status(statuses, "connected", 3)
+        assert time.monotonic() - plugged[0] < sd.PROBE_TIMEOUT - 1
+        assert sd.port_identity(silent.port_info) in monitor.probes
+    finally:
+        monitor.stop()
+        deck.close()
+        silent.close()
@@ -0,0 +1,198 @@
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+import pytest
+
+import streamdeck as sd
+from conftest import needs_pty
+from simulator import SoftwareDeck, wait_for_status
+
+@needs_pty
+def test_headless_engine_turns_presses_into_keystrokes(tmp_path, recording, hotkey_settings):
+    deck = SoftwareDeck()
+    statuses = queue.Queue()
+    engine = sd.DeckEngine(hotkey_settings, str(tmp_path / "device.json"), comports=deck.comports,
+                           watch_interval=None)
+    engine.load_settings()
+    engine.on_status = statuses.put
+    engine.start()
+    try:
+        assert wait_for_status(statuses, "connected", 30)
+        for button in sd.BUTTONS:
+            deck.press(button)
+            time.sleep(sd.DEFAULT_RATE_INTERVAL / 4)
+        deadline = time.monotonic() + 2
+        while len(recording) < len(sd.BUTTONS) and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        engine.stop()
+        deck.close()
+    assert [event[1:] for event in recording] == [("chord", ("ctrl", button.lower())) for button in sd.BUTTONS]
+    assert "tkinter" not in sys.modules
+
+def edit(path, change):
+    with open(path, encoding="utf-8") as f:
+        settings = json.load(f)
+    change(settings)
+    sd.write_json_atomic(path, json.dumps(settings, ensure_ascii=False, indent=4))
+
+def test_reload_applies_only_changed_slots(recording, hotkey_settings):
+    engine = sd.DeckEngine(hotkey_settings, None, comports=lambda: [], watch_interval=None)
+    engine.load_settings()
+    engine.compile_actions()
+    table = engine.profiles.tables[sd.DEFAULT_PROFILE]
+    before = dict(table)
+
+    assert engine.reload_settings() == []
+
+    def change(settings):
+        settings["profiles"][sd.DEFAULT_PROFILE]["buttons"]["A"]["message"] = "hotkey:alt+1"
+        settings["profiles"]["Oyun"] = {"apps": ["game.exe"], "buttons": {}}
+    edit(hotkey_settings, change)
+    changed = engine.reload_settings()
+    assert sorted(changed, key=str) == sorted([(sd.DEFAULT_PROFILE, "A"), ("Oyun", None)], key=str)
+    assert table['A'].source == "hotkey:alt+1"
+    assert all(table[button] is before[button] for button in sd.BUTTONS if button != 'A')
+
+    edit(hotkey_settings, lambda settings: settings["profiles"].pop("Oyun"))
+    assert engine.reload_settings() == [("Oyun", None)]
+    assert "Oyun" not in engine.profiles.profiles
+
+def test_watcher_ignores_our_own_writes(recording, hotkey_settings):
+    engine = sd.DeckEngine(hotkey_settings, None, comports=lambda: [], watch_interval=None)
+    engine.load_settings()
+    engine.save_settings()
+    engine.settings_store.flush()
+    assert engine.settings_store.changes() is None
+    edit(hotkey_settings, lambda settings: settings["profiles"][sd.DEFAULT_PROFILE]["buttons"]["B"]
+         .update(message="hotkey:alt+2"))
+    assert engine.settings_store.changes() is not None
+
+def test_outside_edit_drops_the_pending_save(recording, hotkey_settings):
+    engine = sd.DeckEngine(hotkey_settings, None, comports=lambda: [], watch_interval=None)
+    engine.load_settings()
+    engine.profiles.profiles[sd.DEFAULT_PROFILE]['C']['message'] = "hotkey:alt+3"
+    engine.save_settings()  # Still waiting for the debounce when the file changes
+    edit(hotkey_settings, lambda settings: settings["profiles"][sd.DEFAULT_PROFILE]["buttons"]["B"]
+         .update(message="hotkey:alt+2"))
+    engine.reload_settings(engine.settings_store.changes())
+    engine.settings_store.flush()
+
+    with open(hotkey_settings, encoding='utf-8') as f:
+        buttons = json.load(f)["profiles"][sd.DEFAULT_PROFILE]["buttons"]
+    assert buttons["B"]["message"] == "hotkey:alt+2"
+    assert buttons["C"]["message"] == "hotkey:ctrl+c"
+    assert engine.settings_store.writes == 0
+    assert engine.profiles.profiles[sd.DEFAULT_PROFILE]['C']['message'] == "hotkey:ctrl+c"
+
+def test_save_does_not_wait_for_a_slow_write(tmp_path, monkeypatch):
+    store = sd.SettingsStore(str(tmp_path / "settings.json"), debounce=60)
+    writing, release = threading.Event(), threading.Event()
+    write = sd.write_json_atomic
+
+    def slow_write(*args, **kwargs):
+        writing.set()
+        release.wait(5)
+        write(*args, **kwargs)
+    monkeypatch.setattr(sd, "write_json_atomic", slow_write)
+    store.save({"n": 1})
+    flusher = threading.Thread(target=store.flush)
+    flusher.start()
+    assert writing.wait(5)
+
+    started = time.perf_counter()
+    store.save({"n": 2})  # What the Tk thread does on every edit
+    assert time.perf_counter() - started < 0.1
+    release.set()
+    flusher.join(5)
+    store.flush()
+    assert store.load() == {"n": 2} and store.writes == 2
+
+def test_crash_while_replacing_leaves_the_settings_file(tmp_path, monkeypatch):
+    path = str(tmp_path / "settings.json")
+    sd.write_json_atomic(path, {"n": 1})
+    replace = os.replace
+
+    def crash(src, dst):
+        if dst == path:
+            raise OSError("power cut")
+        replace(src, dst)
+    monkeypatch.setattr(os, "replace", crash)
+    with pytest.raises(OSError):
+        sd.write_json_atomic(path, {"n": 2}, backup=True)
+    for name in (path, path + ".bak"):
+        with open(name, encoding='utf-8') as f:
+            assert json.load(f) == {"n": 1}
+
+def test_reload_drops_card_edits_of_the_slots_it_changed(recording, hotkey_settings):
+    edit(hotkey_settings, lambda settings: settings["profiles"].update(Oyun={"apps": [], "buttons": {}}))
+    engine = sd.DeckEngine(hotkey_settings, None, comports=lambda: [], watch_interval=None)
+    engine.load_settings()
+    card = {'type': "hotkey", 'subtype': "", 'entry': "alt+9", 'gestures': {}, 'repeat': False}
+    pending = {(sd.DEFAULT_PROFILE, 'B'): card, (sd.DEFAULT_PROFILE, 'C'): card, ("Oyun", 'A'): card}
+
+    def change(settings):
+        settings["profiles"][sd.DEFAULT_PROFILE]["buttons"]["B"]["message"] = "hotkey:alt+2"
+        settings["profiles"].pop("Oyun")
+    edit(hotkey_settings, change)
+    changed = engine.reload_settings(engine.settings_store.changes())
+
+    assert sd.surviving_edits(pending, changed) == {(sd.DEFAULT_PROFILE, 'C'): card}
+    assert sd.surviving_edits(pending, []) == pending
+
+def test_new_deck_slots_wait_for_the_dispatch_lock(recording, hotkey_settings):
+    engine = sd.DeckEngine(hotkey_settings, None, comports=lambda: [], watch_interval=None)
+    engine.load_settings()
+    with engine.monitor.dispatch_lock:  # As save_settings and apply_settings hold it
+        thread = threading.Thread(target=engine.on_monitor_device, args=("deck2", True))
+        thread.start()
+        thread.join(0.2)
+        assert thread.is_alive()
+        assert "deck2:A" not in engine.profiles.profiles[sd.DEFAULT_PROFILE]
+    thread.join(5)
+    assert "deck2:A" in engine.profiles.profiles[sd.DEFAULT_PROFILE]
+
+@needs_pty
+@pytest.mark.parametrize("releases", [True, False], ids=["releases", "presses only"])
+def test_layer_is_momentary_only_where_releases_are_reported(tmp_path, recording, hotkey_settings, releases):
+    edit(hotkey_settings, lambda settings: settings["profiles"].update({
+        "Katman": {"buttons": {'B': {"command_type": "hotkey", "command_text": "ctrl+x", "message": "hotkey:ctrl+x"}}},
+    }))
+    edit(hotkey_settings, lambda settings: settings["profiles"][sd.DEFAULT_PROFILE]["buttons"].update({
+        'A': {"command_type": "layer", "command_subtype": "layer:Katman", "message": "layer:Katman"},
+    }))
+    deck = SoftwareDeck(releases=releases)
+    statuses = queue.Queue()
+    engine = sd.DeckEngine(hotkey_settings, str(tmp_path / "device.json"), comports=deck.comports,
+                           watch_interval=None)
+    engine.load_settings()
+    engine.on_status = statuses.put
+    engine.start()
+
+    def tap(button):
+        deck.tap(button, 0.02)
+        time.sleep(sd.DEFAULT_RATE_INTERVAL * 1.5)
+
+    try:
+        assert wait_for_status(statuses, "connected", 30)
+        deadline = time.monotonic() + 3
+        while releases and not engine.monitor.releases() and time.monotonic() < deadline:
+            time.sleep(0.01)  # The capability arrives with the deck's first keepalive
+        deck.press('A')
+        time.sleep(0.05)
+        tap('B')
+        tap('B')
+        deck.release('A')
+        time.sleep(0.05)
+        tap('B')
+        time.sleep(0.2)
+    finally:
+        engine.stop()
+        deck.close()
+    keys = [event[2][1] for event in recording]
+    assert keys == (["x", "x", "b"] if releases else ["x", "b", "b"])
+    assert not engine.profiles.held_layers
@@ -0,0 +1,80 @@
+import threading
+import time
+
+import pytest
+
+import streamdeck as sd
+
+def test_rate_limiter_lets_a_fast_chord_through():
+    now = [0.0]
+    limiter = sd.RateLimiter(clock=lambda: now[0], schedule=lambda delay, func: None)
+    ran = []
+    for i in range(6):
+        now[0] += 0.005
+        limiter.submit("AB"[i % 2], lambda i=i: ran.append(i))
+    assert ran == list(range(6))
+
+@pytest.mark.parametrize("policy", ["token_bucket", "drop"])
+def test_bounce_storm_runs_once(policy):
+    now = [0.0]
+    limiter = sd.RateLimiter(policy, clock=lambda: now[0], schedule=lambda delay, func: None)
+    ran = []
+    for _ in range(200):  # 200 bounces within 100 ms
+        now[0] += 0.0005
+        limiter.submit("C", lambda: ran.append("bounce"))
+    assert ran == ["bounce"]
+    assert limiter.stats()["dropped"]["C"] == 199
+    now[0] += 1.0
+    assert limiter.submit("C", lambda: ran.append("press"))
+    assert ran == ["bounce", "press"]
+
+def test_bucket_still_allows_deliberate_bursts():
+    now = [0.0]
+    limiter = sd.RateLimiter(clock=lambda: now[0], schedule=lambda delay, func: None)
+    ran = []
+    for _ in range(sd.DEFAULT_RATE_BURST + 2):  # Presses a bit slower than the bounce window
+        now[0] += sd.DEFAULT_BOUNCE_WINDOW * 1.5
+        limiter.submit("A", lambda: ran.append(now[0]))
+    assert len(ran) == sd.DEFAULT_RATE_BURST
+
+def test_executor_runs_in_submission_order():
+    order = []
+    executor = sd.ActionExecutor(lambda button, action: (time.sleep(0.001), order.append(button)))
+    presses = [sd.BUTTONS[i % len(sd.BUTTONS)] for i in range(40)]
+    for button in presses:
+        executor.submit(button, None)
+    deadline = time.monotonic() + 5
+    while executor.executed < len(presses) and time.monotonic() < deadline:
+        time.sleep(0.001)
+    executor.stop()
+    assert order == presses
+
+def test_cancelled_macro_releases_held_keys(recording):
+    engine = sd.MacroEngine()
+    engine.define("hold", ["repeat:20", "press:f13", "wait:20", "end"])
+    run = engine.play("hold")
+    time.sleep(sd.KEY_HOLD / 2)
+    run.cancel()
+    run.wait(5)
+    downs = sum(1 for event in recording if event[1] == "down")
+    ups = sum(1 for event in recording if event[1] == "up")
+    assert downs >= 1 and downs == ups
+
+def test_macro_steps_do_not_interleave_with_a_running_action(recording):
+    injector = sd.get_injector()
+    started = threading.Event()
+
+    def two_chords():
+        injector.send_chord(("a",))
+        started.set()
+        time.sleep(0.05)
+        injector.send_chord(("b",))
+    executor = sd.ActionExecutor(lambda button, action: action())
+    engine = sd.MacroEngine()
+    engine.define("m", ["text:x", "hotkey:ctrl+m"])
+    executor.submit('A', two_chords)
+    assert started.wait(5)
+    engine.play("m").wait(5)
+    executor.stop()
+    executor.thread.join(5)
+    assert [event[2] for event in recording] == [("a",), ("b",), "x", ("ctrl", "m")]
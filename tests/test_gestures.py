@@ -0,0 +1,70 @@
+from types import SimpleNamespace
+
+import pytest
+
+import streamdeck as sd
+
+class VirtualTimers:
+    """schedule() for GestureRecognizer on a virtual clock that advance() moves forward"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.timers = []
+
+    def schedule(self, delay, func):
+        timer = SimpleNamespace(at=self.now + delay, func=func, cancelled=False)
+        timer.cancel = lambda: setattr(timer, "cancelled", True)
+        self.timers.append(timer)
+        return timer
+
+    def advance(self, seconds):
+        end = self.now + seconds
+        while True:
+            self.timers = [timer for timer in self.timers if not timer.cancelled]
+            due = [timer for timer in self.timers if timer.at <= end]
+            if not due:
+                break
+            timer = min(due, key=lambda timer: timer.at)
+            self.timers.remove(timer)
+            self.now = timer.at
+            timer.func()
+        self.now = end
+
+GESTURES = {'A': (), 'B': {"long"}, 'C': {"double"}, 'D': {"repeat"}}
+HELD = 1.0
+REPEATS = int((HELD - sd.REPEAT_DELAY) / sd.REPEAT_INTERVAL + 1e-9) + 1
+
+CASES = {
+    "tap-only button fires on the press edge":
+        (True, [("press", 'A'), 0.1, ("release", 'A')], [('A', "tap", 0.0)]),
+    "long press":
+        (True, [("press", 'B'), 0.6, ("release", 'B')], [('B', "long", sd.LONG_PRESS_TIME)]),
+    "short press on a long-press button":
+        (True, [("press", 'B'), 0.1, ("release", 'B')], [('B', "tap", 0.1)]),
+    "double tap":
+        (True, [("press", 'C'), 0.05, ("release", 'C'), 0.1, ("press", 'C'), 0.05, ("release", 'C')],
+         [('C', "double", 0.15)]),
+    "single tap on a double-tap button":
+        (True, [("press", 'C'), 0.05, ("release", 'C')], [('C', "tap", round(0.05 + sd.DOUBLE_TAP_WINDOW, 3))]),
+    "hold to repeat":
+        (True, [("press", 'D'), HELD, ("release", 'D')],
+         [('D', "tap", 0.0)] + [('D', "repeat", round(sd.REPEAT_DELAY + i * sd.REPEAT_INTERVAL, 3))
+                                for i in range(REPEATS)]),
+    "deck without releases: tap on press":
+        (False, [("press", 'B'), 0.6, ("release", 'B')], [('B', "tap", 0.0)]),
+}
+
+@pytest.mark.parametrize("name", CASES)
+def test_gesture(name):
+    releases, script, expected = CASES[name]
+    clock = VirtualTimers()
+    got = []
+    recognizer = sd.GestureRecognizer(lambda button, gesture, received: got.append((button, gesture, round(clock.now, 3))),
+                                      GESTURES.get, lambda button: releases, clock.schedule)
+    for step in script:
+        if isinstance(step, float):
+            clock.advance(step)
+        else:
+            getattr(recognizer, step[0])(step[1])
+    clock.advance(1.0)
+    assert got == expected
@@ -0,0 +1,120 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import streamdeck as sd
+
+# What keyboard.read_event reports on Windows for every key the library knows (its
+# official_virtual_keys, normalized), after record_hotkey's right-hand mapping
+RECORDER_NAMES = [
+    "control-break processing", "backspace", "tab", "clear", "enter", "shift", "ctrl", "alt", "pause",
+    "caps lock", "ime kana mode", "ime hanguel mode", "ime hangul mode", "ime junja mode", "ime final mode",
+    "ime hanja mode", "ime kanji mode", "esc", "ime convert", "ime nonconvert", "ime accept",
+    "ime mode change request", "space", "page up", "page down", "end", "home", "left", "up", "right", "down",
+    "select", "print", "execute", "print screen", "insert", "delete", "help", "left windows", "right windows",
+    "menu", "sleep", "*", "+", "separator", "-", "decimal", "/", "num lock", "scroll lock", "left shift",
+    "left ctrl", "left alt", "right menu", "browser back", "browser forward", "browser refresh", "browser stop",
+    "browser search key", "browser favorites", "browser start and home", "volume mute", "volume down",
+    "volume up", "next track", "previous track", "stop media", "play/pause media", "start mail", "select media",
+    "start application 1", "start application 2", ",", ".", "ime process", "attn", "crsel", "exsel",
+    "erase eof", "play", "zoom", "pa1", "windows",
+] + [chr(c) for c in range(ord("a"), ord("z") + 1)] + [str(d) for d in range(10)] + [f"f{n}" for n in range(1, 25)]
+
+# VkKeyScanW on a US layout: shift state in the high byte
+US_LAYOUT = {"*": 0x138, "+": 0x1BB, "-": 0xBD, "/": 0xBF, "?": 0x1BF, ",": 0xBC, ".": 0xBE, "@": 0x132}
+
+class FakeUser32:
+    def VkKeyScanW(self, character):
+        return US_LAYOUT.get(character, -1)
+
+    def MapVirtualKeyW(self, code, map_type):
+        return {0x52: 0x60}.get(code, 0)  # Scan code 0x52 is keypad 0
+
+@pytest.fixture
+def backend(monkeypatch):
+    monkeypatch.setattr(sd, "get_user32", FakeUser32)
+    return sd.SendInputBackend(send_input=lambda count, inputs, size: count)
+
+@pytest.mark.parametrize("name", RECORDER_NAMES)
+def test_every_recorded_name_compiles(backend, monkeypatch, name):
+    monkeypatch.setattr(sd, "keyboard", None)  # No fallback: the table alone must know it
+    for keys in (name, f"ctrl+{name}" if name != "+" else "ctrl++"):
+        chord = backend.parse_chord(keys)
+        assert chord and all(vk for vk, flags in chord)
+
+def test_layout_shift_state_becomes_modifiers(backend):
+    assert [vk for vk, _ in backend.parse_chord("ctrl+?")] == [sd.VK_CONTROL, sd.VK_SHIFT, 0xBF]
+    assert [vk for vk, _ in backend.parse_chord("shift+?")] == [sd.VK_SHIFT, 0xBF]
+    assert [vk for vk, _ in backend.parse_chord("ctrl++")] == [sd.VK_CONTROL, sd.VK_SHIFT, 0xBB]
+    assert backend.parse_chord("ctrl+plus") == backend.parse_chord("ctrl++")
+
+def test_old_library_spellings(backend):
+    for alias, name in [("num lock", "numlock"), ("scroll lock", "scrlk"), ("pause", "pause break"),
+                        ("num 7", "num 7"), ("num add", "num plus"), ("page up", "pgup")]:
+        assert backend.parse_chord(alias) == backend.parse_chord(name)
+    assert backend.parse_chord("num lock") == ((0x90, sd.KEYEVENTF_EXTENDEDKEY),)
+
+NO_X11_KEY = {"ime accept", "ime process", "zoom"}
+CHORDS = RECORDER_NAMES + sorted(sd.KEY_ALIASES) + ["ctrl++", "ctrl+shift+pgup", "alt+f4", "ctrl+?", "num 7"]
+
+def parse_everywhere(backend, monkeypatch, keys):
+    monkeypatch.setattr(sd, "keyboard", None)
+    return {other.name: other.parse_chord(keys)
+            for other in (backend, sd.XdotoolBackend(run=lambda *args, **kwargs: None), sd.RecordingBackend())}
+
+@pytest.mark.parametrize("keys", CHORDS)
+def test_every_backend_parses_the_same_chords(backend, monkeypatch, keys):
+    name = sd.chord_names(keys)[-1]
+    if name in NO_X11_KEY:
+        with pytest.raises(ValueError):
+            sd.XdotoolBackend().parse_chord(keys)
+        return
+    chords = parse_everywhere(backend, monkeypatch, keys)
+    keysyms = set(sd.XDOTOOL_KEYS.values())
+    assert all(keysym in keysyms or len(keysym) == 1 for keysym in chords["xdotool"].split("+"))
+    assert len(chords["recording"]) == len(sd.chord_names(keys))
+
+@pytest.mark.parametrize("keys", ["ctrl+nope", "ctrl+", "page upp"])
+def test_every_backend_rejects_the_same_chords(backend, monkeypatch, keys):
+    monkeypatch.setattr(sd, "keyboard", SimpleNamespace(key_to_scan_codes=key_to_scan_codes))
+    for other in (backend, sd.XdotoolBackend(), sd.RecordingBackend()):
+        with pytest.raises(ValueError):
+            other.parse_chord(keys)
+
+def key_to_scan_codes(name):
+    if name != "ins 0":  # A localized keypad name
+        raise ValueError(f"Key {name!r} is not mapped to any known key.")
+    return (0x52,)
+
+def test_unknown_names_fall_back_to_the_keyboard_library(backend, monkeypatch):
+    monkeypatch.setattr(sd, "keyboard", SimpleNamespace(key_to_scan_codes=key_to_scan_codes))
+    assert backend.parse_chord("ctrl+ins 0") == ((sd.VK_CONTROL, 0), (0x60, 0))
+    with pytest.raises(ValueError):
+        backend.parse_chord("ctrl+nope")
+
+def clipboard_sets(events):
+    return [event[2] for event in events if event[1] == "clipboard_set"]
+
+def test_stale_restore_after_a_newer_paste_does_nothing(recording):
+    sd.clipboard.text = "mine"
+    paster = sd.ClipboardPaster(restore_delay=60)
+    paster.paste("one")
+    first = paster.generation
+    paster.paste("two")  # The first timer fired but waited on the lock meanwhile
+    paster.restore(first)
+    assert sd.clipboard.text == "two" and paster.saved == "mine"
+    paster.restore_timer.cancel()
+    paster.restore(paster.generation)
+    assert sd.clipboard.text == "mine"
+    assert clipboard_sets(recording) == ["one", "two", "mine"]
+
+def test_no_text_to_restore_leaves_the_clipboard_alone(recording):
+    sd.clipboard.text = None  # An image, or nothing
+    paster = sd.ClipboardPaster(restore_delay=0.01)
+    paster.paste("one")
+    deadline = time.monotonic() + 2
+    while paster.restore_timer is not None and time.monotonic() < deadline:
+        time.sleep(0.001)
+    assert paster.restore_timer is None
+    assert clipboard_sets(recording) == ["one"]
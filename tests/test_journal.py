@@ -0,0 +1,81 @@
+import json
+import queue
+import time
+
+import streamdeck as sd
+from conftest import needs_pty
+from simulator import SoftwareDeck, wait_for_status
+
+def test_rotated_files_each_replay_on_their_own(tmp_path):
+    journal = sd.DeckJournal(str(tmp_path / "deck.journal"), max_bytes=4096, backups=2).start()
+    journal.open_channel(1, {"device": "deck1", "port": "SIM", "identity": "SIM", "protocol": "binary"})
+    frame = sd.encode_frame(sd.FRAME_PRESS, 0)
+    for _ in range(20):
+        for _ in range(100):
+            journal.record(sd.JOURNAL_RX, 1, frame)
+        journal.flush()
+    journal.close()
+    files = sd.journal_files(journal.path, backups=2)
+    assert journal.rotations > 0 and len(files) == 3
+    for path in files:
+        records = list(sd.read_journal(path))
+        assert records[0][1] == sd.JOURNAL_OPEN
+        assert all(data == frame for stamp, kind, channel, data in records if kind == sd.JOURNAL_RX)
+
+def test_truncated_record_ends_the_file(tmp_path):
+    path = tmp_path / "cut.journal"
+    journal = sd.DeckJournal(str(path)).start()
+    journal.record(sd.JOURNAL_RX, 1, b"A\r\n")
+    journal.record(sd.JOURNAL_RX, 1, b"B\r\n")
+    journal.close()
+    data = path.read_bytes()
+    path.write_bytes(data[:-2])
+    assert [data for _, _, _, data in sd.read_journal(str(path))] == [b"A\r\n"]
+
+def test_journal_clock_fires_gesture_timers_at_their_deadlines():
+    clock = sd.JournalClock()
+    gestures = []
+    recognizer = sd.GestureRecognizer(lambda button, gesture, received: gestures.append((button, gesture, clock())),
+                                      lambda button: ("double", "long"), schedule=clock.schedule)
+    recognizer.press('A')
+    clock.advance(0.1)
+    recognizer.release('A')
+    clock.advance(0.2)
+    recognizer.press('A')  # Inside the double-tap window
+    recognizer.release('A')
+    recognizer.press('B')
+    clock.advance(5.0)
+    assert gestures == [('A', "double", 0.2), ('B', "long", 0.2 + sd.LONG_PRESS_TIME)]
+    assert clock() == 5.0
+
+@needs_pty
+def test_replay_reproduces_the_live_keystrokes(tmp_path, recording, hotkey_settings):
+    deck = SoftwareDeck()
+    journal_file = str(tmp_path / "deck.journal")
+    statuses = queue.Queue()
+    engine = sd.DeckEngine(hotkey_settings, str(tmp_path / "device.json"), comports=deck.comports,
+                           watch_interval=None, journal_file=journal_file)
+    engine.load_settings()
+    engine.on_status = statuses.put
+    engine.start()
+    try:
+        assert wait_for_status(statuses, "connected", 30)
+        for i in range(24):
+            deck.tap(sd.BUTTONS[i % len(sd.BUTTONS)], 0.01)
+            time.sleep(sd.DEFAULT_RATE_INTERVAL / len(sd.BUTTONS) * 2)
+        time.sleep(0.2)
+        live = [event[1:] for event in recording]
+    finally:
+        engine.stop()
+        deck.close()
+    assert len(live) == 24
+
+    kinds = [kind for _, kind, _, _ in sd.read_journal(journal_file)]
+    assert kinds[0] == sd.JOURNAL_OPEN and kinds[-1] == sd.JOURNAL_CLOSE
+    details = json.loads(next(sd.read_journal(journal_file))[3])
+    assert details["device"] == "deck1"
+
+    for speed in (1.0, 10.0, 0):  # 0: as fast as possible, on the journal's clock
+        summary, replayed = sd.replay_journal([journal_file], hotkey_settings, speed)
+        assert summary["events"] == 48  # Presses and releases
+        assert [event[1:] for event in replayed] == live
@@ -0,0 +1,86 @@
+import random
+
+import pytest
+
+import streamdeck as sd
+
+TOKENS = [b"A", b"B", b"C", b"D", b"E", b"F", b"G", b"H", b"PONG", b"DECK", b"Z", b"",
+          b" A ", b"\tB", b"\xff\xfe", b"AB", b"\x01", b"a", b" h", b"ab", b"z"]
+
+def feed_in_chunks(parser, stream, rng, largest):
+    pos = 0
+    while pos < len(stream):
+        size = rng.randint(1, largest)
+        parser.feed(bytes(stream[pos:pos + size]))
+        pos += size
+
+@pytest.mark.parametrize("seed", range(4))
+def test_text_parser_matches_split_strip_reference(seed):
+    """Random streams split at random chunk boundaries parse like split/strip on the whole stream"""
+    rng = random.Random(seed)
+    buttons = set(sd.BUTTONS)
+    releases = {button.lower(): button for button in sd.BUTTONS}
+    for _ in range(500):
+        stream = b"".join(rng.choice(TOKENS) + rng.choice([b"\n", b"\r\n"]) for _ in range(rng.randint(0, 40)))
+        expected = []
+        for raw in stream.split(b"\n")[:-1]:
+            data = raw.strip().decode("utf-8", "replace")
+            if data in buttons:
+                expected.append(data)
+            elif data in releases:
+                expected.append("release:" + releases[data])
+            elif data:
+                expected.append("line:" + data)
+
+        got = []
+        parser = sd.FrameParser(got.append, lambda line: got.append("line:" + line),
+                                on_release=lambda button: got.append("release:" + button))
+        feed_in_chunks(parser, stream, rng, 8)
+        assert got == expected, stream
+        assert not parser.buffer
+
+def test_text_parser_drops_overlong_lines():
+    got = []
+    parser = sd.FrameParser(got.append, got.append)
+    parser.feed(b"x" * (sd.MAX_FRAME_LENGTH + 10))
+    parser.feed(b"\nA\n")
+    assert got == ["A"]
+
+@pytest.mark.parametrize("seed", range(4))
+def test_binary_parser_recovers_every_good_frame(seed):
+    """Frames mixed with noise and corrupted frames, fed in random chunks: every intact press comes out"""
+    rng = random.Random(seed)
+    noise = [b for b in range(256) if b != sd.FRAME_START]
+    for _ in range(500):
+        stream = bytearray()
+        expected = []
+        sequence = 0
+        for _ in range(rng.randint(0, 30)):
+            roll = rng.random()
+            if roll < 0.15:
+                stream += bytes(rng.choice(noise) for _ in range(rng.randint(1, 4)))
+            elif roll < 0.25:
+                frame = bytearray(sd.encode_frame(sd.FRAME_PRESS, rng.randrange(8), sequence))
+                frame[rng.randrange(1, sd.FRAME_LENGTH)] ^= 1 << rng.randrange(8)
+                if sd.FRAME_START not in frame[1:]:
+                    stream += frame
+                sequence += 1
+            else:
+                index = rng.randrange(8)
+                stream += sd.encode_frame(sd.FRAME_PRESS, index, sequence)
+                expected.append(sd.BUTTONS[index])
+                sequence += 1
+
+        got = []
+        parser = sd.BinaryFrameParser(got.append)
+        feed_in_chunks(parser, stream, rng, 9)
+        assert got == expected, bytes(stream)
+
+def test_binary_parser_routes_releases_and_control_frames():
+    got = []
+    parser = sd.BinaryFrameParser(lambda button: got.append(("press", button)),
+                                  lambda frame_type, argument: got.append((frame_type, argument)),
+                                  on_release=lambda button: got.append(("release", button)))
+    parser.feed(sd.encode_frame(sd.FRAME_PRESS, 2, 0) + sd.encode_frame(sd.FRAME_RELEASE, 2, 1)
+                + sd.encode_frame(sd.FRAME_DECK, sd.CAP_RELEASE, 2))
+    assert got == [("press", "C"), ("release", "C"), (sd.FRAME_DECK, sd.CAP_RELEASE)]
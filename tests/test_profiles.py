@@ -0,0 +1,80 @@
+import json
+
+import streamdeck as sd
+from simulator import FakeWindowSource
+
+def make_profiles(recording):
+    profiles = sd.ProfileSet()
+    for i in range(8):
+        profiles.add(f"P{i}", {button: sd.new_button_config(f"hotkey:ctrl+{i}") for button in sd.BUTTONS},
+                     apps=[f"app{i}.exe"])
+    profiles.profiles["P1"]['A'] = dict(sd.new_button_config(), type="layer", subtype="layer:P2", message="layer:P2")
+    profiles.compile()
+    return profiles
+
+def test_foreground_app_switches_profile(recording):
+    profiles = make_profiles(recording)
+    source = FakeWindowSource("explorer.exe")
+    source.start(lambda app: profiles.switch(profiles.on_foreground(app) or profiles.active, manual=False))
+    profiles.switch(sd.DEFAULT_PROFILE)
+    for app, expected in (("app3.exe", "P3"), ("APP7.EXE", "P7"), ("notepad.exe", sd.DEFAULT_PROFILE),
+                          ("app1.exe", "P1")):
+        source.activate(app)
+        assert profiles.active == expected
+
+def test_one_shot_layer(recording):
+    profiles = make_profiles(recording)
+    profiles.switch("P1")
+    layer = profiles.lookup('A')
+    assert layer.kind == "layer"
+    profiles.push_layer(layer.args[0])
+    assert profiles.lookup('B').source == "hotkey:ctrl+2"
+    assert profiles.lookup('B').source == "hotkey:ctrl+1"
+
+def test_compile_only_recompiles_changed_messages(recording):
+    profiles = make_profiles(recording)
+    before = dict(profiles.tables["P3"])
+    profiles.profiles["P3"]['C']['message'] = "hotkey:alt+x"
+    profiles.compile("P3")
+    assert profiles.tables["P3"]['C'] is not before['C']
+    assert all(profiles.tables["P3"][button] is before[button] for button in sd.BUTTONS if button != 'C')
+
+def test_plain_text_that_looks_like_a_command_is_typed():
+    for text in ("paste: hello", "macro:notes", "profile:Oyun", "layer: x", "keys:abc", "text:as is"):
+        config = sd.new_button_config(text)
+        action = sd.compile_action(config['message'])
+        assert (action.kind, action.args) == ("text", (text,))
+    assert sd.compile_action(sd.text_action("hello", "paste")).args == ("hello", "paste")
+    assert sd.compile_action(sd.text_action("hotkey:ctrl+c")).kind == "hotkey"  # As before profiles existed
+
+def test_legacy_settings_are_migrated_once(tmp_path, recording):
+    path = str(tmp_path / "settings.json")
+    buttons = {
+        'A': {"command_type": "yazı", "command_subtype": "", "command_text": "macro:notes", "message": "macro:notes"},
+        'B': {"command_type": "yazı", "command_subtype": "auto", "command_text": "paste: hi", "message": "paste: hi"},
+        'C': {"command_type": "yazı", "command_subtype": "paste", "command_text": "hi", "message": "paste:hi"},
+        'D': {"command_type": "macro", "command_subtype": "macro:notes", "command_text": "", "message": "macro:notes"},
+    }
+    sd.write_json_atomic(path, {"profiles": {sd.DEFAULT_PROFILE: {"buttons": buttons}}})
+    engine = sd.DeckEngine(path, None, comports=lambda: [], watch_interval=None)
+    engine.load_settings()
+    engine.compile_actions()
+    actions = engine.profiles.tables[sd.DEFAULT_PROFILE]
+    assert (actions['A'].kind, actions['A'].args) == ("text", ("macro:notes",))
+    assert (actions['B'].kind, actions['B'].args) == ("text", ("paste: hi",))
+    assert actions['C'].args == ("hi", "paste")
+    assert actions['D'].kind == "macro"
+
+    engine.settings_store.flush()
+    with open(path, encoding="utf-8") as f:
+        saved = json.load(f)
+    assert saved["version"] == sd.SETTINGS_VERSION
+    stored = saved["profiles"][sd.DEFAULT_PROFILE]["buttons"]
+    assert stored['A']["message"] == "text:macro:notes" and stored['A']["command_text"] == "macro:notes"
+    assert stored['C']["message"] == "paste:hi" and stored['D']["message"] == "macro:notes"
+
+    writes = engine.settings_store.writes
+    engine.apply_settings(saved, reload=True)
+    engine.settings_store.flush()
+    assert engine.settings_store.writes == writes  # Version 2 files are left alone
+    engine.executor.stop()